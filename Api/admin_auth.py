@@ -0,0 +1,11 @@
+"""Admin token check shared by the admin endpoints and the debugging middlewares."""
+import hmac
+import os
+
+ADMIN_TOKEN_ENV = "INGRESCAN_ADMIN_TOKEN"
+
+
+def is_admin_token(token: str = None) -> bool:
+    """True when INGRESCAN_ADMIN_TOKEN is set and token matches it."""
+    expected = os.environ.get(ADMIN_TOKEN_ENV)
+    return bool(expected) and hmac.compare_digest(token or "", expected)
@@ -1,3 +1,11 @@
+import os
+import sys
+
+# ALLERGEN_SYNONYMS / ALLERGEN_INFO are the source tables for the shared knowledge
+# base; lookups go through the current KB so they follow hot reloads.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "Ingredients_logic"))
+from knowledge_base import get_kb
+
 # allergen synonyms mapping and matching logic
 
 ALLERGEN_SYNONYMS = {
@@ -80,18 +88,24 @@ def get_allergen_info(ingredient: str) -> dict:
     Returns allergen info for a given ingredient if available.
     """
     key = ingredient.lower().strip()
-    return ALLERGEN_INFO.get(key)
+    return get_kb().section("allergen_info").get(key)
 
 
 def match_allergens(ingredients: list, user_allergens: list) -> list:
     """
     Returns a list of matched allergens based on synonyms mapping.
+    A user allergen may be an allergen name or any of its synonyms ("soya", "whey").
     """
     matched = set()
     ingredients_lower = set([i.lower() for i in ingredients])
+    kb = get_kb()
+    allergen_synonyms = kb.section("allergen_synonyms")
+    allergen_terms = kb.section("allergen_terms")
     for allergen in user_allergens:
-        allergen_lower = allergen.lower()
-        synonyms = ALLERGEN_SYNONYMS.get(allergen_lower, [allergen_lower])
+        allergen_lower = allergen.lower().strip()
+        synonyms = {allergen_lower}
+        for name in allergen_terms.get(allergen_lower, []):
+            synonyms.update(allergen_synonyms[name])
         for syn in synonyms:
             if syn in ingredients_lower:
                 matched.add(allergen)
@@ -0,0 +1,42 @@
+"""Shared fixtures: a fresh product cache per test and a client that never leaves the process."""
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+import product_cache
+from main import data_version
+from models import ProductResponse
+from product_cache import ProductCache
+
+
+@pytest.fixture
+def cache(monkeypatch) -> ProductCache:
+    """Replace the process-wide product cache with an empty one."""
+    fresh = ProductCache()
+    monkeypatch.setattr(product_cache, "_shared", fresh)
+    return fresh
+
+
+@pytest.fixture
+def client(cache) -> TestClient:
+    return TestClient(main.app)
+
+
+def off_payload(barcode: str, **fields) -> dict:
+    """ProductResponse dump as stored for an OpenFoodFacts hit."""
+    data = dict(barcode=barcode, product_name="Choco Spread", ingredients=[{"name": "sugar", "common_name": "Sugar"}],
+                nutrients={"sugars_100g": "56"}, allergens=["en:milk"], health_score=3, rating="Harmful",
+                source="openfoodfacts", status="found_off", alternatives=[])
+    data.update(fields)
+    return ProductResponse(**data).model_dump()
+
+
+@pytest.fixture
+def seed_off(cache):
+    """seed_off(barcode, product=None, **fields): put an OFF answer in the cache, as fetch_off_entry would."""
+    def seed(barcode: str, product: dict = None, **fields) -> str:
+        payload = off_payload(barcode, **fields)
+        version = data_version(payload)
+        cache.set(f"api:off:{barcode}", {"version": version, "response": payload, "product": product})
+        return version
+    return seed
@@ -1,6 +1,8 @@
+import hashlib
+import json
 import logging
-from fastapi import FastAPI, HTTPException
-import requests
+import os
+from fastapi import FastAPI, HTTPException, Header, Response
 from fastapi import Query
 from typing import List
 from fastapi import UploadFile, File, Form, Query, Body
@@ -9,6 +11,18 @@ from utils import tag_ingredient_safety, calculate_health_score, suggest_alterna
 from allergens import match_allergens, get_allergen_info
 from models import Ingredient, ProductResponse
 from pydantic import BaseModel
+import knowledge_base  # importable once utils has added Ingredients_logic to sys.path
+from offline_mode import is_offline, OFFLINE_SOURCE
+from product_cache import get_product_cache
+import upstream_cache
+import metrics
+from metrics import upstream_get
+import request_metrics
+import request_tracing
+import request_profiling
+from admin_auth import is_admin_token
+from tracing import span
+from wire_formats import CompressionMiddleware, media_type_for, negotiated
 # Request model for /scan/ingredients
 
 
@@ -18,7 +32,82 @@ class ScanIngredientsRequest(BaseModel):
     user_allergens: list[str] = None
 
 
+# Barcode responses are cacheable by clients / CDNs for this long (seconds)
+BARCODE_MAX_AGE = int(os.environ.get("INGRESCAN_BARCODE_MAX_AGE", "300"))
+
+
+def data_version(payload: dict) -> str:
+    """Content hash of product data, used as its version."""
+    canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:20]
+
+
+def barcode_etag(version: str, user_allergens: List[str] = None, media_type: str = "application/json") -> str:
+    """
+    Strong ETag for a /scan/barcode response: product data version x allergen set x knowledge base x format,
+    plus the offline marker when offline mode is on.
+    """
+    allergens = ",".join(sorted({a.strip().lower() for a in user_allergens or [] if a and a.strip()}))
+    offline = "|offline" if is_offline() else ""
+    digest = hashlib.sha256(f"{knowledge_base.get_kb().version}|{version}|{allergens}|{media_type}{offline}".encode("utf-8"))
+    return f'"{digest.hexdigest()[:32]}"'
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """If-None-Match check (weak comparison, as RFC 9110 requires for this header)."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+
+def cached_off_version(barcode: str):
+    """Version of the cached OFF data for barcode, without rebuilding the response; None if not cached."""
+    cached = get_product_cache().get(f"api:off:{barcode}")
+    return cached["version"] if cached is not None else None
+
+
+ALTERNATIVES_FIELDS = ("code", "categories_tags", "categories", "categories_en", "nutriments",
+                       "allergens_tags", "traces_tags")
+
+
+def alternatives_query(product: dict) -> dict:
+    """The part of an OFF product the alternatives index reads (category, nutrients, allergens)."""
+    return {k: product[k] for k in ALTERNATIVES_FIELDS if product.get(k)}
+
+
+def fetch_off_entry(barcode: str):
+    """
+    (ProductResponse dump, data version, OFF product for alternatives or None) from the shared
+    product cache or OFF; (None, None, None) when not found.
+    The dump was validated when it was stored and is shared: treat it as read-only.
+    """
+    cache = get_product_cache()
+    cached = cache.get(f"api:off:{barcode}")
+    if cached is not None:
+        return cached["response"], cached["version"], cached.get("product")
+    with span("off_fetch", barcode=barcode):
+        result, product = _fetch_from_openfoodfacts(barcode)
+    if result is None:
+        return None, None, None
+    payload = result.model_dump()
+    version = data_version(payload)
+    cache.set(f"api:off:{barcode}", {"version": version, "response": payload, "product": product})
+    return payload, version, product
+
+
 def fetch_from_openfoodfacts(barcode: str):
+    """OFF lookup through the shared product cache."""
+    payload = fetch_off_entry(barcode)[0]
+    return ProductResponse.model_validate(payload) if payload is not None else None
+
+
+def _fetch_from_openfoodfacts(barcode: str):
+    """(ProductResponse, alternatives_query of the OFF product it came from), or (None, None)."""
+    # Offline mode: no network at all, the caller falls through to the local DB
+    if is_offline():
+        return None, None
     # Try v2 product endpoint first with locale/country and limited fields
     try:
         headers = {"User-Agent": "Mozilla/5.0 (+ingredient-analyzer)"}
@@ -27,14 +116,16 @@ def fetch_from_openfoodfacts(barcode: str):
             "ingredients_text,ingredients_text_en,ingredients,"
             "nutriments,allergens_tags,brands,categories,categories_en"
         )
-        v2p = requests.get(
+        # Conditional GET: a stale copy whose validators still match costs a 304, not a download
+        v2_status, vd = upstream_cache.fetch_json(
             f"https://world.openfoodfacts.org/api/v2/product/{barcode}",
             params={"lc": "en", "cc": "in", "fields": fields},
             headers=headers,
             timeout=5,
+            stage="v2_product",
         )
-        if v2p.status_code == 200:
-            vd = v2p.json() or {}
+        if v2_status == 200:
+            vd = vd or {}
             vp = vd.get("product")
             if vp:
                 name = (
@@ -77,7 +168,7 @@ def fetch_from_openfoodfacts(barcode: str):
                 allergens = vp.get("allergens_tags", []) or vp.get("allergens", [])
                 health_score = calculate_health_score(ingredients, allergens, nutrients)
                 rating = "Safe" if health_score >= 8 else ("Moderate" if health_score >= 5 else "Harmful")
-                alternatives = suggest_alternatives(name) if rating == "Harmful" else []
+                alternatives = suggest_alternatives(name, product=vp, barcode=barcode) if rating == "Harmful" else []
                 status_val = "partial_off" if (not ingredients and not nutrients and not allergens) else "found_off"
                 return ProductResponse(
                     barcode=barcode,
@@ -90,7 +181,7 @@ def fetch_from_openfoodfacts(barcode: str):
                     source="openfoodfacts",
                     status=status_val,
                     alternatives=alternatives
-                )
+                ), alternatives_query(vp)
     except Exception:
         pass
 
@@ -104,9 +195,10 @@ def fetch_from_openfoodfacts(barcode: str):
     try:
         for host in hosts:
             try:
-                resp = requests.get(f"{host}/api/v0/product/{barcode}.json", timeout=5)
-                if resp.status_code == 200:
-                    d = resp.json() or {}
+                status, d = upstream_cache.fetch_json(f"{host}/api/v0/product/{barcode}.json", timeout=5,
+                                                      stage="v0_product")
+                if status == 200:
+                    d = d or {}
                     if d.get("status") == 1:
                         data = d
                         break
@@ -116,7 +208,7 @@ def fetch_from_openfoodfacts(barcode: str):
             logging.info(f"OFF: Product {barcode} not found on product endpoint. Trying search fallback.")
             # v2 product
             try:
-                v2p = requests.get(f"https://world.openfoodfacts.org/api/v2/product/{barcode}", timeout=5)
+                v2p = upstream_get(f"https://world.openfoodfacts.org/api/v2/product/{barcode}", "v2_product_plain", timeout=5)
                 if v2p.status_code == 200:
                     vd = v2p.json() or {}
                     if vd.get("product"):
@@ -126,7 +218,7 @@ def fetch_from_openfoodfacts(barcode: str):
             # v1 search by code
             if not data:
                 try:
-                    sresp = requests.get(f"https://world.openfoodfacts.org/cgi/search.pl?search_terms={barcode}&search_simple=1&action=process&json=1&page_size=10", timeout=5)
+                    sresp = upstream_get(f"https://world.openfoodfacts.org/cgi/search.pl?search_terms={barcode}&search_simple=1&action=process&json=1&page_size=10", "search_by_code", timeout=5)
                     if sresp.status_code == 200:
                         sdata = sresp.json() or {}
                         products = sdata.get("products") or []
@@ -139,14 +231,14 @@ def fetch_from_openfoodfacts(barcode: str):
             if not data:
                 try:
                     # Try both code and codes query params
-                    v2s = requests.get(f"https://world.openfoodfacts.org/api/v2/search?code={barcode}&page_size=5", timeout=5)
+                    v2s = upstream_get(f"https://world.openfoodfacts.org/api/v2/search?code={barcode}&page_size=5", "v2_search_code", timeout=5)
                     if v2s.status_code == 200:
                         v2d = v2s.json() or {}
                         v2products = v2d.get("products") or []
                         if v2products:
                             data = {"product": v2products[0], "status": 1}
                     if not data:
-                        v2s2 = requests.get(f"https://world.openfoodfacts.org/api/v2/search?codes={barcode}&page_size=5", timeout=5)
+                        v2s2 = upstream_get(f"https://world.openfoodfacts.org/api/v2/search?codes={barcode}&page_size=5", "v2_search_codes", timeout=5)
                         if v2s2.status_code == 200:
                             v2d2 = v2s2.json() or {}
                             v2products2 = v2d2.get("products") or []
@@ -158,7 +250,7 @@ def fetch_from_openfoodfacts(barcode: str):
             # Last resort: fetch the HTML page to derive a name, then search by that name
             try:
                 headers = {"User-Agent": "Mozilla/5.0 (+OFF-helper)"}
-                html_resp = requests.get(f"https://world.openfoodfacts.org/product/{barcode}", timeout=8, headers=headers)
+                html_resp = upstream_get(f"https://world.openfoodfacts.org/product/{barcode}", "html_scrape", timeout=8, headers=headers)
                 if html_resp.status_code == 200 and html_resp.text:
                     import re as _re
                     html = html_resp.text
@@ -181,7 +273,7 @@ def fetch_from_openfoodfacts(barcode: str):
                             import urllib.parse as _urllib_parse
                             name_q = _urllib_parse.quote_plus(fallback_name)
                             name_url = f"https://world.openfoodfacts.org/cgi/search.pl?search_terms={name_q}&search_simple=1&action=process&json=1&page_size=10"
-                            nresp2 = requests.get(name_url, timeout=5)
+                            nresp2 = upstream_get(name_url, "html_name_search", timeout=5)
                             if nresp2.status_code == 200:
                                 ndata2 = nresp2.json() or {}
                                 nproducts2 = ndata2.get("products") or []
@@ -228,7 +320,7 @@ def fetch_from_openfoodfacts(barcode: str):
                                         )
                                         health_score = calculate_health_score(ingredients, allergens, nutrients)
                                         rating = "Safe" if health_score >= 8 else ("Moderate" if health_score >= 5 else "Harmful")
-                                        alternatives = suggest_alternatives(final_name) if rating == "Harmful" else []
+                                        alternatives = suggest_alternatives(final_name, product=np2, barcode=barcode) if rating == "Harmful" else []
                                         return ProductResponse(
                                             barcode=barcode,
                                             product_name=final_name,
@@ -240,7 +332,7 @@ def fetch_from_openfoodfacts(barcode: str):
                                             source="openfoodfacts",
                                             status="partial_off",
                                             alternatives=alternatives
-                                        )
+                                        ), alternatives_query(np2)
                         except Exception:
                             pass
                     # If we only have a name, return minimal response
@@ -256,17 +348,17 @@ def fetch_from_openfoodfacts(barcode: str):
                             source="openfoodfacts",
                             status="name_only_off",
                             alternatives=[]
-                        )
+                        ), None
             except Exception:
                 pass
-            return None
+            return None, None
         product = data["product"]
         if data.get("status") != 1:
             logging.info(f"OFF: Product {barcode} not found on product endpoint. Trying search fallback.")
             # Fallback: try search API which sometimes has sparse entries
             try:
                 search_url = f"https://world.openfoodfacts.org/cgi/search.pl?search_terms={barcode}&search_simple=1&action=process&json=1&page_size=1"
-                sresp = requests.get(search_url, timeout=5)
+                sresp = upstream_get(search_url, "search_fallback", timeout=5)
                 if sresp.status_code == 200:
                     sdata = sresp.json() or {}
                     products = sdata.get("products") or []
@@ -328,7 +420,7 @@ def fetch_from_openfoodfacts(barcode: str):
                                 import urllib.parse as _urllib_parse
                                 name_q = _urllib_parse.quote_plus(name)
                                 name_url = f"https://world.openfoodfacts.org/cgi/search.pl?search_terms={name_q}&search_simple=1&action=process&json=1&page_size=5"
-                                nresp = requests.get(name_url, timeout=5)
+                                nresp = upstream_get(name_url, "name_search", timeout=5)
                                 if nresp.status_code == 200:
                                     ndata = nresp.json() or {}
                                     nproducts = ndata.get("products") or []
@@ -349,7 +441,7 @@ def fetch_from_openfoodfacts(barcode: str):
 
                         health_score = calculate_health_score(ingredients, allergens, nutrients)
                         rating = "Safe" if health_score >= 8 else ("Moderate" if health_score >= 5 else "Harmful")
-                        alternatives = suggest_alternatives(name) if rating == "Harmful" else []
+                        alternatives = suggest_alternatives(name, product=product, barcode=barcode) if rating == "Harmful" else []
                         status_val = "partial_off" if (not ingredients and not nutrients and not allergens) else "found_off"
                         return ProductResponse(
                             barcode=barcode,
@@ -362,10 +454,10 @@ def fetch_from_openfoodfacts(barcode: str):
                             source="openfoodfacts",
                             status=status_val,
                             alternatives=alternatives
-                        )
+                        ), alternatives_query(product)
             except Exception as e2:
                 logging.warning(f"OFF search fallback failed for {barcode}: {e2}")
-            return None
+            return None, None
         product = data["product"]
         # Prefer better product names if available; compose from available parts without 'None'
         name = (
@@ -431,7 +523,7 @@ def fetch_from_openfoodfacts(barcode: str):
         rating = "Safe" if health_score >= 8 else (
             "Moderate" if health_score >= 5 else "Harmful")
         alternatives = suggest_alternatives(
-            name) if rating == "Harmful" else []
+            name, product=product, barcode=barcode) if rating == "Harmful" else []
         status_value = "found_off"
         if not ingredients and not nutrients and not allergens:
             status_value = "partial_off"
@@ -446,22 +538,38 @@ def fetch_from_openfoodfacts(barcode: str):
             source="openfoodfacts",
             status=status_value,
             alternatives=alternatives
-        )
+        ), alternatives_query(product)
     except Exception as e:
         logging.error(f"Error fetching from OFF: {e}")
-        return None
+        return None, None
 
 
 # Now using Firebase Firestore for DB lookups
 
 app = FastAPI()
+# Lets X-Profile requests sample the thread each endpoint runs on
+app.router.route_class = request_profiling.ProfiledRoute
+app.add_middleware(request_profiling.ProfilingMiddleware)
+app.add_middleware(request_tracing.TracingMiddleware)
+app.add_middleware(CompressionMiddleware, minimum_size=int(os.environ.get("INGRESCAN_COMPRESS_MIN_BYTES", "1024")))
+# Added last so it is outermost: request latency includes compression
+app.add_middleware(request_metrics.MetricsMiddleware)
+
+# Optional file watcher: hot-reload the knowledge base when its sources change
+if os.environ.get("INGRESCAN_KB_WATCH"):
+    knowledge_base.start_watcher(float(os.environ.get("INGRESCAN_KB_WATCH_INTERVAL", "2")))
+
+
+def require_admin(x_admin_token: str = None):
+    """Admin endpoints are disabled unless INGRESCAN_ADMIN_TOKEN is set and matched."""
+    if not is_admin_token(x_admin_token):
+        raise HTTPException(status_code=403, detail="Admin token required")
 
 
 @app.post("/scan/ingredients", response_model=ProductResponse)
-def scan_ingredients(request: ScanIngredientsRequest = Body(...)):
-    from utils import fetch_wikipedia_summary, fetch_off_ingredient_info
+def scan_ingredients(response: Response, request: ScanIngredientsRequest = Body(...), accept: str = Header(None)):
+    from utils import fetch_wikipedia_summary, fetch_off_ingredient_info, fetch_off_allergen_tags
     tagged_ingredients = []
-    off_cache = {}
     all_off_allergens = set()
     collected_allergen_tags = set()
 
@@ -490,89 +598,75 @@ def scan_ingredients(request: ScanIngredientsRequest = Body(...)):
     nutrients = {}
     matched = []
     for ing_name in request.ingredients:
-        ing_key = ing_name.lower().strip()
-        # Normalize to singular for API queries
-
-        def singular(word):
-            if word.endswith('es') and not word.endswith('ses'):
-                return word[:-2]
-            elif word.endswith('s') and not word.endswith('ss'):
-                return word[:-1]
-            return word
-        singular_name = singular(ing_name.lower())
-        safety, reason = tag_ingredient_safety(ing_name)
-        common_name, description = normalize_ingredient_name(ing_name)
-        allergen_info = get_allergen_info(ing_name)
-        # Query Open Food Facts for allergen tags for this ingredient (cache per request)
-        off_info = ""
-        off_desc = None
-        if ing_key in off_cache:
-            off_allergens = off_cache[ing_key]
-        else:
-            off_url = f"https://world.openfoodfacts.org/cgi/search.pl?search_terms={singular_name}&search_simple=1&action=process&json=1&page_size=1"
-            off_allergens = []
-            try:
-                resp = requests.get(off_url, timeout=5)
-                if resp.status_code == 200:
-                    data = resp.json()
-                    if data.get("products"):
-                        product = data["products"][0]
-                        off_allergens = product.get("allergens_tags", [])
-                        # Do not include random product ingredients text in description
-            except Exception:
-                pass
-            off_cache[ing_key] = off_allergens
-        # Prefer OFF ingredient taxonomy description
-        off_meta = fetch_off_ingredient_info(singular_name)
-        if off_meta and (off_meta.get("description") or off_meta.get("wikipedia")):
-            if off_meta.get("description"):
-                off_desc = off_meta["description"]
-            elif off_meta.get("wikipedia"):
-                off_desc = f"Wikipedia: {off_meta['wikipedia']}"
-        # Filter out irrelevant allergen tags (e.g., soybeans for salt)
-        filtered_allergens = [
-            tag for tag in off_allergens if ing_key not in tag.lower()]
-        if filtered_allergens and show_allergens:
-            off_info = f"OpenFoodFacts Allergens: {', '.join(filtered_allergens)}"
-            # Collect normalized allergen tags for warning logic
-            normalized = [tag.lower().replace('en:', '') for tag in filtered_allergens]
-            all_off_allergens.update(normalized)
-            for t in normalized:
-                collected_allergen_tags.add(t)
-        # Add allergen info to OFF info if available
-        if allergen_info:
-            off_info = (off_info + "\n" if off_info else "") + \
-                f"Allergen: {allergen_info['allergen']}. Info: {allergen_info['info']}"
-            allergens.append(allergen_info['allergen'])
-        # Fallback to Wikipedia summary only if OFF has no description
-        wiki_info = None
-        if not off_desc:
-            wiki_summary = fetch_wikipedia_summary(singular_name)
-            wiki_info = wiki_summary if wiki_summary else "No Wikipedia info available for this ingredient."
-        # Always add layman explanation if available
-        layman = layman_explanation(ing_name, common_name)
-        layman_info = layman if layman else "No layman explanation available."
-        # Combine OFF and Wikipedia info
-        description_parts = []
-        if off_desc:
-            description_parts.append(str(off_desc))
-        if off_info:
-            description_parts.append(off_info)
-        if wiki_info:
-            description_parts.append(wiki_info)
-        if layman_info:
-            description_parts.append(layman_info)
-        description = "\n".join(description_parts)
-        # Final fallback if description is still empty
-        if not description.strip():
-            description = "No information available for this ingredient."
-        tagged_ingredients.append(Ingredient(
-            name=ing_name,
-            safety=safety,
-            reason=reason,
-            common_name=common_name,
-            description=description
-        ))
+        with span("ingredient", ingredient=ing_name):
+            ing_key = ing_name.lower().strip()
+            # Normalize to singular for API queries
+
+            def singular(word):
+                if word.endswith('es') and not word.endswith('ses'):
+                    return word[:-2]
+                elif word.endswith('s') and not word.endswith('ss'):
+                    return word[:-1]
+                return word
+            singular_name = singular(ing_name.lower())
+            safety, reason = tag_ingredient_safety(ing_name)
+            common_name, description = normalize_ingredient_name(ing_name)
+            allergen_info = get_allergen_info(ing_name)
+            # Query Open Food Facts for allergen tags for this ingredient (shared product cache)
+            off_info = ""
+            off_desc = None
+            off_allergens = fetch_off_allergen_tags(singular_name)
+            # Prefer OFF ingredient taxonomy description
+            off_meta = fetch_off_ingredient_info(singular_name)
+            if off_meta and (off_meta.get("description") or off_meta.get("wikipedia")):
+                if off_meta.get("description"):
+                    off_desc = off_meta["description"]
+                elif off_meta.get("wikipedia"):
+                    off_desc = f"Wikipedia: {off_meta['wikipedia']}"
+            # Filter out irrelevant allergen tags (e.g., soybeans for salt)
+            filtered_allergens = [
+                tag for tag in off_allergens if ing_key not in tag.lower()]
+            if filtered_allergens and show_allergens:
+                off_info = f"OpenFoodFacts Allergens: {', '.join(filtered_allergens)}"
+                # Collect normalized allergen tags for warning logic
+                normalized = [tag.lower().replace('en:', '') for tag in filtered_allergens]
+                all_off_allergens.update(normalized)
+                for t in normalized:
+                    collected_allergen_tags.add(t)
+            # Add allergen info to OFF info if available
+            if allergen_info:
+                off_info = (off_info + "\n" if off_info else "") + \
+                    f"Allergen: {allergen_info['allergen']}. Info: {allergen_info['info']}"
+                allergens.append(allergen_info['allergen'])
+            # Fallback to Wikipedia summary only if OFF has no description
+            wiki_info = None
+            if not off_desc:
+                wiki_summary = fetch_wikipedia_summary(singular_name)
+                wiki_info = wiki_summary if wiki_summary else "No Wikipedia info available for this ingredient."
+            # Always add layman explanation if available
+            layman = layman_explanation(ing_name, common_name)
+            layman_info = layman if layman else "No layman explanation available."
+            # Combine OFF and Wikipedia info
+            description_parts = []
+            if off_desc:
+                description_parts.append(str(off_desc))
+            if off_info:
+                description_parts.append(off_info)
+            if wiki_info:
+                description_parts.append(wiki_info)
+            if layman_info:
+                description_parts.append(layman_info)
+            description = "\n".join(description_parts)
+            # Final fallback if description is still empty
+            if not description.strip():
+                description = "No information available for this ingredient."
+            tagged_ingredients.append(Ingredient(
+                name=ing_name,
+                safety=safety,
+                reason=reason,
+                common_name=common_name,
+                description=description
+            ))
     # Prepare final allergens list (only if show_allergens)
     def pretty_tag(tag: str) -> str:
         return tag.replace('-', ' ').title()
@@ -583,13 +677,14 @@ def scan_ingredients(request: ScanIngredientsRequest = Body(...)):
     else:
         allergens = []
         allergen_warning = ""
-    health_score = calculate_health_score(
-        tagged_ingredients, allergens, nutrients)
-    rating = "Safe" if health_score >= 8 else (
-        "Moderate" if health_score >= 5 else "Harmful")
-    alternatives = suggest_alternatives(
-        request.product_name) if rating == "Harmful" else []
-    return ProductResponse(
+    with span("scoring"):
+        health_score = calculate_health_score(
+            tagged_ingredients, allergens, nutrients)
+        rating = "Safe" if health_score >= 8 else (
+            "Moderate" if health_score >= 5 else "Harmful")
+        alternatives = suggest_alternatives(
+            request.product_name) if rating == "Harmful" else []
+    return negotiated(ProductResponse(
         barcode="manual",
         product_name=request.product_name,
         ingredients=tagged_ingredients,
@@ -600,8 +695,9 @@ def scan_ingredients(request: ScanIngredientsRequest = Body(...)):
         source="manual_entry",
         status="manual_entry",
         alternatives=alternatives,
-        allergen_warning=allergen_warning
-    )
+        allergen_warning=allergen_warning,
+        offline=True if is_offline() else None
+    ), accept, response)
 
     # Only show allergens if product_name is not just whitespace and user_allergens contains at least one non-empty string
     user_allergens_nonempty = any(
@@ -612,7 +708,8 @@ def scan_ingredients(request: ScanIngredientsRequest = Body(...)):
 
 
 @app.post("/scan/image", response_model=ProductResponse)
-async def scan_image(file: UploadFile = File(...), user_allergens: List[str] = Form(None)):
+async def scan_image(response: Response, file: UploadFile = File(...), user_allergens: List[str] = Form(None),
+                     accept: str = Header(None)):
     dummy_ingredients = ["Milk", "Salt"]
     tagged_ingredients = []
     for ing_name in dummy_ingredients:
@@ -644,7 +741,7 @@ async def scan_image(file: UploadFile = File(...), user_allergens: List[str] = F
         "Moderate" if health_score >= 5 else "Harmful")
     alternatives = suggest_alternatives(
         "Image Upload") if rating == "Harmful" else []
-    return ProductResponse(
+    return negotiated(ProductResponse(
         barcode="image_upload",
         product_name="Image Upload",
         ingredients=tagged_ingredients,
@@ -656,36 +753,71 @@ async def scan_image(file: UploadFile = File(...), user_allergens: List[str] = F
         status="image_upload",
         alternatives=alternatives,
         allergen_warning=allergen_warning
-    )
+    ), accept, response)
+
+
+def _cache_headers(etag: str, cache_control: str) -> dict:
+    return {"ETag": etag, "Cache-Control": cache_control, "Vary": "Accept"}
 
 
 @app.get("/scan/barcode/{barcode}", response_model=ProductResponse)
-def scan_barcode(barcode: str, user_allergens: List[str] = Query(None)):
-    # 1. Try Open Food Facts
-    result = fetch_from_openfoodfacts(barcode)
-    if result:
-        result.status = "found_off"
+def scan_barcode(barcode: str, response: Response, user_allergens: List[str] = Query(None),
+                 if_none_match: str = Header(None), accept: str = Header(None)):
+    media_type = media_type_for(accept)
+    cache_control = f"public, max-age={BARCODE_MAX_AGE}"
+    # 0. Client already has this version: answer from the cached data version, no analysis
+    version = cached_off_version(barcode) if if_none_match else None
+    if version is not None:
+        etag = barcode_etag(version, user_allergens, media_type)
+        if etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers=_cache_headers(etag, cache_control))
+
+    # 1. Try Open Food Facts. The cached dump is trusted: work on a shallow copy and skip the model round trip
+    with span("off_lookup", barcode=barcode):
+        payload, version, off_product = fetch_off_entry(barcode)
+    if payload:
+        result = dict(payload, status="found_off")
         # Build allergen warning if user allergens provided
         allergen_warning = None
         if user_allergens:
-            ingredient_names = [i.name for i in result.ingredients] + [
-                i.common_name for i in result.ingredients if i.common_name
+            ingredient_names = [i["name"] for i in result["ingredients"]] + [
+                i["common_name"] for i in result["ingredients"] if i["common_name"]
             ]
             matched_custom = match_allergens(ingredient_names, user_allergens) or []
-            off_tags = set([tag.lower().replace('en:', '') for tag in result.allergens])
+            off_tags = set([tag.lower().replace('en:', '') for tag in result["allergens"]])
             matched_off = [a for a in (user_allergens or []) if a.lower() in off_tags]
             matched = sorted(set([*matched_custom, *matched_off]))
             if matched:
                 allergen_warning = f"Warning: Product contains your allergens: {', '.join(matched)}"
-        result.allergen_warning = allergen_warning
-        return result
+        result["allergen_warning"] = allergen_warning
+        # Alternatives must not contain the user's allergens either
+        if user_allergens and result["rating"] == "Harmful":
+            with span("alternatives"):
+                result["alternatives"] = suggest_alternatives(result["product_name"], product=off_product,
+                                                              barcode=barcode, user_allergens=user_allergens)
+    else:
+        # 2. Try local database
+        result = fetch_from_local_db(barcode)
+        if result:
+            version = data_version(result.model_dump())
+        else:
+            # 3. Not found: return minimal response instead of 404
+            result = _not_found_response(barcode)
+            version = data_version(result.model_dump())
+            # Clients may keep it, but must check back: the product may appear upstream any time
+            cache_control = "no-store" if is_offline() else "no-cache"
+    if is_offline():
+        # Upstream was not consulted: "not_found" and empty fields mean "not checked", not "unknown"
+        result = dict(result, offline=True) if isinstance(result, dict) else result.model_copy(update={"offline": True})
+
+    etag = barcode_etag(version, user_allergens, media_type)
+    headers = _cache_headers(etag, cache_control)
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    return negotiated(result, accept, response, headers)
 
-    # 2. Try local database
-    local = fetch_from_local_db(barcode)
-    if local:
-        return local
 
-    # 3. Not found: return minimal response instead of 404
+def _not_found_response(barcode: str) -> ProductResponse:
     return ProductResponse(
         barcode=barcode,
         product_name="Unknown Product",
@@ -694,8 +826,67 @@ def scan_barcode(barcode: str, user_allergens: List[str] = Query(None)):
         allergens=[],
         health_score=10,
         rating="Safe",
-        source="openfoodfacts",
+        source=OFFLINE_SOURCE if is_offline() else "openfoodfacts",
         status="not_found",
         alternatives=[],
         allergen_warning=None
     )
+
+
+@app.get("/admin/kb")
+def knowledge_base_status(x_admin_token: str = Header(None)):
+    require_admin(x_admin_token)
+    kb = knowledge_base.get_kb()
+    return {"version": kb.version, "built_at": kb.built_at, "stale": kb.is_stale()}
+
+
+@app.get("/metrics", include_in_schema=False)
+def prometheus_metrics():
+    return Response(metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
+
+
+@app.get("/admin/traces")
+def list_traces(x_admin_token: str = Header(None)):
+    require_admin(x_admin_token)
+    return request_tracing.recent_traces()
+
+
+@app.get("/admin/traces/{trace_id}")
+def trace_waterfall(trace_id: str, x_admin_token: str = Header(None)):
+    """Span waterfall of a request traced with X-Trace (see request_tracing.py)."""
+    require_admin(x_admin_token)
+    waterfall = request_tracing.get_waterfall(trace_id)
+    if waterfall is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired trace id")
+    return waterfall
+
+
+@app.get("/admin/profiles")
+def list_profiles(x_admin_token: str = Header(None)):
+    require_admin(x_admin_token)
+    return request_profiling.recent_profiles()
+
+
+@app.get("/admin/profiles/{profile_id}")
+def download_profile(profile_id: str, x_admin_token: str = Header(None)):
+    """Folded stacks of a request profiled with X-Profile, ready for flamegraph.pl or speedscope."""
+    require_admin(x_admin_token)
+    path = request_profiling.profile_path(profile_id)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Unknown or pruned profile id")
+    with open(path, encoding="utf-8") as f:
+        return Response(f.read(), media_type="text/plain; charset=utf-8")
+
+
+@app.get("/admin/cache")
+def product_cache_status(x_admin_token: str = Header(None)):
+    require_admin(x_admin_token)
+    return dict(get_product_cache().stats(), upstream=upstream_cache.stats())
+
+
+@app.post("/admin/kb/reload")
+def reload_knowledge_base(force: bool = False, x_admin_token: str = Header(None)):
+    """Rebuild the knowledge base in the background; requests keep using the current one until the swap."""
+    require_admin(x_admin_token)
+    started = knowledge_base.reload_async(force=force) is not None
+    return {"version": knowledge_base.get_kb().version, "reload_started": started}
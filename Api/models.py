@@ -23,4 +23,6 @@ class ProductResponse(BaseModel):
     status: Optional[str] = None
     alternatives: Optional[List[str]] = None
     allergen_warning: Optional[str] = None
+    # True when offline mode skipped every upstream source: missing data means "not checked", not "unknown"
+    offline: Optional[bool] = None
 
@@ -0,0 +1,95 @@
+"""
+Request metrics for the API, exposed at /metrics in Prometheus text format.
+
+- MetricsMiddleware: latency histogram and request counter per route template
+  (never the raw path, so barcodes do not become label values), in-flight
+  gauge, and a histogram of upstream calls per request by host
+- Scrape-time collectors for the product cache, its shared tier and upstream
+  revalidation: they read the counters those modules keep anyway
+- Upstream call latency / outcome / in-flight metrics come from
+  Ingredients_logic/metrics.py (upstream_get / upstream_call)
+"""
+import time
+
+import metrics
+import upstream_cache
+from product_cache import get_product_cache
+
+REQUEST_SECONDS = metrics.Histogram("ingrescan_http_request_seconds", "Request latency by route.",
+                                    ("method", "route"))
+REQUESTS = metrics.Counter("ingrescan_http_requests_total", "Requests by route and status code.",
+                           ("method", "route", "status"))
+IN_FLIGHT = metrics.Gauge("ingrescan_http_requests_in_flight", "Requests being served.")
+UPSTREAM_CALLS = metrics.Histogram("ingrescan_upstream_calls_per_request",
+                                   "Upstream calls made while serving one request, by route and host "
+                                   "(host=\"all\" counts every request, other hosts only requests that called them).",
+                                   ("route", "host"), buckets=metrics.CALLS_BUCKETS)
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording per-route request metrics."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        IN_FLIGHT.inc()
+        calls, token = metrics.track_upstream_calls()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - start
+            metrics.untrack_upstream_calls(token)
+            IN_FLIGHT.dec()
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            REQUEST_SECONDS.labels(scope["method"], path).observe(elapsed)
+            REQUESTS.labels(scope["method"], path, str(status)).inc()
+            UPSTREAM_CALLS.labels(path, "all").observe(sum(calls.values()))
+            for host, n in calls.items():
+                UPSTREAM_CALLS.labels(path, host).observe(n)
+
+
+# ---------- Scrape-time collectors ----------
+def _product_cache_families():
+    stats = get_product_cache().stats()
+    families = [
+        ("ingrescan_product_cache_lookups_total", "counter", "Product cache lookups by result.",
+         [({"result": r}, stats[k]) for r, k in (("hit", "hits"), ("shared_hit", "shared_hits"), ("miss", "misses"))]),
+        ("ingrescan_product_cache_removals_total", "counter", "Entries dropped from or refused by the local tier.",
+         [({"reason": r}, stats[r + "s"]) for r in ("eviction", "expiration", "rejection")]),
+        ("ingrescan_product_cache_entries", "gauge", "Entries in the local tier.", [({}, stats["entries"])]),
+        ("ingrescan_product_cache_bytes", "gauge", "Bytes held by the local tier.", [({}, stats["bytes"])]),
+        ("ingrescan_product_cache_max_bytes", "gauge", "Local tier byte budget.", [({}, stats["max_bytes"])]),
+    ]
+    shared = stats.get("shared")
+    if shared:
+        families.append(("ingrescan_shared_cache_operations_total", "counter", "Shared cache tier operations.",
+                         [({"op": op}, shared[op + "s"]) for op in ("hit", "miss", "write", "error")]))
+    return families
+
+
+def _upstream_cache_families():
+    stats = upstream_cache.stats()
+    return [
+        ("ingrescan_upstream_cache_total", "counter", "Upstream cache events (fresh hits, revalidations, 304s).",
+         [({"event": e}, stats[e]) for e in ("fresh_hits", "requests", "revalidations", "not_modified")]),
+        ("ingrescan_upstream_body_bytes_total", "counter", "Upstream body bytes downloaded and saved by 304s.",
+         [({"kind": "downloaded"}, stats["bytes_downloaded"]), ({"kind": "saved"}, stats["bytes_saved"])]),
+    ]
+
+
+metrics.REGISTRY.register_collector(_product_cache_families)
+metrics.REGISTRY.register_collector(_upstream_cache_families)
@@ -0,0 +1,180 @@
+"""
+On-demand profiling of single live requests.
+
+A request sent with `X-Profile: 1` (or `?profile=1`) and a valid X-Admin-Token
+runs under Ingredients_logic/sampling_profiler.py. Its folded-stack profile is
+written to INGRESCAN_PROFILE_DIR (default Api/profiles) with a JSON sidecar
+holding the route, path, barcode, status and sample count, and the response
+gets an X-Profile-Id header naming it (/admin/profiles/{profile_id}).
+
+- ProfilingMiddleware starts a sampler for the flagged request only; other
+  requests, and other threads, are never sampled
+- ProfiledRoute wraps every endpoint so the thread running it (a threadpool
+  worker for sync endpoints) registers itself with the request's profiler.
+  Async endpoints run on the event loop thread, so their profiles can also
+  catch other requests' coroutines running while they await
+- Samples are taken at INGRESCAN_PROFILE_INTERVAL_MS (default 2), but the
+  sampler needs the GIL, so pure-Python hot loops are sampled about once per
+  interpreter switch interval (5 ms) instead
+- Every stack starts with a "METHOD route barcode=..." root frame, so
+  profiles of different routes can be concatenated into one flamegraph:
+      flamegraph.pl profiles/*.folded > scan.svg    (or drop a file on speedscope.app)
+"""
+import functools
+import inspect
+import json
+import os
+import re
+import threading
+import time
+from urllib.parse import parse_qs
+
+from fastapi.routing import APIRoute
+from starlette.datastructures import Headers, MutableHeaders
+
+from admin_auth import is_admin_token
+from sampling_profiler import SamplingProfiler, current_profiler
+
+PROFILE_DIR = os.environ.get("INGRESCAN_PROFILE_DIR",
+                             os.path.join(os.path.dirname(os.path.abspath(__file__)), "profiles"))
+PROFILE_INTERVAL = float(os.environ.get("INGRESCAN_PROFILE_INTERVAL_MS", "2")) / 1000.0
+PROFILE_KEEP = int(os.environ.get("INGRESCAN_PROFILE_KEEP", "50"))
+_TRUTHY = {"1", "true", "yes", "on"}
+_PROFILE_ID = re.compile(r"^[A-Za-z0-9_.-]+$")
+_SLUG_CHARS = re.compile(r"[^A-Za-z0-9]+")
+
+_save_lock = threading.Lock()
+
+
+def _requested(scope, headers) -> bool:
+    if headers.get("x-profile", "").strip().lower() in _TRUTHY:
+        return True
+    query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+    return any(v.strip().lower() in _TRUTHY for v in query.get("profile", ()))
+
+
+def _register_thread(endpoint):
+    """Wrap endpoint so the thread running it is sampled by the request's profiler, if any."""
+    if inspect.iscoroutinefunction(endpoint):
+        @functools.wraps(endpoint)
+        async def wrapper(*args, **kwargs):
+            profiler = current_profiler.get()
+            if profiler is None:
+                return await endpoint(*args, **kwargs)
+            profiler.add_thread()
+            try:
+                return await endpoint(*args, **kwargs)
+            finally:
+                profiler.remove_thread()
+    else:
+        @functools.wraps(endpoint)
+        def wrapper(*args, **kwargs):
+            profiler = current_profiler.get()
+            if profiler is None:
+                return endpoint(*args, **kwargs)
+            profiler.add_thread()
+            try:
+                return endpoint(*args, **kwargs)
+            finally:
+                profiler.remove_thread()
+    return wrapper
+
+
+class ProfiledRoute(APIRoute):
+    """APIRoute whose endpoint can be sampled; set as app.router.route_class before adding routes."""
+
+    def __init__(self, path, endpoint, **kwargs):
+        super().__init__(path, _register_thread(endpoint), **kwargs)
+
+
+# ---------- Stored profiles ----------
+def profile_path(profile_id: str, ext: str = ".folded"):
+    """Path of a stored profile, or None for an id that is malformed or unknown."""
+    if not _PROFILE_ID.match(profile_id or ""):
+        return None
+    path = os.path.join(PROFILE_DIR, profile_id + ext)
+    return path if os.path.isfile(path) else None
+
+
+def recent_profiles():
+    """Newest first: the sidecar metadata of each stored profile."""
+    try:
+        names = sorted((n for n in os.listdir(PROFILE_DIR) if n.endswith(".json")), reverse=True)
+    except FileNotFoundError:
+        return []
+    profiles = []
+    for name in names:
+        try:
+            with open(os.path.join(PROFILE_DIR, name), encoding="utf-8") as f:
+                profiles.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    return profiles
+
+
+def _prune():
+    ids = sorted(n[:-len(".json")] for n in os.listdir(PROFILE_DIR) if n.endswith(".json"))
+    for profile_id in ids[:max(0, len(ids) - PROFILE_KEEP)]:
+        for ext in (".json", ".folded"):
+            try:
+                os.remove(os.path.join(PROFILE_DIR, profile_id + ext))
+            except FileNotFoundError:
+                pass
+
+
+def _save(profile_id, profiler, meta):
+    root = f"{meta['method']} {meta['route'] or meta['path']}"
+    if meta["barcode"]:
+        root += f" barcode={meta['barcode']}"
+    with _save_lock:
+        profiler.save(os.path.join(PROFILE_DIR, profile_id + ".folded"), root=root)
+        with open(os.path.join(PROFILE_DIR, profile_id + ".json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f, indent=2)
+        _prune()
+
+
+class ProfilingMiddleware:
+    """ASGI middleware profiling requests that opt in with X-Profile (admin token required)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = Headers(scope=scope)
+        if not _requested(scope, headers) or not is_admin_token(headers.get("x-admin-token")):
+            await self.app(scope, receive, send)
+            return
+
+        # The route template is only known after routing, so the id is a sortable timestamp plus the raw path
+        now = time.time()
+        profile_id = time.strftime("%Y%m%dT%H%M%S", time.localtime(now)) + f"-{int(now * 1e6) % 1_000_000:06d}" \
+            + "_" + _SLUG_CHARS.sub("-", scope["path"]).strip("-")[:60]
+        profiler = SamplingProfiler(interval=PROFILE_INTERVAL)
+        status = 500
+
+        async def send_with_id(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                MutableHeaders(scope=message)["X-Profile-Id"] = profile_id
+            await send(message)
+
+        token = current_profiler.set(profiler)
+        profiler.start()
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            profiler.stop()
+            current_profiler.reset(token)
+            route = scope.get("route")
+            meta = {"profile_id": profile_id, "method": scope["method"], "path": scope["path"],
+                    "route": getattr(route, "path", None),
+                    "barcode": (scope.get("path_params") or {}).get("barcode"),
+                    "status": status, "started_at": profiler.started_at,
+                    "duration_ms": round(profiler.duration * 1000.0, 3),
+                    "interval_ms": PROFILE_INTERVAL * 1000.0, "samples": profiler.samples,
+                    "top": [{"frame": frame, "samples": n} for frame, n in profiler.top(10)]}
+            _save(profile_id, profiler, meta)
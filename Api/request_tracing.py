@@ -0,0 +1,91 @@
+"""
+Opt-in request tracing: Server-Timing headers and stored span waterfalls.
+
+A request sent with `X-Trace: 1` is traced when INGRESCAN_TRACING=1, or when it
+also carries a valid X-Admin-Token (so admins can trace live traffic without
+turning tracing on for everyone). Its response gets:
+
+- Server-Timing: total time to the response headers plus the longest spans
+  (stages marked with tracing.span() and every upstream HTTP call)
+- X-Trace-Id: key of the full JSON waterfall, kept in memory for the last
+  INGRESCAN_TRACE_KEEP traced requests (default 200) and served by
+  /admin/traces/{trace_id}
+
+Untraced requests only pay for the header check.
+"""
+import os
+import threading
+from collections import OrderedDict
+
+from starlette.datastructures import Headers, MutableHeaders
+
+import tracing
+from admin_auth import is_admin_token
+
+TRACE_KEEP = int(os.environ.get("INGRESCAN_TRACE_KEEP", "200"))
+_TRUTHY = {"1", "true", "yes", "on"}
+
+_waterfalls = OrderedDict()
+_waterfalls_lock = threading.Lock()
+
+
+def tracing_enabled() -> bool:
+    return os.environ.get("INGRESCAN_TRACING", "").strip().lower() in _TRUTHY
+
+
+def get_waterfall(trace_id: str):
+    with _waterfalls_lock:
+        return _waterfalls.get(trace_id)
+
+
+def recent_traces():
+    """Newest first: id, route, status and duration of each stored trace."""
+    with _waterfalls_lock:
+        items = list(_waterfalls.values())
+    return [{k: w[k] for k in ("trace_id", "method", "route", "status", "duration_ms", "started_at")}
+            for w in reversed(items)]
+
+
+def _keep(waterfall):
+    with _waterfalls_lock:
+        _waterfalls[waterfall["trace_id"]] = waterfall
+        while len(_waterfalls) > TRACE_KEEP:
+            _waterfalls.popitem(last=False)
+
+
+class TracingMiddleware:
+    """ASGI middleware tracing requests that opt in with X-Trace."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = Headers(scope=scope)
+        if headers.get("x-trace", "").strip().lower() not in _TRUTHY or not (
+                tracing_enabled() or is_admin_token(headers.get("x-admin-token"))):
+            await self.app(scope, receive, send)
+            return
+
+        trace, token = tracing.start_trace()
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                trace.finish()
+                response_headers = MutableHeaders(scope=message)
+                response_headers.append("Server-Timing", trace.server_timing())
+                response_headers["X-Trace-Id"] = trace.trace_id
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            tracing.end_trace(token)
+            route = scope.get("route")
+            _keep(trace.waterfall(method=scope["method"], path=scope["path"],
+                                  route=getattr(route, "path", None), status=status))
@@ -0,0 +1,42 @@
+"""
+Multi-worker launcher for the IngreScan API.
+
+    python serve.py --workers 4
+    python serve.py --workers 8 --port 8080 --shared-cache /var/cache/ingrescan/shared.db
+
+Every uvicorn worker is a separate process with its own in-memory product
+cache. This points all of them at one shared SQLite cache tier
+(INGRESCAN_SHARED_CACHE, see Ingredients_logic/shared_cache.py) before the
+workers start, so a product fetched by one worker is a hit for the others.
+"""
+import argparse
+import os
+
+import uvicorn
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_SHARED_CACHE = os.path.join(script_dir, "cache", "shared_cache.db")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the IngreScan API with several workers and a shared cache.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--shared-cache", default=os.environ.get("INGRESCAN_SHARED_CACHE", DEFAULT_SHARED_CACHE),
+                        help="SQLite file shared by all workers (empty string disables it)")
+    args = parser.parse_args()
+
+    if args.shared_cache:
+        os.makedirs(os.path.dirname(os.path.abspath(args.shared_cache)), exist_ok=True)
+        os.environ["INGRESCAN_SHARED_CACHE"] = args.shared_cache
+    else:
+        os.environ.pop("INGRESCAN_SHARED_CACHE", None)
+
+    # Workers re-import main:app from this directory and inherit the environment
+    os.chdir(script_dir)
+    uvicorn.run("main:app", host=args.host, port=args.port, workers=args.workers)
+
+
+if __name__ == "__main__":
+    main()
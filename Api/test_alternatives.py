@@ -0,0 +1,50 @@
+"""Healthier alternatives: catalog index first, allergen-filtered built-ins as the fallback."""
+import alternatives_index
+import main
+from alternatives_index import AlternativesIndex
+from utils import suggest_alternatives
+
+
+def spread(code, sugars, allergens=()):
+    return {"code": code, "product_name": f"Spread {code}", "categories_tags": ["en:spreads"],
+            "allergens_tags": list(allergens),
+            "nutriments": {"energy-kj_100g": 2000, "fat_100g": 30, "saturated-fat_100g": 8, "sugars_100g": sugars,
+                           "salt_100g": 0.3}}
+
+
+def test_index_hits_skip_the_users_allergens(monkeypatch):
+    products = [spread("scanned", 56, ["en:milk"]), spread("milky", 1, ["en:milk"]), spread("plain", 5)]
+    products += [spread(f"filler-{i}", 60) for i in range(5)]
+    index = AlternativesIndex.build(products)
+    monkeypatch.setattr(alternatives_index, "get_index", lambda: index)
+    assert suggest_alternatives("Choco Spread", barcode="scanned") == ["Spread plain", "Spread milky"]
+    assert suggest_alternatives("Choco Spread", barcode="scanned", user_allergens=["milk"]) == ["Spread plain"]
+
+
+def test_fallback_without_a_catalog_still_filters_allergens(monkeypatch):
+    monkeypatch.setattr(alternatives_index, "get_index", lambda: None)
+    assert suggest_alternatives("Salted Butter", barcode="1") == ["Amul Lite Butter", "Nutralite Table Spread", "Ghee"]
+    assert suggest_alternatives("Salted Butter", barcode="1", user_allergens=["dairy"]) == []
+    assert suggest_alternatives("Salted Butter", barcode="1", k=1) == ["Amul Lite Butter"]
+
+
+def test_fallback_when_the_index_has_no_match(monkeypatch):
+    index = AlternativesIndex.build([spread("other", 5)])
+    monkeypatch.setattr(alternatives_index, "get_index", lambda: index)
+    assert suggest_alternatives("Butter", barcode="unknown") == ["Amul Lite Butter", "Nutralite Table Spread", "Ghee"]
+
+
+def test_barcode_scan_passes_the_off_product_for_allergic_users(client, seed_off, monkeypatch):
+    product = {"code": "890", "categories_tags": ["en:spreads"], "allergens_tags": ["en:milk"]}
+    seed_off("890", product=product)
+    calls = []
+
+    def fake_suggest(name, **kwargs):
+        calls.append(kwargs)
+        return ["Spread plain"]
+
+    monkeypatch.setattr(main, "suggest_alternatives", fake_suggest)
+    body = client.get("/scan/barcode/890", params={"user_allergens": "milk"}).json()
+    assert body["alternatives"] == ["Spread plain"]
+    assert calls == [{"product": product, "barcode": "890", "user_allergens": ["milk"]}]
+    assert body["allergen_warning"] == "Warning: Product contains your allergens: milk"
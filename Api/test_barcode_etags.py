@@ -0,0 +1,91 @@
+"""Conditional barcode scans: ETags, If-None-Match and the 304 short-cut."""
+import pytest
+
+import main
+from offline_mode import OFFLINE_ENV
+
+BARCODE = "8901234567890"
+
+
+@pytest.fixture(autouse=True)
+def online(monkeypatch):
+    monkeypatch.delenv(OFFLINE_ENV, raising=False)
+
+
+def scan(client, etag=None, allergens=(), accept=None):
+    headers = {}
+    if etag:
+        headers["If-None-Match"] = etag
+    if accept:
+        headers["Accept"] = accept
+    return client.get(f"/scan/barcode/{BARCODE}", params={"user_allergens": list(allergens)}, headers=headers)
+
+
+def test_repeat_scan_with_the_etag_is_a_304(client, seed_off):
+    seed_off(BARCODE)
+    first = scan(client)
+    assert first.status_code == 200
+    etag = first.headers["etag"]
+    assert etag.startswith('"') and etag.endswith('"')
+    assert first.headers["cache-control"] == f"public, max-age={main.BARCODE_MAX_AGE}"
+    assert "Accept" in [v.strip() for v in first.headers["vary"].split(",")]
+
+    again = scan(client, etag)
+    assert again.status_code == 304
+    assert again.content == b""
+    assert again.headers["etag"] == etag
+    assert again.headers["cache-control"] == first.headers["cache-control"]
+
+
+@pytest.mark.parametrize("template", ["W/{}", '"other", {}', "*"])
+def test_if_none_match_uses_weak_comparison(client, seed_off, template):
+    seed_off(BARCODE)
+    etag = scan(client).headers["etag"]
+    assert scan(client, template.format(etag)).status_code == 304
+
+
+def test_stale_etag_gets_the_new_body(client, seed_off):
+    seed_off(BARCODE)
+    old = scan(client).headers["etag"]
+    seed_off(BARCODE, product_name="Choco Spread Light")
+    response = scan(client, old)
+    assert response.status_code == 200
+    assert response.json()["product_name"] == "Choco Spread Light"
+    assert response.headers["etag"] != old
+
+
+def test_etag_depends_on_the_allergen_set_not_its_spelling(client, seed_off):
+    seed_off(BARCODE, rating="Safe")
+    plain = scan(client).headers["etag"]
+    milk = scan(client, allergens=["milk", "Soy"]).headers["etag"]
+    assert milk != plain
+    assert scan(client, allergens=[" soy", "MILK"]).headers["etag"] == milk
+    assert scan(client, plain, allergens=["milk"]).status_code == 200
+
+
+def test_offline_answers_carry_their_own_etag(client, seed_off, monkeypatch):
+    seed_off(BARCODE)
+    online_etag = scan(client).headers["etag"]
+    monkeypatch.setenv(OFFLINE_ENV, "1")
+    response = scan(client, online_etag)
+    assert response.status_code == 200
+    assert response.json()["offline"] is True
+    assert response.headers["etag"] != online_etag
+
+
+def test_early_304_skips_the_product_lookup(client, seed_off, monkeypatch):
+    seed_off(BARCODE)
+    etag = scan(client).headers["etag"]
+
+    def not_expected(barcode):
+        raise AssertionError("a matching If-None-Match must not rebuild the response")
+
+    monkeypatch.setattr(main, "fetch_off_entry", not_expected)
+    assert scan(client, etag).status_code == 304
+
+
+def test_unknown_product_offline_is_not_stored(client, monkeypatch):
+    monkeypatch.setenv(OFFLINE_ENV, "1")
+    response = scan(client)
+    assert response.json()["status"] == "not_found"
+    assert response.headers["cache-control"] == "no-store"
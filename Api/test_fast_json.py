@@ -0,0 +1,50 @@
+"""FastJSONResponse must put the same JSON on the wire as the model path it replaces."""
+import json
+
+import pytest
+
+import fast_json
+from fast_json import FastJSONResponse, dumps
+from models import ProductResponse
+from offline_mode import OFFLINE_ENV
+
+PAYLOAD = ProductResponse(
+    barcode="8901234567890", product_name="Crème brûlée – 100 g", ingredients=[{"name": "sugar", "common_name": "Sugar"}],
+    nutrients={"sugars_100g": "21.5"}, allergens=["en:milk"], health_score=4, rating="Moderate",
+    source="openfoodfacts", status="found_off", alternatives=[],
+).model_dump()
+
+
+@pytest.mark.parametrize("backend", ["orjson", "json"])
+def test_dumps_round_trips(monkeypatch, backend):
+    if backend == "orjson":
+        pytest.importorskip("orjson")
+    else:
+        monkeypatch.setattr(fast_json, "orjson", None)
+    body = dumps(PAYLOAD)
+    assert json.loads(body) == PAYLOAD
+    assert "Crème brûlée".encode("utf-8") in body
+    assert b", " not in body and b": " not in body
+
+
+def test_both_backends_write_the_same_bytes(monkeypatch):
+    pytest.importorskip("orjson")
+    fast = dumps(PAYLOAD)
+    monkeypatch.setattr(fast_json, "orjson", None)
+    assert dumps(PAYLOAD) == fast
+
+
+def test_response_renders_trusted_dicts_directly():
+    response = FastJSONResponse(PAYLOAD, headers={"ETag": '"abc"'})
+    assert response.body == dumps(PAYLOAD)
+    assert response.headers["content-type"] == "application/json"
+    assert response.headers["etag"] == '"abc"'
+
+
+def test_cached_scan_matches_the_response_model(client, cache, seed_off, monkeypatch):
+    monkeypatch.delenv(OFFLINE_ENV, raising=False)
+    seed_off("8901234567890")
+    body = client.get("/scan/barcode/8901234567890").json()
+    stored = cache.get("api:off:8901234567890")["response"]
+    expected = ProductResponse.model_validate(dict(stored, status="found_off")).model_dump()
+    assert body == json.loads(json.dumps(expected))
@@ -0,0 +1,91 @@
+"""Cached per-ingredient OFF lookups: misses expire after NEGATIVE_TTL, failures are never stored."""
+import pytest
+
+import product_cache
+import utils
+from offline_mode import OFFLINE_ENV
+from product_cache import ProductCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeResponse:
+    def __init__(self, status_code, body=None):
+        self.status_code = status_code
+        self._body = body
+
+    def json(self):
+        if self._body is None:
+            raise ValueError("not JSON")
+        return self._body
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    monkeypatch.delenv(OFFLINE_ENV, raising=False)
+    fake = FakeClock()
+    monkeypatch.setattr(product_cache, "_shared", ProductCache(ttl_seconds=300, clock=fake))
+    return fake
+
+
+class FakeSearch(list):
+    """Records the requested terms and answers with the queued responses."""
+
+    def __init__(self):
+        super().__init__()
+        self.responses = []
+
+    def __call__(self, url, route, params=None, timeout=None):
+        self.append(params["search_terms"])
+        answer = self.responses.pop(0)
+        if isinstance(answer, Exception):
+            raise answer
+        return answer
+
+
+@pytest.fixture
+def off_search(monkeypatch):
+    search = FakeSearch()
+    monkeypatch.setattr(utils, "upstream_get", search)
+    return search
+
+
+def test_found_tags_are_cached_for_the_full_ttl(clock, off_search):
+    off_search.responses.append(FakeResponse(200, {"products": [{"allergens_tags": ["en:milk"]}]}))
+    assert utils.fetch_off_allergen_tags("Butter") == ["en:milk"]
+    clock.now += 299
+    assert utils.fetch_off_allergen_tags("butter") == ["en:milk"]
+    assert off_search == ["Butter"]
+
+
+def test_unknown_ingredients_expire_after_the_negative_ttl(clock, off_search):
+    off_search.responses.extend([FakeResponse(200, {"products": []}),
+                                 FakeResponse(200, {"products": [{"allergens_tags": ["en:soybeans"]}]})])
+    assert utils.fetch_off_allergen_tags("tofu") == []
+    clock.now += utils.NEGATIVE_TTL - 1
+    assert utils.fetch_off_allergen_tags("tofu") == []
+    assert len(off_search) == 1
+    clock.now += 2
+    assert utils.fetch_off_allergen_tags("tofu") == ["en:soybeans"]
+    assert len(off_search) == 2
+
+
+@pytest.mark.parametrize("failure", [FakeResponse(503), FakeResponse(429), FakeResponse(200), OSError("down")])
+def test_failed_searches_are_not_cached(clock, off_search, failure):
+    off_search.responses.extend([failure, FakeResponse(200, {"products": [{"allergens_tags": ["en:nuts"]}]})])
+    assert utils.fetch_off_allergen_tags("praline") == []
+    assert utils.fetch_off_allergen_tags("praline") == ["en:nuts"]
+    assert len(off_search) == 2
+
+
+def test_offline_lookups_skip_the_network_and_the_cache(clock, off_search, monkeypatch):
+    monkeypatch.setenv(OFFLINE_ENV, "1")
+    assert utils.fetch_off_allergen_tags("milk") == []
+    assert off_search == []
+    assert "off:allergens:milk" not in product_cache.get_product_cache()
@@ -0,0 +1,42 @@
+"""/metrics: per-route request metrics and scrape-time cache collectors."""
+import re
+
+import metrics
+import request_metrics
+from offline_mode import OFFLINE_ENV
+
+
+def requests_total(method: str, route: str, status: str) -> int:
+    return request_metrics.REQUESTS.labels(method, route, status).value
+
+
+def test_requests_are_labelled_by_route_template(client, seed_off, monkeypatch):
+    monkeypatch.delenv(OFFLINE_ENV, raising=False)
+    seed_off("8901234567890")
+    before = requests_total("GET", "/scan/barcode/{barcode}", "200")
+    client.get("/scan/barcode/8901234567890")
+    client.get("/scan/barcode/8901234567890")
+    assert requests_total("GET", "/scan/barcode/{barcode}", "200") == before + 2
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == metrics.CONTENT_TYPE
+    text = response.text
+    assert "8901234567890" not in text
+    assert re.search(r'ingrescan_http_request_seconds_count\{method="GET",route="/scan/barcode/\{barcode\}"\} \d+', text)
+    assert 'ingrescan_upstream_calls_per_request_bucket{route="/scan/barcode/{barcode}",host="all",le="0"}' in text
+
+
+def test_cache_collectors_read_the_live_cache(client, seed_off):
+    seed_off("1")
+    client.get("/scan/barcode/1")
+    text = client.get("/metrics").text
+    assert 'ingrescan_product_cache_lookups_total{result="hit"} 1' in text
+    assert "ingrescan_product_cache_entries 1" in text.splitlines()
+    assert 'ingrescan_upstream_body_bytes_total{kind="saved"}' in text
+
+
+def test_unmatched_paths_do_not_create_label_values(client):
+    before = requests_total("GET", "unmatched", "404")
+    client.get("/no/such/path/123")
+    assert requests_total("GET", "unmatched", "404") == before + 1
@@ -0,0 +1,78 @@
+"""X-Profile: one request sampled and stored as folded stacks, for admins only."""
+import time
+
+import pytest
+
+import main
+import request_profiling
+from admin_auth import ADMIN_TOKEN_ENV
+from offline_mode import OFFLINE_ENV
+
+TOKEN = "test-admin-token"
+ADMIN = {"X-Admin-Token": TOKEN}
+
+
+@pytest.fixture(autouse=True)
+def env(tmp_path, monkeypatch):
+    monkeypatch.delenv(OFFLINE_ENV, raising=False)
+    monkeypatch.setenv(ADMIN_TOKEN_ENV, TOKEN)
+    monkeypatch.setattr(request_profiling, "PROFILE_DIR", str(tmp_path / "profiles"))
+    return tmp_path / "profiles"
+
+
+@pytest.fixture
+def slow_lookup(seed_off, monkeypatch):
+    """A cached OFF product whose lookup burns CPU long enough to be sampled."""
+    seed_off("8901234567890")
+    fetch = main.fetch_off_entry
+
+    def slow_fetch_off_entry(barcode):
+        deadline = time.perf_counter() + 0.1
+        while time.perf_counter() < deadline:
+            pass
+        return fetch(barcode)
+
+    monkeypatch.setattr(main, "fetch_off_entry", slow_fetch_off_entry)
+
+
+def test_profiled_request_is_stored_and_served(client, slow_lookup):
+    response = client.get("/scan/barcode/8901234567890", headers=dict(ADMIN, **{"X-Profile": "1"}))
+    assert response.status_code == 200
+    profile_id = response.headers["x-profile-id"]
+
+    [meta] = client.get("/admin/profiles", headers=ADMIN).json()
+    assert meta["profile_id"] == profile_id
+    assert meta["route"] == "/scan/barcode/{barcode}" and meta["barcode"] == "8901234567890"
+    assert meta["status"] == 200 and meta["samples"] > 0
+
+    folded = client.get(f"/admin/profiles/{profile_id}", headers=ADMIN)
+    assert folded.headers["content-type"].startswith("text/plain")
+    lines = folded.text.splitlines()
+    assert all(line.startswith("GET /scan/barcode/{barcode} barcode=8901234567890;") for line in lines)
+    assert any("slow_fetch_off_entry" in line for line in lines)
+
+
+def test_query_flag_works_too(client, slow_lookup):
+    response = client.get("/scan/barcode/8901234567890", params={"profile": "1"}, headers=ADMIN)
+    assert "x-profile-id" in response.headers
+
+
+def test_profiling_needs_the_admin_token(client, slow_lookup, env):
+    response = client.get("/scan/barcode/8901234567890", headers={"X-Profile": "1", "X-Admin-Token": "wrong"})
+    assert response.status_code == 200
+    assert "x-profile-id" not in response.headers
+    assert not env.exists()
+    assert client.get("/admin/profiles").status_code == 403
+
+
+def test_only_the_newest_profiles_are_kept(client, slow_lookup, monkeypatch):
+    monkeypatch.setattr(request_profiling, "PROFILE_KEEP", 1)
+    ids = [client.get("/scan/barcode/8901234567890", headers=dict(ADMIN, **{"X-Profile": "1"})).headers["x-profile-id"]
+           for _ in range(2)]
+    assert [p["profile_id"] for p in client.get("/admin/profiles", headers=ADMIN).json()] == ids[1:]
+    assert client.get(f"/admin/profiles/{ids[0]}", headers=ADMIN).status_code == 404
+
+
+@pytest.mark.parametrize("profile_id", ["../secrets", "a/b", "", "missing"])
+def test_profile_ids_cannot_leave_the_profile_dir(profile_id):
+    assert request_profiling.profile_path(profile_id) is None
@@ -0,0 +1,47 @@
+"""X-Trace: Server-Timing on the response and a stored span waterfall for admins."""
+import pytest
+
+from admin_auth import ADMIN_TOKEN_ENV
+from offline_mode import OFFLINE_ENV
+
+TOKEN = "test-admin-token"
+
+
+@pytest.fixture(autouse=True)
+def env(monkeypatch):
+    monkeypatch.delenv(OFFLINE_ENV, raising=False)
+    monkeypatch.delenv("INGRESCAN_TRACING", raising=False)
+    monkeypatch.setenv(ADMIN_TOKEN_ENV, TOKEN)
+
+
+def test_untraced_requests_get_no_timing(client, seed_off):
+    seed_off("1")
+    response = client.get("/scan/barcode/1", headers={"X-Trace": "1"})
+    assert "server-timing" not in response.headers
+    assert "x-trace-id" not in response.headers
+
+
+def test_admin_token_traces_a_single_request(client, seed_off):
+    seed_off("1")
+    response = client.get("/scan/barcode/1", headers={"X-Trace": "1", "X-Admin-Token": TOKEN})
+    timing = response.headers["server-timing"]
+    assert timing.startswith("total;dur=")
+    assert "off_lookup;dur=" in timing
+    trace_id = response.headers["x-trace-id"]
+
+    waterfall = client.get(f"/admin/traces/{trace_id}", headers={"X-Admin-Token": TOKEN}).json()
+    assert waterfall["route"] == "/scan/barcode/{barcode}" and waterfall["status"] == 200
+    assert "off_lookup" in [s["name"] for s in waterfall["spans"]]
+    assert client.get("/admin/traces", headers={"X-Admin-Token": TOKEN}).json()[0]["trace_id"] == trace_id
+
+
+def test_tracing_switch_traces_without_a_token(client, seed_off, monkeypatch):
+    monkeypatch.setenv("INGRESCAN_TRACING", "1")
+    seed_off("1")
+    assert "server-timing" in client.get("/scan/barcode/1", headers={"X-Trace": "yes"}).headers
+
+
+def test_trace_endpoints_need_the_admin_token(client):
+    assert client.get("/admin/traces").status_code == 403
+    assert client.get("/admin/traces/nope", headers={"X-Admin-Token": "wrong"}).status_code == 403
+    assert client.get("/admin/traces/nope", headers={"X-Admin-Token": TOKEN}).status_code == 404
@@ -0,0 +1,102 @@
+"""MessagePack negotiation and response compression."""
+import gzip
+
+import pytest
+
+from offline_mode import OFFLINE_ENV
+
+msgpack = pytest.importorskip("msgpack")
+
+from wire_formats import MSGPACK_MEDIA_TYPE, brotli, choose_encoding, compress, pack, prefers_msgpack, unpack  # noqa: E402
+
+BARCODE = "8901234567890"
+
+
+@pytest.fixture(autouse=True)
+def online(monkeypatch):
+    monkeypatch.delenv(OFFLINE_ENV, raising=False)
+
+
+def long_label(n=30):
+    return [{"name": f"ingredient {i}", "common_name": f"Common ingredient {i}",
+             "description": "A commonly used ingredient in packaged foods."} for i in range(n)]
+
+
+@pytest.mark.parametrize("value", [
+    {"barcode": "1", "ingredients": long_label(3), "nutrients": {}, "allergen_warning": None},
+    ["same string", "same string", "abc", "abc", "ünïcödé ünïcödé", "ünïcödé ünïcödé", 1, 2.5, True],
+    {f"key{i}": f"key{i}" for i in range(400)},      # table indexes past one byte
+])
+def test_pack_unpack_round_trip(value):
+    assert unpack(pack(value)) == value
+
+
+def test_repeated_strings_are_sent_once():
+    payload = {"ingredients": long_label(40)}
+    assert len(pack(payload)) < len(msgpack.packb(payload)) * 0.6
+    table = msgpack.Unpacker(raw=False)
+    table.feed(pack(payload))
+    assert table.unpack()[0] in ("name", "common_name", "description")
+
+
+@pytest.mark.parametrize("accept, expected", [
+    (MSGPACK_MEDIA_TYPE, True),
+    (f"{MSGPACK_MEDIA_TYPE}, application/json;q=0.5", True),
+    (f"application/json, {MSGPACK_MEDIA_TYPE};q=0.5", False),
+    (f"{MSGPACK_MEDIA_TYPE};q=0", False),
+    ("*/*", False),
+    (None, False),
+])
+def test_prefers_msgpack(accept, expected):
+    assert prefers_msgpack(accept) is expected
+
+
+def test_choose_encoding():
+    assert choose_encoding("gzip") == "gzip"
+    if brotli is not None:
+        assert choose_encoding("gzip;q=0.5, br") == "br"
+    assert choose_encoding("br;q=0, gzip;q=0") is None
+    assert choose_encoding(None) is None
+
+
+def test_msgpack_scan_carries_the_same_product(client, seed_off):
+    seed_off(BARCODE)
+    as_json = client.get(f"/scan/barcode/{BARCODE}")
+    as_msgpack = client.get(f"/scan/barcode/{BARCODE}", headers={"Accept": MSGPACK_MEDIA_TYPE})
+    assert as_msgpack.headers["content-type"] == MSGPACK_MEDIA_TYPE
+    assert unpack(as_msgpack.content) == as_json.json()
+    assert as_msgpack.headers["etag"] != as_json.headers["etag"]
+
+
+def test_large_bodies_are_compressed_and_get_a_weak_etag(client, seed_off):
+    seed_off(BARCODE, ingredients=long_label())
+    response = client.get(f"/scan/barcode/{BARCODE}", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert "Accept-Encoding" in response.headers["vary"]
+    assert response.headers["etag"].startswith('W/"')
+    assert len(response.json()["ingredients"]) == 30
+    raw = client.get(f"/scan/barcode/{BARCODE}", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in raw.headers
+    assert int(response.headers["content-length"]) < len(raw.content)
+
+
+def test_weak_etag_after_compression_still_revalidates(client, seed_off):
+    seed_off(BARCODE, ingredients=long_label())
+    weak = client.get(f"/scan/barcode/{BARCODE}", headers={"Accept-Encoding": "gzip, br"}).headers["etag"]
+    assert weak.startswith("W/")
+    again = client.get(f"/scan/barcode/{BARCODE}", headers={"Accept-Encoding": "gzip, br", "If-None-Match": weak})
+    assert again.status_code == 304
+    assert again.content == b""
+
+
+def test_small_bodies_are_sent_as_they_are(client, seed_off):
+    seed_off(BARCODE)
+    response = client.get(f"/scan/barcode/{BARCODE}", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers
+    assert not response.headers["etag"].startswith("W/")
+
+
+def test_gzip_output_is_deterministic():
+    body = b'{"a":"' + b"x" * 2000 + b'"}'
+    assert compress(body, "gzip") == compress(body, "gzip")
+    assert gzip.decompress(compress(body, "gzip")) == body
@@ -1,9 +1,24 @@
+import os
+import re
+import sys
 import wikipedia
-import requests
+from urllib.parse import quote
 from allergens import match_allergens
 import pytesseract
 from PIL import Image
 
+# The literal tables below are the source of truth; they are compiled into the
+# shared knowledge base (Ingredients_logic/knowledge_base.py) and lookups read the
+# current KB so that edits are picked up by a hot reload without restarting workers.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "Ingredients_logic"))
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "Ingredients_logic-2"))
+from knowledge_base import get_kb
+from offline_mode import is_offline
+from product_cache import get_product_cache
+import upstream_cache
+from metrics import upstream_call, upstream_get
+from tracing import span
+
 
 def extract_text_from_image(image_path: str) -> str:
     """
@@ -34,8 +49,9 @@ def normalize_ingredient_name(name: str) -> tuple[str, str]:
     If not found, returns (original name, "").
     """
     key = name.lower().strip()
-    if key in INGREDIENT_SYNONYMS:
-        return INGREDIENT_SYNONYMS[key]["common"], INGREDIENT_SYNONYMS[key]["desc"]
+    synonyms = get_kb().section("api_synonyms")
+    if key in synonyms:
+        return synonyms[key]["common"], synonyms[key]["desc"]
     return name, ""
 
 
@@ -53,10 +69,11 @@ SAFE_INGREDIENTS = ["milk", "salt", "water", "sugar", "wheat", "rice"]
 
 def tag_ingredient_safety(ingredient_name: str) -> tuple[str, str]:
     name_lower = ingredient_name.lower()
-    for harmful, reason in HARMFUL_INGREDIENTS.items():
+    kb = get_kb()
+    for harmful, reason in kb.section("harmful_ingredients").items():
         if harmful in name_lower:
             return "harmful", reason
-    if name_lower in SAFE_INGREDIENTS:
+    if name_lower in kb.section("safe_ingredients"):
         return "safe", "Common food ingredient."
     return "moderate", "No specific safety info."
 
@@ -79,43 +96,161 @@ def calculate_health_score(ingredients, allergens, nutrients) -> int:
     return max(score, 0)
 
 
-def suggest_alternatives(product_name: str) -> list[str]:
-    if "butter" in product_name.lower():
-        return ["Amul Lite Butter", "Nutralite Table Spread", "Ghee"]
+# Built-in suggestions for products the catalog cannot place, with the allergens each one contains
+FALLBACK_ALTERNATIVES = {
+    "butter": [("Amul Lite Butter", ["milk"]), ("Nutralite Table Spread", ["milk"]), ("Ghee", ["milk"])],
+}
+
+
+def suggest_alternatives(product_name: str, product: dict = None, barcode: str = None,
+                         user_allergens: list[str] = None, k: int = 3) -> list[str]:
+    """
+    Healthier products from the local catalog (Ingredients_logic-2/alternatives_index.py):
+    same category, better Nutri-Score, none of the user's allergens, closest nutrients first.
+    Falls back to the built-in suggestions when no catalog is configured or nothing matches,
+    minus those containing any of the user's allergens.
+    """
+    from alternatives_index import allergen_classes, get_index
+    if product is not None or barcode:
+        index = get_index()
+        if index is not None:
+            query = product if product is not None else barcode
+            if product is not None and barcode and not product.get("code"):
+                query = dict(product, code=barcode)
+            hits = index.query(query, k=k, allergens=user_allergens or [])
+            if hits:
+                return [h["product_name"] or h["barcode"] for h in hits]
+    avoid = set()
+    for a in user_allergens or []:
+        if a and a.strip():
+            avoid |= allergen_classes(a)
+    name = product_name.lower()
+    for keyword, options in FALLBACK_ALTERNATIVES.items():
+        if keyword in name:
+            return [option for option, contains in options
+                    if not any(allergen_classes(c) & avoid for c in contains)][:k]
     return []
 
 
-# Wikipedia info fetcher for ingredient fallback
+# Ingredient info fetchers (Wikipedia / OFF), cached across requests and workers
+
+
+NEGATIVE_TTL = 60  # seconds an ingredient nobody knows stays cached
+
+
+def _cached_lookup(key: str, fetch, ingredient_name: str, empty: dict):
+    """
+    Serve ingredient lookups from the shared product cache. Offline placeholders and failed
+    lookups (fetch raised ConnectionError, answered with empty) are not stored; empty answers
+    only for NEGATIVE_TTL.
+    """
+    cache = get_product_cache()
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+    try:
+        result = fetch(ingredient_name)
+    except ConnectionError:
+        return empty
+    if not is_offline():
+        cache.set(key, result, None if any(result.values()) else NEGATIVE_TTL)
+    return result
+
+
+WIKIPEDIA_HOST = "en.wikipedia.org"
+WIKIPEDIA_REST_SUMMARY = f"https://{WIKIPEDIA_HOST}/api/rest_v1/page/summary/{{title}}"
+WIKIPEDIA_NO_INFO = "No Wikipedia food info available for this ingredient."
+SUMMARY_SENTENCES = 6
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+(?=[A-Z0-9\"'(])")
+# Network failures (requests exceptions are OSErrors), as opposed to "no such page"
+_WIKIPEDIA_NETWORK_ERRORS = (OSError, wikipedia.HTTPTimeoutError)
 
 
 def fetch_wikipedia_summary(ingredient_name: str) -> str:
+    """
+    Cached Wikipedia lookup. The wikipedia library hides response headers, so the entry is
+    revalidated against the REST summary of the page that answered, which has an ETag; when
+    that page changed, its new extract goes through the same food filter and trimming as
+    the first lookup. Network failures are answered with the placeholder and not cached.
+    """
+    def fetch():
+        summary, title = _wikipedia_lookup(ingredient_name)
+        return summary, WIKIPEDIA_REST_SUMMARY.format(title=quote(title.replace(" ", "_"))) if title else None
+
+    def parse(data):
+        extract = data.get("extract") if data.get("type") == "standard" else None
+        if not extract or not _is_food_summary(extract, ingredient_name):
+            return None
+        return _first_sentences(extract)
+    with span("wikipedia_summary", ingredient=ingredient_name):
+        try:
+            return upstream_cache.lookup(f"wiki:{ingredient_name.lower().strip()}", fetch, stage="wikipedia",
+                                         parse=parse)
+        except ConnectionError:
+            return WIKIPEDIA_NO_INFO
+
+
+def fetch_off_ingredient_info(ingredient_name: str) -> dict:
+    with span("off_ingredient_info", ingredient=ingredient_name):
+        return _cached_lookup(f"off:ingredient:{ingredient_name.lower().strip()}", _fetch_off_ingredient_info,
+                              ingredient_name, {"description": None, "wikipedia": None})
+
+
+def fetch_off_allergen_tags(ingredient_name: str) -> list:
+    """Allergen tags of the first OFF product found for the ingredient."""
+    with span("off_allergen_search", ingredient=ingredient_name):
+        return _cached_lookup(f"off:allergens:{ingredient_name.lower().strip()}", _fetch_off_allergen_tags,
+                              ingredient_name, {"allergens_tags": []})["allergens_tags"]
+
+
+def _first_sentences(text: str, n: int = SUMMARY_SENTENCES) -> str:
+    return " ".join(_SENTENCE_END.split(text.strip())[:n])
+
+
+def _is_food_summary(text, ingredient):
+    # Stricter filter: require ingredient name or food keywords, and reject common non-food topics
+    food_keywords = [
+        "food", "ingredient", "edible", "cooking", "cuisine", "culinary", "consumed", "nutrition",
+        "vegetable", "fruit", "spice", "herb", "dairy", "meat", "grain", "legume", "nut",
+        "flavor", "seasoning", "used in cooking", "used as food"
+    ]
+    negative_keywords = [
+        "board game", "game", "video game", "software", "building", "floor", "storey",
+        "band", "album", "company", "corporation", "film", "movie", "tv series"
+    ]
+    text_lower = text.lower()
+    ingredient_lower = ingredient.lower()
+    if any(nk in text_lower for nk in negative_keywords):
+        return False
+    return ingredient_lower in text_lower or any(word in text_lower for word in food_keywords)
+
+
+def _summary_page(query: str):
+    """
+    (first sentences of the page intro, page title) for query: the same search, page and
+    extract requests as wikipedia.summary(), but keeping the title auto_suggest and redirects chose.
+    """
+    with upstream_call(WIKIPEDIA_HOST, "wikipedia_summary"):
+        page = wikipedia.page(query, auto_suggest=True, redirect=True)
+        return _first_sentences(page.summary), page.title
+
+
+# Wikipedia info fetcher for ingredient fallback
+def _wikipedia_lookup(ingredient_name: str):
     """
     Fetches a summary for the ingredient from Wikipedia using the wikipedia library.
     Tries singular form if plural doesn't return a result.
     Handles any lettercase for the ingredient name.
     Loosened filter: accepts if ingredient name or any food keyword appears in summary.
+    Returns (summary, title of the page that answered), the title being None when nothing did.
+    Raises ConnectionError when nothing was found and some request failed on the network.
     """
+    if is_offline():
+        return WIKIPEDIA_NO_INFO, None
     key = ingredient_name.lower().strip()
     queries_to_try = [ingredient_name, ingredient_name.lower(
     ), ingredient_name.capitalize(), ingredient_name.title()]
 
-    def is_food_summary(text, ingredient):
-        # Stricter filter: require ingredient name or food keywords, and reject common non-food topics
-        food_keywords = [
-            "food", "ingredient", "edible", "cooking", "cuisine", "culinary", "consumed", "nutrition",
-            "vegetable", "fruit", "spice", "herb", "dairy", "meat", "grain", "legume", "nut",
-            "flavor", "seasoning", "used in cooking", "used as food"
-        ]
-        negative_keywords = [
-            "board game", "game", "video game", "software", "building", "floor", "storey",
-            "band", "album", "company", "corporation", "film", "movie", "tv series"
-        ]
-        text_lower = text.lower()
-        ingredient_lower = ingredient.lower()
-        if any(nk in text_lower for nk in negative_keywords):
-            return False
-        return ingredient_lower in text_lower or any(word in text_lower for word in food_keywords)
-
     # Bias queries toward food context to avoid disambiguation like Cheese/Chess, Flour/Floor
     contextual_queries = []
     base = ingredient_name.strip()
@@ -124,26 +259,29 @@ def fetch_wikipedia_summary(ingredient_name: str) -> str:
     ])
     queries_to_try = contextual_queries + queries_to_try
 
+    failed = False
     for q in queries_to_try:
         try:
-            summary = wikipedia.summary(
-                q, sentences=6, auto_suggest=True, redirect=True)
-            if is_food_summary(summary, q):
-                return summary
+            summary, title = _summary_page(q)
+            if _is_food_summary(summary, q):
+                return summary, title
         except wikipedia.DisambiguationError as e:
             # Prefer options with food context first
             preferred = [opt for opt in e.options if any(k in opt.lower() for k in ["food", "ingredient"])]
             rest = [opt for opt in e.options if opt not in preferred]
             for option in preferred + rest:
                 try:
-                    summary = wikipedia.summary(
-                        option, sentences=6, auto_suggest=True, redirect=True)
-                    if is_food_summary(summary, option):
-                        return summary
+                    summary, title = _summary_page(option)
+                    if _is_food_summary(summary, option):
+                        return summary, title
+                except _WIKIPEDIA_NETWORK_ERRORS:
+                    failed = True
                 except Exception:
                     continue
         except wikipedia.PageError:
             continue
+        except _WIKIPEDIA_NETWORK_ERRORS:
+            failed = True
         except Exception:
             continue
     # Try singular form if plural fails
@@ -155,22 +293,48 @@ def fetch_wikipedia_summary(ingredient_name: str) -> str:
         singular_contextual = [f"{singular} (food)", f"{singular} (ingredient)", f"{singular} food", f"{singular} ingredient"]
         for sq in singular_contextual + singular_queries:
             try:
-                summary = wikipedia.summary(
-                    sq, sentences=6, auto_suggest=True, redirect=True)
-                if is_food_summary(summary, sq):
-                    return summary
+                summary, title = _summary_page(sq)
+                if _is_food_summary(summary, sq):
+                    return summary, title
+            except _WIKIPEDIA_NETWORK_ERRORS:
+                failed = True
             except Exception:
                 continue
-    return "No Wikipedia food info available for this ingredient."
+    if failed:
+        raise ConnectionError(f"Wikipedia lookup failed for {ingredient_name!r}")
+    return WIKIPEDIA_NO_INFO, None
 
 
-def fetch_off_ingredient_info(ingredient_name: str) -> dict:
+def _fetch_off_allergen_tags(ingredient_name: str) -> dict:
+    """{"allergens_tags": [...]} from an OFF product search; ConnectionError when the search failed."""
+    if is_offline():
+        return {"allergens_tags": []}
+    try:
+        resp = upstream_get("https://world.openfoodfacts.org/cgi/search.pl", "ingredient_allergen_search",
+                            params={"search_terms": ingredient_name, "search_simple": 1, "action": "process",
+                                    "json": 1, "page_size": 1},
+                            timeout=5)
+        if resp.status_code >= 500 or resp.status_code == 429:
+            raise ConnectionError(f"Open Food Facts search answered {resp.status_code}")
+        products = (resp.json() or {}).get("products") if resp.status_code == 200 else None
+    except (OSError, ValueError) as e:
+        # requests exceptions are OSErrors; ValueError is a body that is not JSON
+        raise ConnectionError(f"Open Food Facts allergen search failed for {ingredient_name!r}") from e
+    return {"allergens_tags": list(products[0].get("allergens_tags") or []) if products else []}
+
+
+def _fetch_off_ingredient_info(ingredient_name: str) -> dict:
     """
     Fetch ingredient information from Open Food Facts ingredient endpoint.
     Tries multiple slug variants and singular form. Returns a dict with keys:
     - description: best human-readable description if available
     - wikipedia: wikipedia page title or url if available
+    Raises ConnectionError when nothing was found and some lookup failed (network error,
+    5xx or 429), since the ingredient may well exist upstream.
     """
+    if is_offline():
+        return {"description": None, "wikipedia": None}
+
     def to_slug(name: str) -> str:
         return name.strip().lower().replace(" ", "-")
 
@@ -195,6 +359,7 @@ def fetch_off_ingredient_info(ingredient_name: str) -> dict:
     ])
 
     seen = set()
+    failed = False
     for cand in candidates:
         slug = to_slug(cand)
         if slug in seen:
@@ -202,10 +367,11 @@ def fetch_off_ingredient_info(ingredient_name: str) -> dict:
         seen.add(slug)
         url = f"https://world.openfoodfacts.org/ingredient/{slug}.json"
         try:
-            resp = requests.get(url, timeout=5)
-            if resp.status_code != 200:
+            status, data = upstream_cache.fetch_json(url, timeout=5, stage="ingredient_info")
+            if status != 200:
+                failed = failed or status >= 500 or status == 429
                 continue
-            data = resp.json() or {}
+            data = data or {}
             # OFF returns fields per language under keys like 'name', 'wikidata', 'wiki', 'description'
             description = None
             # Try direct description
@@ -238,6 +404,9 @@ def fetch_off_ingredient_info(ingredient_name: str) -> dict:
                     "wikipedia": wikipedia_field,
                 }
         except Exception:
+            failed = True
             continue
+    if failed:
+        raise ConnectionError(f"Open Food Facts ingredient lookup failed for {ingredient_name!r}")
     return {"description": None, "wikipedia": None}
 
@@ -0,0 +1,267 @@
+"""
+Compact wire formats for mobile clients.
+
+Content negotiation (Accept) for ProductResponse endpoints:
+
+- application/json: the default
+- application/vnd.ingrescan+msgpack: MessagePack with repeated strings sent
+  once. The body is two MessagePack objects back to back: the string table
+  (a list), then the payload, in which every repeated string (dict keys
+  included) is an ext type 1 holding its big-endian table index. Frequent
+  strings get the low indexes, so most references are 3 bytes:
+
+      unpacker = msgpack.Unpacker(raw=False, ext_hook=lambda code, data: table[int.from_bytes(data, "big")])
+      unpacker.feed(body)
+      table = unpacker.unpack()
+      product = unpacker.unpack()
+
+  (unpack() below does exactly this). Needs the optional msgpack package;
+  without it clients get JSON.
+
+CompressionMiddleware compresses JSON / MessagePack bodies of at least
+minimum_size bytes with brotli (optional brotli package) or gzip, whichever
+Accept-Encoding prefers, and marks the ETag weak as nginx does, since the
+bytes on the wire are no longer the identity representation.
+"""
+import gzip
+from collections import Counter
+from typing import Any, Dict, Optional
+
+from fastapi import Response
+from pydantic import BaseModel
+from starlette.datastructures import Headers, MutableHeaders
+
+from fast_json import FastJSONResponse
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+MSGPACK_MEDIA_TYPE = "application/vnd.ingrescan+msgpack"
+STRING_REF_EXT = 1
+MIN_REF_LENGTH = 4          # shorter strings are cheaper inline than as a 3-byte reference
+COMPRESSIBLE_TYPES = ("application/json", MSGPACK_MEDIA_TYPE, "text/")
+
+
+# ---------- Header parsing ----------
+def _qvalues(header: Optional[str]) -> Dict[str, float]:
+    """{token: q} for an Accept / Accept-Encoding header."""
+    out = {}
+    for part in (header or "").split(","):
+        token, *params = [p.strip() for p in part.split(";")]
+        if not token:
+            continue
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        out[token.lower()] = q
+    return out
+
+
+def prefers_msgpack(accept: Optional[str]) -> bool:
+    """True when the client explicitly asks for MessagePack at least as strongly as for JSON."""
+    if msgpack is None:
+        return False
+    q = _qvalues(accept)
+    wanted = q.get(MSGPACK_MEDIA_TYPE, 0.0)
+    return wanted > 0 and wanted >= max(q.get("application/json", 0.0), q.get("application/*", 0.0),
+                                        q.get("*/*", 0.0))
+
+
+def choose_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """"br" or "gzip" (or None) by the client's q-values; brotli wins ties when installed."""
+    q = _qvalues(accept_encoding)
+    candidates = (["br"] if brotli is not None else []) + ["gzip"]
+    best = max(candidates, key=lambda c: q.get(c, q.get("*", 0.0)))
+    return best if q.get(best, q.get("*", 0.0)) > 0 else None
+
+
+# ---------- MessagePack with a string table ----------
+def _count_strings(value: Any, counts: Counter):
+    if isinstance(value, str):
+        counts[value] += 1
+    elif isinstance(value, dict):
+        for k, v in value.items():
+            counts[k] += 1
+            _count_strings(v, counts)
+    elif isinstance(value, (list, tuple)):
+        for v in value:
+            _count_strings(v, counts)
+
+
+def _with_refs(value: Any, index: Dict[str, Any]) -> Any:
+    if isinstance(value, str):
+        return index.get(value, value)
+    if isinstance(value, dict):
+        return {index.get(k, k): _with_refs(v, index) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_with_refs(v, index) for v in value]
+    return value
+
+
+def pack(content: Any) -> bytes:
+    """String table + payload, as described in the module docstring."""
+    counts = Counter()
+    _count_strings(content, counts)
+    table = [s for s, n in counts.most_common() if n > 1 and len(s) >= MIN_REF_LENGTH]
+    index = {}
+    for i, s in enumerate(table):
+        width = 1 if i < 0x100 else 2 if i < 0x10000 else 4
+        index[s] = msgpack.ExtType(STRING_REF_EXT, i.to_bytes(width, "big"))
+    return msgpack.packb(table, use_bin_type=True) + msgpack.packb(_with_refs(content, index), use_bin_type=True)
+
+
+def unpack(body: bytes) -> Any:
+    table = []
+
+    def ext_hook(code, data):
+        if code != STRING_REF_EXT:
+            return msgpack.ExtType(code, data)
+        return table[int.from_bytes(data, "big")]
+
+    unpacker = msgpack.Unpacker(raw=False, ext_hook=ext_hook)
+    unpacker.feed(body)
+    table.extend(unpacker.unpack())
+    return unpacker.unpack()
+
+
+class MsgpackResponse(Response):
+    media_type = MSGPACK_MEDIA_TYPE
+
+    def render(self, content: Any) -> bytes:
+        return pack(content)
+
+
+def negotiated(content: Any, accept: Optional[str], response: Optional[Response] = None,
+               headers: Optional[Dict[str, str]] = None):
+    """
+    content (a pydantic model, or a trusted dict) in the format the client asked for.
+    JSON models are handed back to FastAPI's response_model path, with headers set on response.
+    """
+    headers = dict(headers or {}, Vary="Accept")
+    if prefers_msgpack(accept):
+        payload = content.model_dump() if isinstance(content, BaseModel) else content
+        return MsgpackResponse(payload, headers=headers)
+    if not isinstance(content, BaseModel):
+        return FastJSONResponse(content, headers=headers)
+    if response is not None:
+        response.headers.update(headers)
+    return content
+
+
+def media_type_for(accept: Optional[str]) -> str:
+    return MSGPACK_MEDIA_TYPE if prefers_msgpack(accept) else "application/json"
+
+
+# ---------- Compression ----------
+def compress(body: bytes, encoding: str, gzip_level: int = 6, brotli_quality: int = 5) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=brotli_quality)
+    return gzip.compress(body, compresslevel=gzip_level, mtime=0)
+
+
+class CompressionMiddleware:
+    """ASGI middleware: brotli / gzip for single-body JSON and MessagePack responses above minimum_size."""
+
+    def __init__(self, app, minimum_size: int = 1024, gzip_level: int = 6, brotli_quality: int = 5):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding"))
+        start = None
+
+        async def send_compressed(message):
+            nonlocal start
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            if start is None:
+                await send(message)
+                return
+            headers = MutableHeaders(raw=start["headers"])
+            if headers.get("content-type", "").startswith(COMPRESSIBLE_TYPES):
+                headers.add_vary_header("Accept-Encoding")
+                body = message.get("body", b"")
+                if (encoding and not message.get("more_body") and len(body) >= self.minimum_size
+                        and "content-encoding" not in headers):
+                    body = compress(body, encoding, self.gzip_level, self.brotli_quality)
+                    headers["Content-Encoding"] = encoding
+                    headers["Content-Length"] = str(len(body))
+                    etag = headers.get("etag")
+                    if etag and not etag.startswith("W/"):
+                        headers["ETag"] = "W/" + etag
+                    message = dict(message, body=body)
+            await send(start)
+            start = None
+            await send(message)
+
+        await self.app(scope, receive, send_compressed)
+
+
+# 🔍 Example: bytes on the wire for typical responses
+if __name__ == "__main__":
+    import json
+    import os
+    import random
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    with open(os.path.join(here, os.pardir, "Ingredients_logic", "ingredient_db.json"), encoding="utf-8") as f:
+        db = json.load(f)
+    with open(os.path.join(here, os.pardir, "Ingredients_logic", "ingredient_cache.json"), encoding="utf-8") as f:
+        db.update(json.load(f))
+    entries = list(db.items())
+    rng = random.Random(3)
+    no_info = "No Wikipedia food info available for this ingredient."
+
+    def product(n_ingredients, paragraphs, unknown_share):
+        ingredients = []
+        for name, info in rng.sample(entries, min(n_ingredients, len(entries))):
+            if rng.random() < unknown_share:
+                description = no_info
+            else:
+                # Wikipedia-style multi-paragraph text assembled from distinct local descriptions
+                description = "\n\n".join(" ".join(e["description"] for _, e in rng.sample(entries, 4))
+                                          for _ in range(paragraphs))
+            ingredients.append({"name": name, "type": None, "safety": info.get("risk_level", "safe"),
+                                "reason": "Common ingredient", "common_name": info.get("common_name"),
+                                "description": description})
+        return {"barcode": "manual", "product_name": "Manual Entry", "ingredients": ingredients,
+                "nutrients": {}, "allergens": [], "health_score": 7, "rating": "Moderate",
+                "source": "manual_entry", "status": "manual_entry", "alternatives": [], "allergen_warning": ""}
+
+    samples = {"barcode (10 ingr.)": product(10, 0, 1.0),
+               "scan, short descriptions": product(12, 1, 0.3),
+               "scan, multi-paragraph": product(20, 3, 0.2),
+               "scan, large label": product(40, 3, 0.2)}
+    print(f"{'':>26} | {'json':>7} | {'json+gzip':>9} | {'json+br':>7} | {'msgpack':>7} | {'mp+table':>8} | "
+          f"{'mp+table+br':>11}")
+    for label, payload in samples.items():
+        raw = json.dumps(payload, separators=(",", ":")).encode()
+        sizes = [len(raw), len(compress(raw, "gzip"))]
+        sizes.append(len(compress(raw, "br")) if brotli is not None else None)
+        if msgpack is not None:
+            packed = pack(payload)
+            assert unpack(packed) == payload
+            sizes += [len(msgpack.packb(payload)), len(packed),
+                      len(compress(packed, "br")) if brotli is not None else None]
+        else:
+            sizes += [None, None, None]
+        cells = [f"{s:>{w}}" if s is not None else f"{'n/a':>{w}}" for s, w in zip(sizes, (7, 9, 7, 7, 8, 11))]
+        print(f"{label:>26} | " + " | ".join(cells))
@@ -0,0 +1,341 @@
+"""alternatives_index.py
+
+Nearest-neighbour index for healthier alternatives from the local product catalog.
+
+Each product is reduced to a nutrient vector (energy, fat, saturated fat,
+carbohydrates, sugars, fiber, protein, salt), scaled per nutrient to the
+catalog's 1st–99th percentile range and quantized to uint8, plus its Nutri-Score
+(batch_scoring) and an allergen matrix built from allergens_tags / traces_tags.
+Products are grouped by every category tag they carry.
+
+Allergens on both sides (product tags and the user's list) are reduced to the
+knowledge base's allergen names through its allergen_terms table, so
+"en:soybeans" and "soya" both mean soy and "almonds" means tree nut. Group
+words cover several allergens: "nuts" (the OFF tag or a user entry) excludes
+peanut and tree nut products alike.
+
+A query picks the scanned product's most specific category with enough
+candidates, keeps those with a strictly better Nutri-Score and none of the
+user's allergens, and returns the k closest by squared L2 distance over the
+quantized vectors — one vectorized pass over that category.
+
+    index = AlternativesIndex.build(products)           # OFF product dicts
+    index.query(product_or_barcode, k=5, allergens=["milk"])
+
+The catalog is read from INGRESCAN_CATALOG (JSON lines or a JSON list of OFF
+products), default Ingredients_logic-2/product_catalog.jsonl; get_index()
+returns None when no catalog is available.
+"""
+from __future__ import annotations
+import json
+import os
+import re
+import sys
+import threading
+from typing import Dict, Any, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "Ingredients_logic"))
+from knowledge_base import get_kb, on_change
+
+from nutrient_store import NutrientCatalog, to_float
+from batch_scoring import nutri_score_batch
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+CATALOG_FILE = os.environ.get("INGRESCAN_CATALOG", os.path.join(script_dir, "product_catalog.jsonl"))
+
+FEATURES = ("energy-kj_100g", "fat_100g", "saturated-fat_100g", "carbohydrates_100g",
+            "sugars_100g", "fiber_100g", "proteins_100g", "salt_100g")
+MIN_CANDIDATES = 5
+
+# Words naming a group of allergens rather than one (OFF tags and user entries alike)
+ALLERGEN_GROUPS = {
+    "nut": ("peanut", "tree nut"),
+    "crustacean": ("shellfish",),
+    "mollusc": ("shellfish",),
+    "dairy": ("lactose",),
+}
+
+
+# ---------- Product helpers ----------
+def _slug(text: str) -> str:
+    text = text.strip().lower()
+    if ":" not in text:
+        text = "en:" + re.sub(r"\s+", "-", text)
+    return text
+
+
+def product_categories(product: Dict[str, Any]) -> List[str]:
+    """Category tags from general to specific (categories_tags, else the categories string)."""
+    tags = product.get("categories_tags")
+    if tags:
+        return [t.lower() for t in tags]
+    raw = product.get("categories_en") or product.get("categories") or ""
+    return [_slug(c) for c in raw.split(",") if c.strip()]
+
+
+def normalize_allergen(tag: str) -> str:
+    """'en:peanuts' / 'Peanut' -> 'peanut'"""
+    tag = tag.strip().lower().split(":", 1)[-1].replace("-", " ").replace("_", " ")
+    if tag.endswith("s") and not tag.endswith("ss"):
+        tag = tag[:-1]
+    return tag
+
+
+def allergen_classes(tag: str, allergen_terms: Optional[Dict[str, List[str]]] = None) -> set:
+    """
+    'en:soybeans' / 'soya' -> {'soy'}, 'nuts' -> {'peanut', 'tree nut'},
+    'en:celery' -> {'celery'}: names the KB does not know keep their normalized form.
+    """
+    terms = allergen_terms if allergen_terms is not None else get_kb().section("allergen_terms")
+    name = tag.strip().lower().split(":", 1)[-1].replace("-", " ").replace("_", " ")
+    classes = set()
+    for part in name.split(" and "):
+        part = " ".join(part.split())
+        if not part:
+            continue
+        for form in (part, normalize_allergen(part)):
+            if form in terms:
+                classes.update(terms[form])
+                break
+            if form in ALLERGEN_GROUPS:
+                classes.update(ALLERGEN_GROUPS[form])
+                break
+        else:
+            classes.add(normalize_allergen(part))
+    return classes
+
+
+def product_allergens(product: Dict[str, Any], allergen_terms: Optional[Dict[str, List[str]]] = None) -> set:
+    terms = allergen_terms if allergen_terms is not None else get_kb().section("allergen_terms")
+    tags = list(product.get("allergens_tags") or []) + list(product.get("traces_tags") or [])
+    classes = set()
+    for t in tags:
+        if t:
+            classes |= allergen_classes(t, terms)
+    return classes
+
+
+def _nutrient_vector(product: Dict[str, Any]) -> np.ndarray:
+    n = product.get("nutriments") or {}
+    values = [to_float(n.get(f)) for f in FEATURES]
+    if np.isnan(values[0]):
+        kcal = to_float(n.get("energy-kcal_100g"))
+        values[0] = to_float(n.get("energy_100g")) if np.isnan(kcal) else kcal * 4.184
+    return np.nan_to_num(np.array(values, dtype=np.float64), nan=0.0)
+
+
+def _quantize(raw: np.ndarray, lows: np.ndarray, spans: np.ndarray) -> np.ndarray:
+    """Scale each nutrient to its catalog percentile range and store it in one byte."""
+    scaled = (raw - lows) / spans
+    return np.clip(np.rint(scaled * 255.0), 0, 255).astype(np.uint8)
+
+
+def _barcode(product: Dict[str, Any]) -> Optional[str]:
+    code = product.get("code") or product.get("_id")
+    return str(code) if code else None
+
+
+# ---------- Index ----------
+class AlternativesIndex:
+    """Per-category candidate lists over quantized nutrient vectors."""
+
+    def __init__(self, barcodes, names, vectors, lows, spans, scores, grades, allergen_matrix, allergen_vocab, categories):
+        self.barcodes = barcodes
+        self.names = names
+        self.vectors = vectors                    # (N, D) uint8
+        self._lows = lows
+        self._spans = spans
+        self.scores = scores                      # (N,) Nutri-Score, lower is better
+        self.grades = grades
+        self.allergen_matrix = allergen_matrix    # (N, V) bool
+        self.allergen_vocab = allergen_vocab      # allergen -> column
+        self.categories = categories              # tag -> (rows int32 sorted by score)
+        self._row = {b: i for i, b in enumerate(barcodes)}
+        self._product_categories: Dict[int, List[str]] = {}
+
+    @classmethod
+    def build(cls, products: Iterable[Dict[str, Any]]) -> "AlternativesIndex":
+        products = [p for p in products if _barcode(p)]
+        catalog = NutrientCatalog.from_products(products)
+        ns = nutri_score_batch(**catalog.nutriscore_columns())
+
+        raw = np.array([_nutrient_vector(p) for p in products], dtype=np.float64).reshape(-1, len(FEATURES))
+        if len(raw):
+            lows = np.percentile(raw, 1, axis=0)
+            highs = np.percentile(raw, 99, axis=0)
+        else:
+            lows = highs = np.zeros(len(FEATURES))
+        spans = np.where(highs > lows, highs - lows, 1.0)
+
+        vocab: Dict[str, int] = {}
+        terms = get_kb().section("allergen_terms")
+        product_sets = [product_allergens(p, terms) for p in products]
+        for tags in product_sets:
+            for t in tags:
+                vocab.setdefault(t, len(vocab))
+        allergen_matrix = np.zeros((len(products), len(vocab)), dtype=bool)
+        for i, tags in enumerate(product_sets):
+            for t in tags:
+                allergen_matrix[i, vocab[t]] = True
+
+        members: Dict[str, List[int]] = {}
+        product_cats = []
+        for i, p in enumerate(products):
+            cats = product_categories(p)
+            product_cats.append(cats)
+            for c in cats:
+                members.setdefault(c, []).append(i)
+        scores = ns["score"]
+        categories = {}
+        for c, rows in members.items():
+            rows = np.array(rows, dtype=np.int32)
+            categories[c] = rows[np.argsort(scores[rows], kind="stable")]
+
+        index = cls(
+            barcodes=[_barcode(p) for p in products],
+            names=[p.get("product_name") or p.get("product_name_en") or p.get("generic_name") or "" for p in products],
+            vectors=_quantize(raw, lows, spans),
+            lows=lows, spans=spans, scores=scores, grades=ns["grade"],
+            allergen_matrix=allergen_matrix, allergen_vocab=vocab, categories=categories,
+        )
+        index._product_categories = dict(enumerate(product_cats))
+        return index
+
+    def __len__(self) -> int:
+        return len(self.barcodes)
+
+    def _allergen_columns(self, allergens: Sequence[str]) -> List[int]:
+        classes = set()
+        for a in allergens or []:
+            if a and a.strip():
+                classes |= allergen_classes(a)
+        return [self.allergen_vocab[c] for c in sorted(classes) if c in self.allergen_vocab]
+
+    def query(self, product, k: int = 5, allergens: Sequence[str] = (), min_candidates: int = MIN_CANDIDATES) -> List[Dict[str, Any]]:
+        """
+        k closest products in the same category with a strictly better Nutri-Score
+        and none of the given allergens. product is a barcode in the index or an OFF product dict.
+        """
+        if isinstance(product, str):
+            row = self._row.get(product)
+            if row is None:
+                return []
+            vector = self.vectors[row].astype(np.int32)
+            score = self.scores[row]
+            cats = self._product_categories.get(row, [])
+        else:
+            row = self._row.get(_barcode(product) or "")
+            vector = _quantize(_nutrient_vector(product)[None, :], self._lows, self._spans)[0].astype(np.int32)
+            if row is not None:
+                score = self.scores[row]
+            else:
+                single = NutrientCatalog.from_products([dict(product, code=product.get("code") or "query")])
+                score = nutri_score_batch(**single.nutriscore_columns())["score"][0]
+            cats = product_categories(product)
+
+        # Most specific category that still has enough better-scored candidates
+        candidates = None
+        category = None
+        for c in reversed(cats):
+            rows = self.categories.get(c)
+            if rows is None:
+                continue
+            better = rows[:np.searchsorted(self.scores[rows], score, side="left")]
+            if candidates is None or len(better) >= min_candidates:
+                candidates, category = better, c
+            if len(better) >= min_candidates:
+                break
+        if candidates is None or len(candidates) == 0:
+            return []
+        if row is not None:
+            candidates = candidates[candidates != row]
+
+        cols = self._allergen_columns(allergens)
+        if cols:
+            candidates = candidates[~self.allergen_matrix[candidates][:, cols].any(axis=1)]
+        if len(candidates) == 0:
+            return []
+
+        diff = self.vectors[candidates].astype(np.int32) - vector
+        dist = np.einsum("ij,ij->i", diff, diff)
+        take = min(k, len(candidates))
+        nearest = np.argpartition(dist, take - 1)[:take]
+        nearest = nearest[np.lexsort((self.scores[candidates[nearest]], dist[nearest]))]
+        return [{
+            "barcode": self.barcodes[r],
+            "product_name": self.names[r],
+            "category": category,
+            "nutri_score": int(self.scores[r]),
+            "grade": str(self.grades[r]),
+            "distance": int(dist[i]),
+        } for i, r in zip(nearest.tolist(), candidates[nearest].tolist())]
+
+
+# ---------- Shared index ----------
+def load_products(path: str = CATALOG_FILE) -> List[Dict[str, Any]]:
+    with open(path, "r", encoding="utf-8") as f:
+        head = f.read(1)
+        f.seek(0)
+        if head == "[":
+            return json.load(f)
+        return [json.loads(line) for line in f if line.strip()]
+
+
+_index: Optional[AlternativesIndex] = None
+_index_checked = False
+_index_lock = threading.Lock()
+
+
+def get_index() -> Optional[AlternativesIndex]:
+    """Index over CATALOG_FILE, built once on first use (concurrent callers wait); None without a catalog."""
+    global _index, _index_checked
+    if not _index_checked:
+        with _index_lock:
+            if not _index_checked:
+                if os.path.exists(CATALOG_FILE):
+                    _index = AlternativesIndex.build(load_products(CATALOG_FILE))
+                _index_checked = True
+    return _index
+
+
+def _drop_index(kb, changed_sections):
+    """Allergen columns come from the KB's allergen terms: rebuild on next use when they change."""
+    global _index, _index_checked
+    with _index_lock:
+        _index, _index_checked = None, False
+
+
+on_change(["allergen_terms"], _drop_index)
+
+
+# 🔍 Example: synthetic catalog, query latency
+if __name__ == "__main__":
+    import time
+
+    rng = np.random.default_rng(2)
+    cats = ["en:spreads", "en:breakfast-cereals", "en:biscuits", "en:sodas", "en:chips"]
+    allergens = ["en:milk", "en:gluten", "en:nuts", "en:soybeans"]
+    products = []
+    for i in range(100_000):
+        c = cats[i % len(cats)]
+        products.append({
+            "code": str(8900000000000 + i), "product_name": f"{c[3:]} #{i}",
+            "categories_tags": ["en:foods", c],
+            "allergens_tags": list(rng.choice(allergens, rng.integers(0, 3), replace=False)),
+            "nutriments": {"energy-kj_100g": float(rng.uniform(100, 2500)), "fat_100g": float(rng.uniform(0, 40)),
+                           "saturated-fat_100g": float(rng.uniform(0, 15)), "carbohydrates_100g": float(rng.uniform(0, 80)),
+                           "sugars_100g": float(rng.uniform(0, 50)), "fiber_100g": float(rng.uniform(0, 8)),
+                           "proteins_100g": float(rng.uniform(0, 20)), "salt_100g": float(rng.uniform(0, 3))},
+        })
+    start = time.perf_counter()
+    index = AlternativesIndex.build(products)
+    print(f"Indexed {len(index):,} products in {time.perf_counter() - start:.2f}s")
+
+    start = time.perf_counter()
+    queries = 200
+    for q in range(queries):
+        hits = index.query(products[q]["code"], k=3, allergens=["milk"])
+    print(f"{(time.perf_counter() - start) / queries * 1000:.2f} ms/query (20k products per category)")
+    print(f"{products[queries - 1]['product_name']} -> {[h['product_name'] for h in hits]}")
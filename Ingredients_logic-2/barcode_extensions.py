@@ -10,55 +10,38 @@ Features implemented (chosen 2 core enhancements):
 Optional extras also included (diet heuristic + JSON export) but isolated.
 """
 from __future__ import annotations
-import time
+import os
+import sys
 import json
 import requests
-from collections import OrderedDict
 from typing import Dict, Any, Optional, List
 
 # Import the original module to leverage existing scoring / flagging logic
 import ingrescan_barcode2 as base
 
-# ------------------ CACHING (Feature 1) ------------------
-class _LRUCache:
-    def __init__(self, maxsize: int = 32, ttl_seconds: int = 300):
-        self.maxsize = maxsize
-        self.ttl = ttl_seconds
-        self._store: OrderedDict[str, tuple[float, dict]] = OrderedDict()
-
-    def get(self, key: str) -> Optional[dict]:
-        now = time.time()
-        if key in self._store:
-            ts, val = self._store[key]
-            if now - ts < self.ttl:
-                self._store.move_to_end(key)
-                return val
-            else:
-                del self._store[key]
-        return None
-
-    def set(self, key: str, value: dict) -> None:
-        if key in self._store:
-            self._store.move_to_end(key)
-        self._store[key] = (time.time(), value)
-        if len(self._store) > self.maxsize:
-            self._store.popitem(last=False)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "Ingredients_logic"))
+from offline_mode import is_offline
+from product_cache import get_product_cache
 
-_cache = _LRUCache()
+# ------------------ CACHING (Feature 1) ------------------
+# Shared, byte-budgeted TinyLFU cache (Ingredients_logic/product_cache.py); the API and batch_cli use it too
+_cache = get_product_cache()
 
 API_BASE = "https://world.openfoodfacts.org/api/v0/product/{barcode}.json"
 
 def fetch_product(barcode: str) -> Optional[dict]:
     """Fetch product JSON with caching and graceful failure."""
-    cached = _cache.get(barcode)
+    cached = _cache.get(f"off:{barcode}")
     if cached is not None:
         return cached
+    if is_offline():
+        return None
     try:
         resp = requests.get(API_BASE.format(barcode=barcode), timeout=8)
         data = resp.json()
         if data.get("status") == 1:
             prod = data.get("product", {})
-            _cache.set(barcode, prod)
+            _cache.set(f"off:{barcode}", prod)
             return prod
         return None
     except Exception:
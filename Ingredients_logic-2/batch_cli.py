@@ -0,0 +1,283 @@
+"""batch_cli.py
+
+Non-interactive batch runner for the barcode analyzers.
+
+ingrescan.analyze_product and score_from_barcode prompt for a profile, manual
+nutrients and confirmations; this command never does. Products OFF does not
+know are reported as "not_found", and data that fails validate_nutrients is
+scored anyway but marked "suspicious" (or "rejected" with --reject-suspicious).
+In offline mode (INGRESCAN_OFFLINE=1) every row also has "offline": true, since
+"not_found" then only means the product is not in the local cache.
+
+    python batch_cli.py barcodes.csv --profile profile.json -o results.jsonl
+    cat barcodes.txt | python batch_cli.py - --workers 32 > results.jsonl
+    python batch_cli.py barcodes.jsonl -o results.jsonl --resume
+
+Input: CSV (a "barcode"/"code" column, else the first column), JSONL (objects
+with "barcode"/"code", or bare strings) or one barcode per line; "-" is stdin.
+Profile: JSON {"conditions": ["diabetes", ...], "allergies": ["milk", ...]}.
+
+Each result is one JSON line, written as soon as it completes. Progress and the
+final throughput / failure summary go to stderr.
+"""
+from __future__ import annotations
+import argparse
+import csv
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Dict, Any, Iterator, List, Optional
+
+import requests
+
+import ingrescan
+import ingrescan_barcode1 as barcode_scoring
+from offline_mode import is_offline  # on sys.path via ingrescan
+from nutrient_store import to_float
+from product_cache import get_product_cache
+
+API_URL = "https://world.openfoodfacts.org/api/v0/product/{barcode}.json"
+USER_AGENT = "IngreScan-batch/1.0"
+
+# ---------- Input ----------
+def read_barcodes(path: str) -> Iterator[str]:
+    """Yield barcodes from CSV / JSONL / plain text ("-" = stdin), skipping blanks."""
+    f = sys.stdin if path == "-" else open(path, "r", encoding="utf-8", newline="")
+    try:
+        if path.endswith(".csv"):
+            reader = csv.reader(f)
+            header = next(reader, None)
+            col = 0
+            if header:
+                lowered = [h.strip().lower() for h in header]
+                if "barcode" in lowered or "code" in lowered:
+                    col = lowered.index("barcode") if "barcode" in lowered else lowered.index("code")
+                elif header[0].strip():
+                    yield header[0].strip()
+            for row in reader:
+                if len(row) > col and row[col].strip():
+                    yield row[col].strip()
+            return
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if line[0] in "{\"":
+                item = json.loads(line)
+                code = item if isinstance(item, str) else item.get("barcode") or item.get("code")
+                if code:
+                    yield str(code).strip()
+            else:
+                yield line.split(",")[0].strip()
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+
+def load_profile(path: Optional[str]) -> Dict[str, List[str]]:
+    if not path:
+        return {"conditions": [], "allergies": []}
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    return {
+        "conditions": [c.strip().lower() for c in data.get("conditions", []) if c.strip()],
+        "allergies": [a.strip().lower() for a in data.get("allergies", []) if a.strip()],
+    }
+
+
+# ---------- Fetch ----------
+_local = threading.local()
+
+
+def _session() -> requests.Session:
+    if not hasattr(_local, "session"):
+        _local.session = requests.Session()
+        _local.session.headers["User-Agent"] = USER_AGENT
+    return _local.session
+
+
+def fetch_product(barcode: str, timeout: float = 10.0, retries: int = 2) -> Optional[Dict[str, Any]]:
+    """OFF product dict, None when unknown. Retries timeouts / 429 / 5xx with backoff."""
+    cache = get_product_cache()
+    cached = cache.get(f"off:{barcode}")
+    if cached is not None or is_offline():
+        return cached
+    for attempt in range(retries + 1):
+        try:
+            r = _session().get(API_URL.format(barcode=barcode), timeout=timeout)
+            if r.status_code == 200:
+                data = r.json()
+                if data.get("status") != 1 or not data.get("product"):
+                    return None
+                cache.set(f"off:{barcode}", data["product"])
+                return data["product"]
+            if r.status_code == 404:
+                return None
+            if r.status_code != 429 and r.status_code < 500:
+                r.raise_for_status()
+        except (requests.Timeout, requests.ConnectionError):
+            if attempt == retries:
+                raise
+        time.sleep(0.5 * 2 ** attempt)
+    raise RuntimeError(f"OFF kept failing for {barcode}")
+
+
+# ---------- Analysis (no prompts) ----------
+def clean_nutriments(nutriments: Dict[str, Any]) -> Dict[str, float]:
+    """OFF nutriments with "80g"-style strings parsed; unparseable values dropped (the scorers expect numbers)."""
+    out = {}
+    for k, v in (nutriments or {}).items():
+        value = to_float(v)
+        if value == value:
+            out[k] = value
+    return out
+
+
+def analyze(barcode: str, product: Optional[Dict[str, Any]], profile: Dict[str, List[str]],
+            reject_suspicious: bool = False) -> Dict[str, Any]:
+    """ingrescan.analyze_product + the barcode Nutri-Score/verdict, without any input()."""
+    if not product:
+        return {"barcode": barcode, "status": "not_found"}
+
+    product = dict(product, nutriments=clean_nutriments(product.get("nutriments")))
+    nutrients = dict(product["nutriments"])
+    nutrients.setdefault("carbohydrates_100g", 0)
+    ingredients_text = (product.get("ingredients_text", "") or product.get("ingredients_text_en", "") or "").lower()
+
+    suspicious, validation = ingrescan.validate_nutrients(nutrients, ingredients_text)
+    if suspicious and reject_suspicious:
+        return {"barcode": barcode, "status": "rejected", "validation_warnings": validation}
+
+    base_score = ingrescan.score_nutrients(nutrients)
+    adjust, health_warnings = ingrescan.apply_health_rules(nutrients, ingredients_text, profile["conditions"])
+    final_score = max(1, min(10, base_score + adjust))
+    allergy_warnings = [ingrescan.prefixed(f"Contains your allergen: {a}", "HIGH")
+                        for a in profile["allergies"] if a in ingredients_text]
+    warnings = list(dict.fromkeys(allergy_warnings + ingrescan.ingredient_warnings(ingredients_text)
+                                  + health_warnings + validation))
+
+    energy_kj, sugars_g, sat_g, sodium_mg, fruit_pct, fiber_g, protein_g = barcode_scoring.extract_for_nutriscore(product)
+    inputs = {"energy_kj": energy_kj, "sugars_g": sugars_g, "sat_fat_g": sat_g, "sodium_mg": sodium_mg,
+              "fruit_pct": fruit_pct, "fiber_g": fiber_g, "protein_g": protein_g}
+    ns = barcode_scoring.nutri_score_full(**inputs)
+    health = barcode_scoring.custom_health_score(inputs)
+    flags = barcode_scoring.flag_ingredients(ingredients_text)
+    nutrient_warnings = barcode_scoring.nutrition_warnings(inputs)
+
+    return {
+        "barcode": barcode,
+        "status": "suspicious" if suspicious else "ok",
+        "product_name": product.get("product_name") or product.get("generic_name") or "Unknown",
+        "score": final_score,
+        "tier": "Daily" if final_score >= 8 else "Moderate" if final_score >= 5 else "Occasional",
+        "nutri_score": ns["score"],
+        "nutri_grade": ns["grade"],
+        "custom_health_score": health,
+        "verdict": barcode_scoring.consumption_verdict(health, flags, nutrient_warnings),
+        "warnings": warnings,
+        "ingredient_flags": [f["label"] for f in flags],
+    }
+
+
+def process(barcode: str, profile: Dict[str, List[str]], args) -> Dict[str, Any]:
+    started = time.perf_counter()
+    try:
+        product = fetch_product(barcode, timeout=args.timeout)
+        result = analyze(barcode, product, profile, args.reject_suspicious)
+    except Exception as e:
+        result = {"barcode": barcode, "status": "error", "error": f"{e.__class__.__name__}: {e}"}
+    if is_offline():
+        result["offline"] = True
+    result["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    return result
+
+
+# ---------- Runner ----------
+def _done_barcodes(path: str) -> set:
+    done = set()
+    if path and os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    item = json.loads(line)
+                except ValueError:
+                    continue
+                if item.get("status") != "error":
+                    done.add(item.get("barcode"))
+    return done
+
+
+def run(barcodes, profile, out, args) -> Dict[str, Any]:
+    """Stream results to out with a bounded number of in-flight lookups; returns the summary."""
+    counts: Dict[str, int] = {}
+    started = time.perf_counter()
+    last_report = started
+    total = 0
+    window = max(1, args.workers * 4)
+
+    def emit(result):
+        nonlocal total, last_report
+        out.write(json.dumps(result, ensure_ascii=False) + "\n")
+        total += 1
+        counts[result["status"]] = counts.get(result["status"], 0) + 1
+        now = time.perf_counter()
+        if args.progress and now - last_report >= args.progress:
+            last_report = now
+            out.flush()
+            print(f"[batch] {total:,} done, {total / (now - started):.1f}/s, {counts}", file=sys.stderr)
+
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        pending = set()
+        for barcode in barcodes:
+            pending.add(pool.submit(process, barcode, profile, args))
+            if len(pending) >= window:
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for fut in finished:
+                    emit(fut.result())
+        for fut in pending:
+            emit(fut.result())
+    out.flush()
+
+    elapsed = time.perf_counter() - started
+    return {
+        "processed": total,
+        "elapsed_s": round(elapsed, 2),
+        "per_second": round(total / elapsed, 2) if elapsed else None,
+        "statuses": counts,
+        "failures": counts.get("error", 0),
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Score barcodes in bulk without prompts; writes JSON lines.")
+    parser.add_argument("input", help="CSV / JSONL / text file of barcodes, or - for stdin")
+    parser.add_argument("--profile", help="JSON file with conditions and allergies")
+    parser.add_argument("-o", "--output", help="JSONL output file (default stdout)")
+    parser.add_argument("--workers", type=int, default=16, help="concurrent OFF lookups")
+    parser.add_argument("--timeout", type=float, default=10.0, help="per-request timeout (s)")
+    parser.add_argument("--reject-suspicious", action="store_true", help="do not score data that fails validation")
+    parser.add_argument("--resume", action="store_true", help="append to --output, skipping barcodes already done")
+    parser.add_argument("--progress", type=float, default=30.0, help="seconds between progress lines (0 = off)")
+    args = parser.parse_args(argv)
+
+    profile = load_profile(args.profile)
+    barcodes = read_barcodes(args.input)
+    if args.resume and args.output:
+        done = _done_barcodes(args.output)
+        barcodes = (b for b in barcodes if b not in done)
+
+    out = open(args.output, "a" if args.resume else "w", encoding="utf-8") if args.output else sys.stdout
+    try:
+        summary = run(barcodes, profile, out, args)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    print(json.dumps({"summary": summary}), file=sys.stderr)
+    return 1 if summary["processed"] and summary["failures"] == summary["processed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
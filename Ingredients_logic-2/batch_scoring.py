@@ -0,0 +1,170 @@
+"""batch_scoring.py
+
+Vectorized versions of the per-product scorers, for whole catalogs at once:
+
+- nutri_score_batch      == ingrescan_barcode.nutri_score_full (score, grade, breakdown)
+- custom_health_score_batch == ingrescan_barcode(1).custom_health_score
+- score_nutrients_batch  == ingrescan.score_nutrients
+
+Every function takes equal-length arrays (one entry per product) and returns
+numpy arrays whose values match the scalar functions exactly, including NaN
+handling and Python's round(). Threshold points are a single searchsorted per
+nutrient instead of a Python generator per product.
+"""
+from __future__ import annotations
+import time
+from typing import Dict, Any, List, Sequence
+
+import numpy as np
+
+# ---------- Nutri-Score tables (same thresholds as nutri_score_full) ----------
+ENERGY_KJ = [335, 670, 1005, 1340, 1675, 2010, 2345, 2680, 3015, 3350]
+SUGARS_G = [4.5, 9, 13.5, 18, 22.5, 27, 31, 36, 40, 45]
+SAT_FAT_G = [1, 2, 3, 4, 5, 6, 7, 8, 9, 10]
+SODIUM_MG = [90, 180, 270, 360, 450, 540, 630, 720, 810, 900]
+FIBER_G = [0.9, 1.9, 2.8, 3.7, 4.7]
+PROTEIN_G = [1.6, 3.2, 4.8, 6.4, 8]
+FRUIT_PCT = [40, 60, 80]
+FRUIT_POINTS = [0, 1, 2, 5]
+GRADE_BOUNDS = [-1, 2, 10, 18]
+GRADES = np.array(list("ABCDE"))
+
+NUTRISCORE_FIELDS = ("energy_kj", "sugars_g", "sat_fat_g", "sodium_mg", "fruit_pct", "fiber_g", "protein_g")
+
+
+def _as_array(values) -> np.ndarray:
+    return np.asarray(values, dtype=np.float64)
+
+
+def _points(values: np.ndarray, thresholds: Sequence[float]) -> np.ndarray:
+    """Vector form of sum(value > t for t in thresholds); NaN scores 0 like the scalar comparison."""
+    points = np.searchsorted(np.asarray(thresholds, dtype=np.float64), values, side="left")
+    return np.where(np.isnan(values), 0, points).astype(np.int64)
+
+
+def _round1(values: np.ndarray) -> np.ndarray:
+    """Python's round(x, 1) for every element (np.round differs on some binary .x5 ties)."""
+    rounded = np.round(values, 1)
+    scaled = values * 10.0
+    near_tie = np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6
+    if near_tie.any():
+        idx = np.flatnonzero(near_tie)
+        rounded[idx] = [round(float(v), 1) for v in values[idx]]
+    return rounded
+
+
+# ---------- Nutri-Score ----------
+def nutri_score_batch(energy_kj, sugars_g, sat_fat_g, sodium_mg, fruit_pct, fiber_g, protein_g) -> Dict[str, np.ndarray]:
+    """Arrays of score (int64), grade ('A'..'E') and per-component points for N products."""
+    energy_kj, sugars_g, sat_fat_g, sodium_mg, fruit_pct, fiber_g, protein_g = map(
+        _as_array, (energy_kj, sugars_g, sat_fat_g, sodium_mg, fruit_pct, fiber_g, protein_g))
+
+    energy_pts = _points(energy_kj, ENERGY_KJ)
+    sugar_pts = _points(sugars_g, SUGARS_G)
+    satfat_pts = _points(sat_fat_g, SAT_FAT_G)
+    sodium_pts = _points(sodium_mg, SODIUM_MG)
+
+    # fruit_pct < 40 / < 60 / < 80 chain: NaN fails every "<" and lands on the last bucket, as in the scalar code
+    fruit_pts = np.asarray(FRUIT_POINTS, dtype=np.int64)[np.searchsorted(FRUIT_PCT, fruit_pct, side="right")]
+    fiber_pts = _points(fiber_g, FIBER_G)
+    protein_pts = _points(protein_g, PROTEIN_G)
+
+    neg = energy_pts + sugar_pts + satfat_pts + sodium_pts
+    pos = fruit_pts + fiber_pts + protein_pts
+    score = neg - pos
+    grade = GRADES[np.searchsorted(GRADE_BOUNDS, score, side="left")]
+
+    return {
+        "score": score, "grade": grade,
+        "negative": {"energy": energy_pts, "sugars": sugar_pts, "sat_fat": satfat_pts, "sodium": sodium_pts, "total": neg},
+        "positive": {"fruit_pct": fruit_pts, "fiber": fiber_pts, "protein": protein_pts, "total": pos},
+    }
+
+
+def nutri_score_row(result: Dict[str, Any], i: int) -> Dict[str, Any]:
+    """Row i of nutri_score_batch in the nutri_score_full dict shape."""
+    return {
+        "score": int(result["score"][i]), "grade": str(result["grade"][i]),
+        "breakdown": {
+            side: {k: int(v[i]) for k, v in result[side].items()} for side in ("negative", "positive")
+        },
+    }
+
+
+# ---------- Custom Health Score ----------
+def custom_health_score_batch(sugars_g, sat_fat_g, sodium_mg, fiber_g, protein_g, fiber_weight: float = 2.0) -> np.ndarray:
+    """
+    0–10 health score per product. fiber_weight=2.0 matches ingrescan_barcode,
+    2.5 matches ingrescan_barcode1.
+    """
+    sugars_g, sat_fat_g, sodium_mg, fiber_g, protein_g = map(_as_array, (sugars_g, sat_fat_g, sodium_mg, fiber_g, protein_g))
+    # Same operation order as the scalar version so every intermediate rounds identically
+    penalties = (sugars_g / 50.0) * 3 + (sat_fat_g / 20.0) * 2 + (sodium_mg / 2000.0) * 2
+    rewards = (fiber_g / 10.0) * fiber_weight + (protein_g / 20.0) * 1.5
+    raw_score = 5.0 + rewards - penalties
+    return np.clip(_round1(raw_score), 0, 10)
+
+
+# ---------- Baseline score (ingrescan.score_nutrients) ----------
+def _stepped(values: np.ndarray, bounds: Sequence[float], points: Sequence[int], side: str) -> np.ndarray:
+    idx = np.searchsorted(np.asarray(bounds, dtype=np.float64), values, side=side)
+    return np.where(np.isnan(values), 0, np.asarray(points, dtype=np.int64)[idx])
+
+
+def score_nutrients_batch(sugars_100g, saturated_fat_100g, salt_100g, fiber_100g, proteins_100g) -> np.ndarray:
+    """1–10 baseline score per product; missing values should be passed as 0 (or NaN)."""
+    sugar, sat_fat, salt, fiber, protein = map(_as_array, (sugars_100g, saturated_fat_100g, salt_100g, fiber_100g, proteins_100g))
+    s = np.full(sugar.shape, 10, dtype=np.int64)
+    s -= _stepped(sugar, [10, 20, 40], [0, 1, 3, 5], "left")      # > 10 / > 20 / > 40
+    s -= _stepped(sat_fat, [5, 10], [0, 2, 3], "left")            # > 5 / > 10
+    s -= _stepped(salt, [1.5, 2], [0, 2, 3], "left")              # > 1.5 / > 2
+    s += _stepped(fiber, [5, 10], [0, 1, 2], "right")             # >= 5 / >= 10
+    s += _stepped(protein, [10, 20], [0, 1, 2], "right")          # >= 10 / >= 20
+    return np.clip(s, 1, 10)
+
+
+# ---------- Input helpers ----------
+def nutriscore_inputs(products: List[Dict[str, Any]]) -> Dict[str, np.ndarray]:
+    """Columns for nutri_score_batch from OFF product dicts (same rules as extract_for_nutriscore)."""
+    from ingrescan_barcode import extract_for_nutriscore
+    rows = np.array([extract_for_nutriscore(p) for p in products], dtype=np.float64).reshape(-1, len(NUTRISCORE_FIELDS))
+    return {name: rows[:, i] for i, name in enumerate(NUTRISCORE_FIELDS)}
+
+
+# 🔍 Example: score a synthetic 1M-product catalog and spot-check against the scalar code
+if __name__ == "__main__":
+    import ingrescan_barcode as scalar
+    import ingrescan_barcode1 as scalar1
+    import ingrescan
+
+    n = 1_000_000
+    rng = np.random.default_rng(7)
+    cols = {
+        "energy_kj": rng.uniform(0, 4000, n).round(0),
+        "sugars_g": rng.uniform(0, 60, n).round(2),
+        "sat_fat_g": rng.uniform(0, 15, n).round(2),
+        "sodium_mg": rng.uniform(0, 1200, n).round(1),
+        "fruit_pct": rng.choice([0, 40, 59.9, 60, 80, 100], n).astype(np.float64),
+        "fiber_g": rng.uniform(0, 8, n).round(2),
+        "protein_g": rng.uniform(0, 30, n).round(2),
+    }
+    start = time.perf_counter()
+    ns = nutri_score_batch(**cols)
+    health = custom_health_score_batch(cols["sugars_g"], cols["sat_fat_g"], cols["sodium_mg"], cols["fiber_g"], cols["protein_g"])
+    base = score_nutrients_batch(cols["sugars_g"], cols["sat_fat_g"], cols["sodium_mg"] / 393.0, cols["fiber_g"], cols["protein_g"])
+    print(f"Scored {n:,} products in {time.perf_counter() - start:.2f}s")
+
+    sample = rng.choice(n, 20_000, replace=False)
+    mismatches = 0
+    for i in sample:
+        row = {k: float(v[i]) for k, v in cols.items()}
+        full = scalar.nutri_score_full(**row)
+        mismatches += full != nutri_score_row(ns, i)
+        mismatches += scalar.custom_health_score(row) != health[i]
+        health1 = custom_health_score_batch(*(np.array([row[k]]) for k in ("sugars_g", "sat_fat_g", "sodium_mg", "fiber_g", "protein_g")), fiber_weight=2.5)[0]
+        mismatches += scalar1.custom_health_score(row) != health1
+        mismatches += ingrescan.score_nutrients({
+            "sugars_100g": row["sugars_g"], "saturated-fat_100g": row["sat_fat_g"], "salt_100g": row["sodium_mg"] / 393.0,
+            "fiber_100g": row["fiber_g"], "proteins_100g": row["protein_g"],
+        }) != base[i]
+    print(f"Spot-checked {len(sample):,} products against the scalar scorers: {mismatches} mismatches")
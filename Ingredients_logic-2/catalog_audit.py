@@ -0,0 +1,301 @@
+"""catalog_audit.py
+
+Catalog-wide data-quality audit: ingrescan.validate_nutrients as array operations.
+
+Every sanity rule of validate_nutrients is evaluated for a whole chunk of
+products at once: nutrient rules are numpy comparisons over NutrientCatalog
+columns, and ingredient-text rules are regex scans over the chunk's texts joined
+into one NUL-separated string (match offsets are mapped back to rows with
+searchsorted; comma counting is done on the code-point array). Missing values
+count as 0, as in the scalar g() helper.
+
+Per product the audit gives the same (suspicious, warnings) as
+validate_nutrients(nutrients, ingredients_text.lower()); warning strings are
+only built for products that have issues.
+
+    result = audit_products(products)          # OFF product dicts
+    result = audit_catalog(catalog, texts)     # NutrientCatalog(fields=AUDIT_FIELDS)
+    result.suspicious                          # bool array
+    result.warnings(i)                         # validate_nutrients messages for row i
+    result.summary()                           # per-rule counts and rates
+
+    python catalog_audit.py products.jsonl.gz --report issues.jsonl --summary summary.json
+
+Input: JSON lines (optionally .gz), a JSON list, or the OFF CSV export
+(tab-separated, "code" / "ingredients_text" / "*_100g" columns).
+"""
+from __future__ import annotations
+import argparse
+import csv
+import gzip
+import json
+import re
+import sys
+import time
+from typing import Dict, Any, Iterable, Iterator, List, Optional, Sequence
+
+import numpy as np
+
+from ingrescan import PRESERVATIVES, prefixed
+from nutrient_store import NutrientCatalog, to_float
+
+AUDIT_FIELDS = ("sugars_100g", "carbohydrates_100g", "fat_100g", "proteins_100g",
+                "salt_100g", "sodium_100g", "caffeine_100g")
+NEGATIVE_FIELDS = ("sugars_100g", "carbohydrates_100g", "fat_100g", "proteins_100g", "salt_100g")
+SUGAR_TERMS = ["sugar", "glucose", "syrup", "fructose", "maltose", "dextrose"]
+CAFFEINE_CONTEXT = ["energy", "coffee"]
+
+# Rule code -> (level, marks the product suspicious), in validate_nutrients order
+RULES = {
+    **{f"negative:{k}": ("HIGH", True) for k in NEGATIVE_FIELDS},
+    "sugar_gt_carbs": ("HIGH", True),
+    "sugar_without_terms": ("MEDIUM", True),
+    "macro_sum": ("HIGH", True),
+    "sodium_without_salt": ("CHECK", False),
+    "salt_unrealistic": ("HIGH", True),
+    "caffeine_unusual": ("MEDIUM", True),
+    "additive_density": ("MEDIUM", False),
+}
+
+SEPARATOR = "\x00"
+# Code points str.isspace() treats as whitespace
+_WHITESPACE = np.array([cp for cp in range(0x3001) if chr(cp).isspace()], dtype=np.uint32)
+
+
+# ---------- Text rules over a joined corpus ----------
+class _Corpus:
+    """The chunk's ingredient texts joined by NUL, with row start offsets for mapping matches back."""
+
+    def __init__(self, texts: Sequence[str]):
+        texts = [(t or "").lower().replace(SEPARATOR, " ") for t in texts]
+        lengths = np.fromiter((len(t) + 1 for t in texts), dtype=np.int64, count=len(texts))
+        self.starts = np.concatenate(([0], np.cumsum(lengths)[:-1])) if len(texts) else np.zeros(0, np.int64)
+        self.text = SEPARATOR.join(texts)
+        self.n = len(texts)
+
+    def _rows(self, pattern: str) -> np.ndarray:
+        # The [^NUL]* tail swallows the rest of the row, so each row matches at most once
+        positions = [m.start() for m in re.finditer(f"(?:{pattern})[^{SEPARATOR}]*", self.text)]
+        return np.searchsorted(self.starts, np.array(positions, dtype=np.int64), side="right") - 1
+
+    def contains_any(self, terms: Sequence[str]) -> np.ndarray:
+        """Row mask of texts containing at least one of terms as a substring."""
+        mask = np.zeros(self.n, dtype=bool)
+        mask[self._rows("|".join(map(re.escape, terms)))] = True
+        return mask
+
+    def count_terms(self, terms: Sequence[str]) -> np.ndarray:
+        """Per row, how many distinct terms occur (sum(1 for p in terms if p in text))."""
+        hits = np.zeros(self.n, dtype=np.int64)
+        for t in terms:
+            hits[self._rows(re.escape(t))] += 1
+        return hits
+
+    def comma_items(self) -> np.ndarray:
+        """Per row, the number of non-blank comma-separated pieces."""
+        if not self.n:
+            return np.zeros(0, dtype=np.int64)
+        # Trailing NUL so an empty last row still has a character at its start offset
+        cp = np.frombuffer((self.text + SEPARATOR).encode("utf-32-le"), dtype="<u4")
+        boundary = (cp == ord(",")) | (cp == 0)
+        piece = np.cumsum(boundary)                    # piece id of every character
+        solid = ~boundary & ~np.isin(cp, _WHITESPACE)
+        non_blank = np.zeros(piece[-1] + 1, dtype=bool)
+        non_blank[piece[solid]] = True
+        # Pieces are numbered in text order; a row's first piece id is the count of boundaries before it
+        first_piece = piece[self.starts] - boundary[self.starts]
+        return np.add.reduceat(non_blank.astype(np.int64), first_piece)
+
+
+# ---------- Audit ----------
+class AuditResult:
+    """Rule masks for one chunk of products, plus the values the warning messages quote."""
+
+    def __init__(self, barcodes: List[str], issues: Dict[str, np.ndarray], values: Dict[str, np.ndarray]):
+        self.barcodes = barcodes
+        self.issues = issues
+        self.values = values
+        self.suspicious = np.zeros(len(barcodes), dtype=bool)
+        for code, mask in issues.items():
+            if RULES[code][1]:
+                self.suspicious |= mask
+        self.any_issue = np.logical_or.reduce(list(issues.values())) if issues else self.suspicious.copy()
+
+    def __len__(self) -> int:
+        return len(self.barcodes)
+
+    def codes(self, i: int) -> List[str]:
+        return [code for code, mask in self.issues.items() if mask[i]]
+
+    def warnings(self, i: int) -> List[str]:
+        """Row i's warnings, worded exactly like validate_nutrients."""
+        v = {k: float(col[i]) for k, col in self.values.items()}
+        messages = {
+            "sugar_gt_carbs": lambda: f"Sugars ({v['sugars_100g']}g) > Carbohydrates ({v['carbohydrates_100g']}g) — possible mislabeling",
+            "sugar_without_terms": lambda: "OFF shows significant sugar but ingredient list lacks sugar terms — verify",
+            "macro_sum": lambda: f"Sum of protein+fat+carbs = {v['macros_sum']}g/100g (impossible) — data error",
+            "sodium_without_salt": lambda: f"Sodium present ({v['sodium_100g']}g) but salt field empty — using sodium to compute salt",
+            "salt_unrealistic": lambda: f"Salt = {v['salt_100g']}g/100g looks unrealistic",
+            "caffeine_unusual": lambda: f"Caffeine {v['caffeine_100g']} mg unusual for this product — verify",
+            "additive_density": lambda: f"Additives are {int(v['additive_ratio'] * 100)}% of listed ingredients — medium concern",
+        }
+        out = []
+        for code in self.codes(i):
+            if code.startswith("negative:"):
+                field = code.split(":", 1)[1]
+                text = f"{field} is negative ({v[field]}) — data invalid"
+            else:
+                text = messages[code]()
+            out.append(prefixed(text, RULES[code][0]))
+        return out
+
+    def record(self, i: int) -> Dict[str, Any]:
+        return {"barcode": self.barcodes[i], "suspicious": bool(self.suspicious[i]),
+                "issues": self.codes(i), "warnings": self.warnings(i)}
+
+    def summary(self) -> Dict[str, Any]:
+        n = len(self)
+        return {
+            "products": n,
+            "with_issues": int(self.any_issue.sum()),
+            "suspicious": int(self.suspicious.sum()),
+            "rules": {code: int(mask.sum()) for code, mask in self.issues.items()},
+        }
+
+
+def audit_columns(columns: Dict[str, np.ndarray], texts: Sequence[str], barcodes: Optional[List[str]] = None) -> AuditResult:
+    """Run every validate_nutrients rule over N products (columns: AUDIT_FIELDS arrays, NaN = missing)."""
+    n = len(texts)
+    g = {k: np.nan_to_num(np.asarray(columns.get(k, np.zeros(n)), dtype=np.float64), nan=0.0) for k in AUDIT_FIELDS}
+    corpus = _Corpus(texts)
+    sugars, carbs = g["sugars_100g"], g["carbohydrates_100g"]
+    salt, sodium, caffeine = g["salt_100g"], g["sodium_100g"], g["caffeine_100g"]
+
+    issues = {f"negative:{k}": g[k] < 0 for k in NEGATIVE_FIELDS}
+    issues["sugar_gt_carbs"] = (sugars > carbs) & (carbs > 0)
+    significant_sugar = sugars >= 5
+    issues["sugar_without_terms"] = significant_sugar & ~corpus.contains_any(SUGAR_TERMS)
+    macros_sum = g["proteins_100g"] + g["fat_100g"] + carbs
+    issues["macro_sum"] = macros_sum > 100
+    issues["sodium_without_salt"] = (salt == 0) & (sodium > 0)
+    issues["salt_unrealistic"] = salt > 10
+    high_caffeine = caffeine > 10
+    issues["caffeine_unusual"] = high_caffeine & ~corpus.contains_any(CAFFEINE_CONTEXT)
+
+    additive_hits = corpus.count_terms(PRESERVATIVES)
+    total_ings = corpus.comma_items()
+    ratio = np.divide(additive_hits, total_ings, out=np.zeros(n), where=total_ings > 0)
+    issues["additive_density"] = ratio > 0.5
+
+    values = dict(g, macros_sum=macros_sum, additive_ratio=ratio)
+    return AuditResult(barcodes if barcodes is not None else [str(i) for i in range(n)], issues, values)
+
+
+def audit_products(products: Sequence[Dict[str, Any]]) -> AuditResult:
+    """Audit OFF product dicts (nutriments + ingredients_text / ingredients_text_en)."""
+    nutriments = [p.get("nutriments") or {} for p in products]
+    columns = {k: np.fromiter((to_float(n.get(k)) for n in nutriments), dtype=np.float64, count=len(products))
+               for k in AUDIT_FIELDS}
+    barcodes = [str(p.get("code") or p.get("_id") or f"row{i}") for i, p in enumerate(products)]
+    texts = [p.get("ingredients_text", "") or p.get("ingredients_text_en", "") or "" for p in products]
+    return audit_columns(columns, texts, barcodes)
+
+
+def audit_catalog(catalog: NutrientCatalog, texts: Sequence[str]) -> AuditResult:
+    """Audit a NutrientCatalog (built with AUDIT_FIELDS) with texts in row order."""
+    return audit_columns({k: catalog.column(k) for k in AUDIT_FIELDS if k in catalog.fields}, texts, catalog.barcodes())
+
+
+# ---------- Reading catalogs / OFF dumps ----------
+def _open(path: str):
+    if path == "-":
+        return sys.stdin
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8", newline="")
+    return open(path, "r", encoding="utf-8", newline="")
+
+
+def iter_products(path: str) -> Iterator[Dict[str, Any]]:
+    """OFF products from JSON lines / JSON list / OFF CSV export, streamed."""
+    f = _open(path)
+    try:
+        if ".csv" in path:
+            csv.field_size_limit(sys.maxsize)
+            for row in csv.DictReader(f, delimiter="\t"):
+                yield {
+                    "code": row.get("code"),
+                    "ingredients_text": row.get("ingredients_text") or "",
+                    "nutriments": {k: v for k, v in row.items() if k and k.endswith("_100g") and v},
+                }
+            return
+        first = f.readline()
+        if first.lstrip().startswith("["):
+            yield from json.loads(first + f.read())
+            return
+        if first.strip():
+            yield json.loads(first)
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+
+def _chunks(items: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def audit_file(path: str, report=None, chunk_size: int = 100_000, include_clean: bool = False) -> Dict[str, Any]:
+    """Audit a catalog chunk by chunk; writes per-product records to report and returns the totals."""
+    started = time.perf_counter()
+    totals = {"products": 0, "with_issues": 0, "suspicious": 0, "rules": {code: 0 for code in RULES}}
+    for chunk in _chunks(iter_products(path), chunk_size):
+        result = audit_products(chunk)
+        part = result.summary()
+        for key in ("products", "with_issues", "suspicious"):
+            totals[key] += part[key]
+        for code, count in part["rules"].items():
+            totals["rules"][code] += count
+        if report is not None:
+            rows = range(len(result)) if include_clean else np.flatnonzero(result.any_issue).tolist()
+            for i in rows:
+                report.write(json.dumps(result.record(i), ensure_ascii=False) + "\n")
+    n = totals["products"]
+    totals["rates"] = {code: round(count / n, 6) for code, count in totals["rules"].items()} if n else {}
+    totals["suspicious_rate"] = round(totals["suspicious"] / n, 6) if n else 0.0
+    totals["elapsed_s"] = round(time.perf_counter() - started, 2)
+    return totals
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Audit a product catalog / OFF dump with the validate_nutrients rules.")
+    parser.add_argument("input", help="JSONL(.gz) / JSON list / OFF CSV export, or - for JSONL on stdin")
+    parser.add_argument("--report", help="per-product issues as JSON lines (default stdout)")
+    parser.add_argument("--summary", help="write aggregate statistics to this JSON file (always printed to stderr)")
+    parser.add_argument("--all", action="store_true", help="also report products without issues")
+    parser.add_argument("--chunk-size", type=int, default=100_000)
+    args = parser.parse_args(argv)
+
+    report = open(args.report, "w", encoding="utf-8") if args.report else sys.stdout
+    try:
+        totals = audit_file(args.input, report, args.chunk_size, args.all)
+    finally:
+        if report is not sys.stdout:
+            report.close()
+    if args.summary:
+        with open(args.summary, "w", encoding="utf-8") as f:
+            json.dump(totals, f, indent=2)
+    print(json.dumps(totals, indent=2), file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
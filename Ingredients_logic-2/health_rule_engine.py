@@ -0,0 +1,286 @@
+"""health_rule_engine.py
+
+health_rules.json compiled into an evaluation plan, so many products can be
+checked against many user profiles without re-walking the JSON.
+
+Rule kinds covered by the plan:
+- direct / indirect nutrient limits (value > max -> penalty; HIGH / MEDIUM warning)
+  Flat entries such as {"sugars_100g": {"max": 5, "penalty": 3}} are direct rules.
+- protective nutrients (value >= min -> bonus; LOW warning)
+- ingredient terms (substring of the ingredients text -> HIGH warning, no score change)
+- synergy_rules (nutrient1 > t1 and nutrient2 > t2 -> penalty; applies to every profile)
+
+    plan = get_plan()
+    adj, warnings = plan.evaluate(nutrients, ingredients_text, ["diabetes"])   # one product
+    result = plan.evaluate_matrix(products, texts, profiles)                   # N products x M profiles
+    result.adjustments[i, j]; result.warnings(i, j)
+
+evaluate() is the scalar path (used by apply_health_rules in ingrescan.py and
+ingrescan_with_sanity_and_confidence.py);
+evaluate_matrix() computes every (product, profile) adjustment with a few
+matrix products and rebuilds the same warning lists on demand.
+"""
+from __future__ import annotations
+import os
+import sys
+from typing import Dict, Any, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "Ingredients_logic"))
+from knowledge_base import get_kb, on_change
+
+from nutrient_store import NutrientCatalog, to_float
+
+RULE_KINDS = ("direct", "indirect", "protective")
+LEVELS = {"direct": "HIGH", "indirect": "MEDIUM", "protective": "LOW"}
+
+
+def prefixed(msg: str, level: str) -> str:
+    return f"[{level}] {msg}"
+
+
+def _value(nutrients: Dict[str, Any], name: str) -> float:
+    """float(nutrients.get(name, 0) or 0), tolerant of "80g"-style strings."""
+    value = to_float(nutrients.get(name, 0) or 0)
+    return 0.0 if np.isnan(value) else value
+
+
+def _dedup(warnings: List[str]) -> List[str]:
+    return list(dict.fromkeys(warnings))
+
+
+class RuleMatrix:
+    """Result of HealthRulePlan.evaluate_matrix for N products x M profiles."""
+
+    def __init__(self, plan, adjustments, fired, term_hits, synergy_fired, values, profiles):
+        self.plan = plan
+        self.adjustments = adjustments      # (N, M)
+        self.fired = fired                  # (N, R) nutrient rules
+        self.term_hits = term_hits          # (N, T) ingredient terms
+        self.synergy_fired = synergy_fired  # (N, S)
+        self._values = values               # (N, K) nutrient values used
+        self._profiles = profiles           # per profile: condition indices in input order
+
+    def warnings(self, i: int, j: int) -> List[str]:
+        """Warnings for product i under profile j, identical to plan.evaluate()."""
+        plan = self.plan
+        out = []
+        for c in self._profiles[j]:
+            for r in plan.cond_rules[c]:
+                if self.fired[i, r]:
+                    out.append(plan.rule_message(r, self._values[i, plan.rule_nutrient[r]]))
+            for t, message in plan.cond_terms[c]:
+                if self.term_hits[i, t]:
+                    out.append(message)
+        for s in np.flatnonzero(self.synergy_fired[i]):
+            out.append(plan.synergy_messages[s])
+        return _dedup(out)
+
+
+class HealthRulePlan:
+    """Flattened, index-based form of health_rules.json."""
+
+    def __init__(self, health_rules: Dict[str, Any]):
+        self.conditions = [c for c, v in health_rules.items() if c != "synergy_rules" and isinstance(v, dict)]
+        self.cond_index = {c: i for i, c in enumerate(self.conditions)}
+        self.nutrients: List[str] = []
+        self._nutrient_index: Dict[str, int] = {}
+
+        # Nutrient rules, one row each
+        self.rule_cond, self.rule_nutrient, self.rule_kind = [], [], []
+        self.rule_threshold, self.rule_delta, self._rule_text = [], [], []
+        self.cond_rules: List[List[int]] = []
+        # Ingredient terms (shared between conditions) and (term, message) per condition
+        self.terms: List[str] = []
+        term_index: Dict[str, int] = {}
+        self.cond_terms: List[List[Tuple[int, str]]] = []
+
+        for c, cond in enumerate(self.conditions):
+            rules = health_rules[cond]
+            warning = (rules.get("warnings") or [""])[0]
+            by_kind = {kind: [] for kind in RULE_KINDS}
+            for key, spec in rules.get("nutrients", {}).items():
+                if key in RULE_KINDS and isinstance(spec, dict) and "max" not in spec and "min" not in spec:
+                    by_kind[key].extend(spec.items())
+                elif isinstance(spec, dict) and "max" in spec:
+                    by_kind["direct"].append((key, spec))
+            rows = []
+            for kind in RULE_KINDS:  # same order as the original direct -> indirect -> protective walk
+                for nutrient, limits in by_kind[kind]:
+                    rows.append(len(self.rule_cond))
+                    self.rule_cond.append(c)
+                    self.rule_nutrient.append(self._nutrient(nutrient))
+                    self.rule_kind.append(kind)
+                    if kind == "protective":
+                        self.rule_threshold.append(limits.get("min", 0))
+                        self.rule_delta.append(limits.get("bonus", 0))
+                        self._rule_text.append(f"{cond}: protective factor {nutrient}=")
+                    else:
+                        self.rule_threshold.append(limits["max"])
+                        self.rule_delta.append(-limits.get("penalty", 1))
+                        self._rule_text.append(prefixed(warning, LEVELS[kind]))
+            self.cond_rules.append(rows)
+
+            terms = []
+            for bad in rules.get("ingredients", []):
+                if bad not in term_index:
+                    term_index[bad] = len(self.terms)
+                    self.terms.append(bad)
+                terms.append((term_index[bad], prefixed(warning, "HIGH")))
+            self.cond_terms.append(terms)
+
+        synergy = health_rules.get("synergy_rules", []) or []
+        self.synergy_n1 = np.array([self._nutrient(r["nutrient1"]) for r in synergy], dtype=np.int64)
+        self.synergy_n2 = np.array([self._nutrient(r["nutrient2"]) for r in synergy], dtype=np.int64)
+        self.synergy_t1 = np.array([r["thresholds"][0] for r in synergy], dtype=np.float64)
+        self.synergy_t2 = np.array([r["thresholds"][1] for r in synergy], dtype=np.float64)
+        self.synergy_penalty = [r["penalty"] for r in synergy]
+        self.synergy_messages = [prefixed(r["warning"], "HIGH") for r in synergy]
+
+        n_rules = len(self.rule_cond)
+        self._thresholds = np.array(self.rule_threshold, dtype=np.float64)
+        self._protective = np.array([k == "protective" for k in self.rule_kind], dtype=bool)
+        self._deltas = np.array(self.rule_delta, dtype=np.float64)
+        self._nut_idx = np.array(self.rule_nutrient, dtype=np.int64)
+        self._rule_to_cond = np.zeros((n_rules, len(self.conditions)), dtype=np.float64)
+        self._rule_to_cond[np.arange(n_rules), self.rule_cond] = 1.0
+        self._integral = all(float(d).is_integer() for d in self.rule_delta + self.synergy_penalty)
+
+    def _nutrient(self, name: str) -> int:
+        if name not in self._nutrient_index:
+            self._nutrient_index[name] = len(self.nutrients)
+            self.nutrients.append(name)
+        return self._nutrient_index[name]
+
+    def rule_message(self, r: int, value: float) -> str:
+        if self.rule_kind[r] == "protective":
+            return prefixed(f"{self._rule_text[r]}{float(value)} (bonus)", "LOW")
+        return self._rule_text[r]
+
+    def _profile_indices(self, conditions: Sequence[str]) -> List[int]:
+        out = []
+        for cond in conditions:
+            c = self.cond_index.get(cond.strip().lower())
+            if c is not None:
+                out.append(c)
+        return out
+
+    # ---------- Scalar path ----------
+    def evaluate(self, nutrients: Dict[str, Any], ingredients_text: str, conditions: Sequence[str]) -> Tuple[int, List[str]]:
+        """(score_adjustment, warnings) for one product and one profile."""
+        values = [_value(nutrients, name) for name in self.nutrients]
+        adjustment = 0
+        warnings = []
+        for c in self._profile_indices(conditions):
+            for r in self.cond_rules[c]:
+                val = values[self.rule_nutrient[r]]
+                threshold = self.rule_threshold[r]
+                if (val >= threshold) if self.rule_kind[r] == "protective" else (val > threshold):
+                    adjustment += self.rule_delta[r]
+                    warnings.append(self.rule_message(r, val))
+            for t, message in self.cond_terms[c]:
+                if self.terms[t] in ingredients_text:
+                    warnings.append(message)
+        for s, penalty in enumerate(self.synergy_penalty):
+            if values[self.synergy_n1[s]] > self.synergy_t1[s] and values[self.synergy_n2[s]] > self.synergy_t2[s]:
+                adjustment -= penalty
+                warnings.append(self.synergy_messages[s])
+        return adjustment, _dedup(warnings)
+
+    # ---------- Vectorized path ----------
+    def value_matrix(self, products) -> np.ndarray:
+        """(N, K) float64 values of the plan's nutrients; missing -> 0 like the scalar path."""
+        if isinstance(products, NutrientCatalog):
+            columns = [products.column(n) if n in products.fields else np.zeros(len(products))
+                       for n in self.nutrients]
+            values = np.column_stack(columns).astype(np.float64) if columns else np.zeros((len(products), 0))
+        elif isinstance(products, dict):
+            n = len(next(iter(products.values()))) if products else 0
+            values = np.column_stack([np.asarray(products.get(name, np.zeros(n)), dtype=np.float64)
+                                      for name in self.nutrients]) if self.nutrients else np.zeros((n, 0))
+        else:
+            values = np.array([[_value(p, name) for name in self.nutrients] for p in products],
+                              dtype=np.float64).reshape(-1, len(self.nutrients))
+        return np.nan_to_num(values, nan=0.0)
+
+    def evaluate_matrix(self, products, texts: Optional[Sequence[str]], profiles: Sequence[Sequence[str]]) -> RuleMatrix:
+        """
+        products: NutrientCatalog, {nutrient: array} or a list of nutrient dicts (N)
+        texts: ingredient texts (N) or None
+        profiles: M lists of conditions
+        """
+        values = self.value_matrix(products)
+        n = values.shape[0]
+
+        x = values[:, self._nut_idx]
+        fired = np.where(self._protective, x >= self._thresholds, x > self._thresholds)
+        cond_adjust = (fired * self._deltas) @ self._rule_to_cond                  # (N, C)
+
+        profile_idx = [self._profile_indices(p) for p in profiles]
+        counts = np.zeros((len(profiles), len(self.conditions)), dtype=np.float64)  # duplicates count twice, like the loop
+        for j, idx in enumerate(profile_idx):
+            np.add.at(counts[j], idx, 1.0)
+
+        if len(self.synergy_penalty):
+            synergy_fired = (values[:, self.synergy_n1] > self.synergy_t1) & (values[:, self.synergy_n2] > self.synergy_t2)
+            synergy_adjust = -(synergy_fired @ np.array(self.synergy_penalty, dtype=np.float64))
+        else:
+            synergy_fired = np.zeros((n, 0), dtype=bool)
+            synergy_adjust = np.zeros(n)
+
+        adjustments = cond_adjust @ counts.T + synergy_adjust[:, None]
+        if self._integral:
+            adjustments = np.rint(adjustments).astype(np.int64)
+
+        if texts is None or not self.terms:
+            term_hits = np.zeros((n, len(self.terms)), dtype=bool)
+        else:
+            arr = np.asarray(list(texts), dtype=str)
+            term_hits = np.column_stack([np.char.find(arr, term) >= 0 for term in self.terms])
+        return RuleMatrix(self, adjustments, fired, term_hits, synergy_fired, values, profile_idx)
+
+
+# ---------- Shared plan (recompiled when health_rules changes) ----------
+_plan: Optional[HealthRulePlan] = None
+
+
+def get_plan() -> HealthRulePlan:
+    global _plan
+    if _plan is None:
+        _plan = HealthRulePlan(get_kb().section("health_rules"))
+    return _plan
+
+
+def _drop_plan(kb, changed_sections):
+    global _plan
+    _plan = None
+
+
+on_change(["health_rules"], _drop_plan)
+
+
+# 🔍 Example: 100k products x every subset of the conditions (16 profiles today), checked against the scalar path
+if __name__ == "__main__":
+    import itertools
+    import time
+
+    plan = get_plan()
+    rng = np.random.default_rng(11)
+    n = 100_000
+    cols = {name: rng.choice([0.0, 0.2, 0.5, 3.0, 6.0, 12.0, 20.0], n) for name in plan.nutrients}
+    texts = rng.choice(["sugar, glucose syrup", "wheat, salt", "tuna, alcohol", "corn syrup, cocoa", "rice"], n)
+    profiles = [list(c) for k in range(len(plan.conditions) + 1)
+                for c in itertools.combinations(plan.conditions, k)]
+
+    start = time.perf_counter()
+    result = plan.evaluate_matrix(cols, texts, profiles)
+    print(f"{n:,} products x {len(profiles)} profiles in {time.perf_counter() - start:.2f}s")
+
+    mismatches = 0
+    for i in rng.choice(n, 2000, replace=False):
+        nutrients = {name: cols[name][i] for name in plan.nutrients}
+        for j, profile in enumerate(profiles):
+            adj, warnings = plan.evaluate(nutrients, str(texts[i]), profile)
+            mismatches += adj != result.adjustments[i, j] or warnings != result.warnings(i, j)
+    print(f"Checked 2,000 products x {len(profiles)} profiles against evaluate(): {mismatches} mismatches")
@@ -0,0 +1,249 @@
+"""ingredient_flagger.py
+
+Single-pass ingredient flagging for ingrescan_barcode1.flag_ingredients.
+
+All rules ((pattern, label, consumption, reason) tuples, SEED_PATTERNS plus any
+rule packs) are compiled into one alternation with a named group per rule,
+with the leading \\b shared by the seed rules hoisted in front:
+
+    \\b(?:(?P<r0>pattern0)|(?P<r1>pattern1)|...)|(?P<r7>unbounded pattern)
+
+A scan calls search() on the combined pattern, so positions where no rule can
+match are skipped by the regex engine in one go. At each match start the
+winning group names one rule; since an alternation only reports its first
+matching branch, one match() of the later branches at the same position finds
+any other rule starting there. The scan then resumes at start + 1 so
+overlapping matches are still seen, and stops early once every rule has fired.
+The result is the same as running re.search per rule: flags in rule order,
+deduplicated by label.
+
+Rule packs are JSON files holding a list (or {"rules": [...]}) of
+{"pattern", "label", "consumption", "reason"} objects; INGRESCAN_FLAG_RULES
+lists extra pack files, separated by os.pathsep. Patterns are embedded in the
+combined alternation, so they cannot use named groups or numbered backreferences.
+
+    flagger = IngredientFlagger(SEED_PATTERNS + load_rule_pack("rule_packs/additives_extra.json"))
+    flagger.flag("sugar, palm oil, e211")
+    flagger.flag_batch(texts)            # list of flag lists
+    flagger.label_matrix(texts)          # (N, labels) bool array
+"""
+from __future__ import annotations
+import json
+import os
+import re
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+Rule = Tuple[str, str, str, str]  # (regex pattern, label, consumption, reason)
+CONSUMPTION_LEVELS = ("daily", "weekly", "occasional")
+RULES_ENV = "INGRESCAN_FLAG_RULES"
+
+
+# ---------- Rule packs ----------
+def load_rule_pack(path: str) -> List[Rule]:
+    """Rules from a JSON pack file; raises ValueError naming the file and rule on bad entries."""
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    entries = data.get("rules", []) if isinstance(data, dict) else data
+    rules = []
+    for i, entry in enumerate(entries):
+        try:
+            rule = (entry["pattern"], entry["label"], entry.get("consumption", "weekly"), entry.get("reason", ""))
+            re.compile(rule[0])
+        except (KeyError, TypeError, re.error) as e:
+            raise ValueError(f"{path}: rule {i} is invalid ({e})") from None
+        if rule[2] not in CONSUMPTION_LEVELS:
+            raise ValueError(f"{path}: rule {i} has consumption {rule[2]!r}, expected one of {CONSUMPTION_LEVELS}")
+        rules.append(rule)
+    return rules
+
+
+def env_rule_packs() -> List[Rule]:
+    """Rules from every pack listed in INGRESCAN_FLAG_RULES."""
+    rules = []
+    for path in filter(None, os.environ.get(RULES_ENV, "").split(os.pathsep)):
+        rules.extend(load_rule_pack(path))
+    return rules
+
+
+# ---------- Flagger ----------
+def _top_level_alternation(pattern: str) -> bool:
+    """True when pattern has a | outside any group or character class ('\\bfoo|bar')."""
+    depth, in_class, i = 0, False, 0
+    while i < len(pattern):
+        c = pattern[i]
+        if c == "\\":
+            i += 2
+            continue
+        if in_class:
+            in_class = c != "]"
+        elif c == "[":
+            in_class = True
+            if pattern[i + 1:i + 2] == "]" or pattern[i + 1:i + 3] == "^]":
+                i += 2 if pattern[i + 1] == "]" else 3     # a leading ] is a literal
+                continue
+        elif c == "(":
+            depth += 1
+        elif c == ")":
+            depth -= 1
+        elif c == "|" and depth == 0:
+            return True
+        i += 1
+    return False
+
+
+def _hoistable(pattern: str) -> bool:
+    """Leading \\b that can move in front of the alternation without changing what the rule matches."""
+    return pattern.startswith(r"\b") and not _top_level_alternation(pattern)
+
+
+def _combine(indexed: Sequence[Tuple[int, str]]) -> Optional[re.Pattern]:
+    """
+    (?P<r0>p0)|(?P<r1>p1)|... with a leading \\b hoisted out of the rules that start with one:
+    re only uses a fast prefix scan for single patterns, so the hoisted boundary is
+    what lets the combined scan skip positions inside words. A rule with a top-level
+    | ('\\bfoo|bar') keeps its \\b, which only binds to its first alternative.
+    """
+    bounded = [f"(?P<r{i}>{p[2:]})" for i, p in indexed if _hoistable(p)]
+    free = [f"(?P<r{i}>{p})" for i, p in indexed if not _hoistable(p)]
+    branches = ([r"\b(?:" + "|".join(bounded) + ")"] if bounded else []) + free
+    return re.compile("|".join(branches)) if branches else None
+
+
+class IngredientFlagger:
+    """Every rule in one compiled pattern; flags a text in a single left-to-right scan."""
+
+    def __init__(self, rules: Iterable[Rule]):
+        self.rules = [tuple(r) for r in rules]
+        # Branch order of the combined pattern: \b-prefixed rules first, then the rest
+        self._order = ([i for i, r in enumerate(self.rules) if _hoistable(r[0])]
+                       + [i for i, r in enumerate(self.rules) if not _hoistable(r[0])])
+        self._rank = {i: k for k, i in enumerate(self._order)}
+        self._combined = _combine([(i, self.rules[i][0]) for i in self._order])
+        self._tails: Dict[int, Optional[re.Pattern]] = {}
+        self._flags = [{"label": label, "consumption": consumption, "reason": reason}
+                       for _, label, consumption, reason in self.rules]
+        self.labels = list(dict.fromkeys(r[1] for r in self.rules))
+        self._label_column = {label: j for j, label in enumerate(self.labels)}
+
+    def _tail(self, rank: int) -> Optional[re.Pattern]:
+        """Combined pattern of the branches after rank, compiled on first use."""
+        if rank not in self._tails:
+            self._tails[rank] = _combine([(i, self.rules[i][0]) for i in self._order[rank + 1:]])
+        return self._tails[rank]
+
+    def matching_rules(self, text: str) -> List[int]:
+        """Indexes of the rules that match somewhere in text (already lowercased), in rule order."""
+        if self._combined is None:
+            return []
+        found = set()
+        search = self._combined.search
+        pos = 0
+        while len(found) < len(self.rules):
+            m = search(text, pos)
+            if m is None:
+                break
+            start = m.start()
+            hit = int(m.lastgroup[1:])
+            found.add(hit)
+            # At one position the alternation reports the first matching branch,
+            # so any other rule matching here sits in a later branch
+            tail = self._tail(self._rank[hit])
+            while tail is not None:
+                m = tail.match(text, start)
+                if m is None:
+                    break
+                hit = int(m.lastgroup[1:])
+                found.add(hit)
+                tail = self._tail(self._rank[hit])
+            pos = start + 1
+        return sorted(found)
+
+    def flag(self, ingredients_text: str) -> List[Dict[str, str]]:
+        """Same output as the per-pattern loop: flag dicts in rule order, one per label."""
+        seen = set()
+        out = []
+        for i in self.matching_rules((ingredients_text or "").lower()):
+            flag = self._flags[i]
+            if flag["label"] not in seen:
+                seen.add(flag["label"])
+                out.append(dict(flag))
+        return out
+
+    def flag_batch(self, texts: Sequence[str]) -> List[List[Dict[str, str]]]:
+        """flag() for many texts; identical texts are scanned once."""
+        memo: Dict[str, List[int]] = {}
+        results = []
+        for text in texts:
+            key = (text or "").lower()
+            rules = memo.get(key)
+            if rules is None:
+                rules = memo[key] = self.matching_rules(key)
+            seen = set()
+            flags = []
+            for i in rules:
+                flag = self._flags[i]
+                if flag["label"] not in seen:
+                    seen.add(flag["label"])
+                    flags.append(dict(flag))
+            results.append(flags)
+        return results
+
+    def label_matrix(self, texts: Sequence[str]) -> np.ndarray:
+        """(N, len(labels)) bool matrix: text i carries label j."""
+        matrix = np.zeros((len(texts), len(self.labels)), dtype=bool)
+        for row, text in enumerate(texts):
+            for i in self.matching_rules((text or "").lower()):
+                matrix[row, self._label_column[self.rules[i][1]]] = True
+        return matrix
+
+
+# 🔍 Example: benchmark against the per-pattern re.search loop
+if __name__ == "__main__":
+    import random
+    import time
+    from ingrescan_barcode1 import SEED_PATTERNS
+
+    def loop_flags(ingredients_text):
+        flags = []
+        text = (ingredients_text or "").lower()
+        for pat, label, consumption, reason in SEED_PATTERNS:
+            if re.search(pat, text):
+                flags.append({"label": label, "consumption": consumption, "reason": reason})
+        seen, deduped = set(), []
+        for f in flags:
+            if f["label"] not in seen:
+                seen.add(f["label"])
+                deduped.append(f)
+        return deduped
+
+    rng = random.Random(11)
+    plain = ["sugar", "wheat flour", "water", "salt", "milk solids", "cocoa butter", "yeast", "rice flour",
+             "spices", "onion powder", "soy lecithin", "citric acid", "vegetable oil", "glucose"]
+    flagged = ["palm oil", "e211", "sodium benzoate", "msg", "artificial colours", "e102", "tbhq",
+               "partially hydrogenated soybean oil", "aspartame", "high-fructose corn syrup", "carrageenan", "polysorbate 80"]
+    texts = []
+    for _ in range(20_000):
+        parts = rng.sample(plain, rng.randint(5, 12))
+        if rng.random() < 0.4:
+            parts += rng.sample(flagged, rng.randint(1, 3))
+        rng.shuffle(parts)
+        texts.append(", ".join(parts).upper() if rng.random() < 0.3 else ", ".join(parts))
+
+    # A top-level | keeps its \b: '\bfoo|bar' matches "bar" anywhere, as re.search does
+    for pattern, text in ((r"\bfoo|bar", "xbar"), (r"\b(?:foo|bar)", "xbar"), (r"\b[|]x", "a |x"), (r"\bfoo|bar", "foo")):
+        found = bool(IngredientFlagger([(pattern, "X", "weekly", "")]).flag(text))
+        assert found == bool(re.search(pattern, text)), (pattern, text)
+
+    flagger = IngredientFlagger(SEED_PATTERNS + env_rule_packs())
+    start = time.perf_counter()
+    expected = [loop_flags(t) for t in texts]
+    loop_s = time.perf_counter() - start
+    start = time.perf_counter()
+    got = flagger.flag_batch(texts)
+    batch_s = time.perf_counter() - start
+    mismatches = sum(a != b for a, b in zip(expected, got)) if not env_rule_packs() else "n/a (extra packs loaded)"
+    print(f"{len(texts):,} texts: per-pattern loop {loop_s * 1000:.0f} ms, combined scanner {batch_s * 1000:.0f} ms "
+          f"({loop_s / batch_s:.1f}x), mismatches: {mismatches}")
+    print(dict(zip(flagger.labels, flagger.label_matrix(texts).sum(axis=0).tolist())))
@@ -1,11 +1,23 @@
 # ingrescan_with_sanity_and_confidence.py
+import copy
+import os
+import sys
 import requests
 import json
 from typing import Dict, List, Tuple
 
-# Load health rules from JSON (keep same format as before)
-with open("health_rules.json", "r") as f:
-    HEALTH_RULES = json.load(f)
+# Health rules come from the compiled knowledge base (Ingredients_logic/knowledge_base.py)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "Ingredients_logic"))
+from knowledge_base import get_kb
+from offline_mode import is_offline
+from product_cache import get_product_cache
+from health_rule_engine import get_plan
+
+
+def __getattr__(name):
+    if name == "HEALTH_RULES":
+        return get_kb().section("health_rules")
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # Default allergens/preservatives list
 ALLERGENS = ["milk", "peanut", "soy", "gluten", "almond", "cashew", "walnut"]
@@ -22,11 +34,21 @@ def prefixed(msg: str, level: str) -> str:
 
 # -------------------- Fetch / Manual Input --------------------
 def fetch_product(barcode: str) -> Dict:
+    cache = get_product_cache()
+    cached = cache.get(f"off:{barcode}")
+    if cached is not None:
+        # analyze_product fills in missing nutrient keys, so hand out a copy of the shared entry
+        return {"status": 1, "product": copy.deepcopy(cached)}
+    if is_offline():
+        return {}
     url = f"https://world.openfoodfacts.org/api/v0/product/{barcode}.json"
     try:
         r = requests.get(url, timeout=8)
         if r.status_code == 200:
-            return r.json()
+            data = r.json()
+            if data.get("status") == 1 and data.get("product"):
+                cache.set(f"off:{barcode}", copy.deepcopy(data["product"]))
+            return data
     except Exception:
         pass
     return {}
@@ -166,54 +188,15 @@ def score_nutrients(nutrients: Dict) -> int:
 
     return max(1, min(10, int(round(s))))
 
-def apply_health_rules(nutrients: Dict, ingredients_text: str) -> Tuple[int, List[str]]:
+def apply_health_rules(nutrients: Dict, ingredients_text: str, conditions: List[str] = None) -> Tuple[int, List[str]]:
     """
-    Apply JSON-driven rules with direct/indirect/protective handling.
+    Apply JSON-driven rules (direct/indirect/protective nutrients, ingredients and
+    synergy rules) through the compiled plan in health_rule_engine.
     Returns (score_adjustment, warnings_with_confidence)
     """
-    warnings = []
-    score_adjustment = 0
-
-    for cond in USER_PROFILE["conditions"]:
-        cond = cond.strip().lower()
-        if cond not in HEALTH_RULES:
-            continue
-        rules = HEALTH_RULES[cond]
-        nutrient_rules = rules.get("nutrients", {})
-
-        # Direct
-        for nutrient, limits in nutrient_rules.get("direct", {}).items():
-            val = float(nutrients.get(nutrient, 0) or 0)
-            if val > limits["max"]:
-                score_adjustment -= limits.get("penalty", 1)
-                warnings.append(prefixed(rules.get("warnings", [""])[0], "HIGH"))
-
-        # Indirect
-        for nutrient, limits in nutrient_rules.get("indirect", {}).items():
-            val = float(nutrients.get(nutrient, 0) or 0)
-            if val > limits["max"]:
-                score_adjustment -= limits.get("penalty", 1)
-                warnings.append(prefixed(rules.get("warnings", [""])[0], "MEDIUM"))
-
-        # Protective (bonus if >= min)
-        for nutrient, limits in nutrient_rules.get("protective", {}).items():
-            val = float(nutrients.get(nutrient, 0) or 0)
-            if val >= limits.get("min", 0):
-                score_adjustment += limits.get("bonus", 0)
-                warnings.append(prefixed(f"{cond}: protective factor {nutrient}={val} (bonus)", "LOW"))
-
-        # Ingredient-based
-        for bad in rules.get("ingredients", []):
-            if bad in ingredients_text:
-                warnings.append(prefixed(rules.get("warnings", [""])[0], "HIGH"))
-
-    # Deduplicate warnings while preserving order
-    seen = set()
-    dedup = []
-    for w in warnings:
-        if w not in seen:
-            dedup.append(w); seen.add(w)
-    return score_adjustment, dedup
+    if conditions is None:
+        conditions = USER_PROFILE["conditions"]
+    return get_plan().evaluate(nutrients, ingredients_text, conditions)
 
 # -------------------- Ingredient warnings (allergens/additives) --------------------
 def ingredient_warnings(ingredients_text: str) -> List[str]:
@@ -231,6 +214,7 @@ def ingredient_warnings(ingredients_text: str) -> List[str]:
 def analyze_product(barcode: str) -> Dict:
     raw = fetch_product(barcode)
     product = {}
+    conf_warnings = None  # validation of the data we end up scoring; None = not validated yet
     if not raw or raw.get("status") != 1:
         print("\n❌ Product not found in OpenFoodFacts (OFF). You will be asked to enter data manually.")
         # manual full input
@@ -260,9 +244,11 @@ def analyze_product(barcode: str) -> Dict:
             if choice != "y":
                 nutrients = manual_nutrients(nutrients)
                 ingredients_text = manual_ingredients(ingredients_text)
+                conf_warnings = None
         # If OFF had no ingredients text, ask manual
         if not ingredients_text:
             ingredients_text = manual_ingredients("")
+            conf_warnings = None
 
     # Baseline score (from validated or manual nutrients)
     base_score = score_nutrients(nutrients)
@@ -274,12 +260,12 @@ def analyze_product(barcode: str) -> Dict:
     # Ingredient/allergen/additive warnings (with confidence)
     ing_warnings = ingredient_warnings(ingredients_text.lower())
 
-    # Additional confidence-level flagging from validate_nutrients (if present and not already shown)
-    suspicious2, conf_warnings2 = validate_nutrients(nutrients, ingredients_text)
-    # conf_warnings2 might duplicate earlier prints; include them with 'CHECK' level if present
+    # Confidence-level flagging from validate_nutrients; only re-run when manual entry changed the data
     # (If validate already run and user accepted, we still report these as informational)
+    if conf_warnings is None:
+        _, conf_warnings = validate_nutrients(nutrients, ingredients_text)
     # Combine and dedupe
-    combined = ing_warnings + health_warnings + conf_warnings2
+    combined = ing_warnings + health_warnings + conf_warnings
     seen = set(); out_warnings = []
     for w in combined:
         if w not in seen:
@@ -3,6 +3,8 @@ import re
 import requests
 from typing import Dict, Tuple, Any, Optional, List
 
+from ingredient_flagger import IngredientFlagger, env_rule_packs
+
 # ---------- Nutri-Score (kept for inputs & compatibility) ----------
 def _points_from_thresholds(value: float, thresholds: List[float]) -> int:
     return sum(value > t for t in thresholds)
@@ -125,25 +127,19 @@ def normalize_ingredients_text(text: str) -> List[str]:
         cleaned.append(s)
     return cleaned
 
+_flagger = None
+
+def get_flagger() -> IngredientFlagger:
+    """SEED_PATTERNS plus the INGRESCAN_FLAG_RULES packs, compiled once into a single scanner."""
+    global _flagger
+    if _flagger is None:
+        _flagger = IngredientFlagger(SEED_PATTERNS + env_rule_packs())
+    return _flagger
+
 def flag_ingredients(ingredients_text: str) -> List[Dict[str, str]]:
-    flags = []
-    text = (ingredients_text or "").lower()
-    for pat, label, consumption, reason in SEED_PATTERNS:
-        if re.search(pat, text):
-            flags.append({
-                "label": label,
-                "consumption": consumption,   # daily / weekly / occasional
-                "reason": reason
-            })
-    # Deduplicate by label
-    seen = set()
-    deduped = []
-    for f in flags:
-        if f["label"] in seen: 
-            continue
-        seen.add(f["label"])
-        deduped.append(f)
-    return deduped
+    # One combined-regex scan; flags come back in rule order, deduplicated by label
+    # (consumption is daily / weekly / occasional)
+    return get_flagger().flag(ingredients_text)
 
 # ---------- Manual Input Fallback ----------
 def manual_input() -> Tuple[Dict[str, float], str]:
@@ -1,10 +1,20 @@
+import os
+import sys
 import requests
 import json
 import time
 
-# Load health rules from JSON
-with open("health_rules.json", "r") as f:
-    HEALTH_RULES = json.load(f)
+# Health rules come from the compiled knowledge base (Ingredients_logic/knowledge_base.py)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "Ingredients_logic"))
+from knowledge_base import get_kb
+from offline_mode import is_offline
+from health_rule_engine import get_plan
+
+
+def __getattr__(name):
+    if name == "HEALTH_RULES":
+        return get_kb().section("health_rules")
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # Default allergens/preservatives list
 ALLERGENS = ["milk", "peanut", "soy", "gluten", "almond", "cashew", "walnut"]
@@ -15,6 +25,8 @@ USER_PROFILE = {"allergies": [], "conditions": []}
 
 
 def fetch_product(barcode):
+    if is_offline():
+        return None
     url = f"https://world.openfoodfacts.org/api/v0/product/{barcode}.json"
     res = requests.get(url)
     if res.status_code == 200:
@@ -75,40 +87,8 @@ def check_warnings(ingredients):
 
 
 def apply_health_rules(nutrients, ingredients):
-    warnings = []
-    score_penalty = 0
-
-    for condition in USER_PROFILE["conditions"]:
-        condition = condition.strip().lower()
-        if condition in HEALTH_RULES:
-            rules = HEALTH_RULES[condition]
-
-            # Nutrient-based penalties
-            for nutrient, limits in rules.get("nutrients", {}).items():
-                if nutrients.get(nutrient, 0) > limits["max"]:
-                    score_penalty -= limits["penalty"]
-                    warnings.extend(rules.get("warnings", []))
-
-            # Ingredient-based warnings
-            for bad in rules.get("ingredients", []):
-                if bad in ingredients:
-                    warnings.extend(rules.get("warnings", []))
-
-    return score_penalty, list(set(warnings))  # remove duplicates
-
-
-def apply_synergy_rules(nutrients):
-    synergy_penalty = 0
-    synergy_warnings = []
-
-    for rule in HEALTH_RULES.get("synergy_rules", []):
-        n1, n2 = rule["nutrient1"], rule["nutrient2"]
-        th1, th2 = rule["thresholds"]
-        if nutrients.get(n1, 0) > th1 and nutrients.get(n2, 0) > th2:
-            synergy_penalty -= rule["penalty"]
-            synergy_warnings.append(f"[HIGH] {rule['warning']}")
-
-    return synergy_penalty, synergy_warnings
+    # Nutrient, ingredient and synergy rules all come from the compiled plan, as in ingrescan.py
+    return get_plan().evaluate(nutrients, ingredients, USER_PROFILE["conditions"])
 
 
 def check_data_reliability(product):
@@ -155,11 +135,10 @@ def analyze_product(barcode):
 
     # Apply health penalties
     penalty, health_warnings = apply_health_rules(nutrients, ingredients.lower())
-    synergy_penalty, synergy_warnings = apply_synergy_rules(nutrients)
-    score = max(score + penalty + synergy_penalty, 1)
+    score = max(score + penalty, 1)
 
     # General + personalized warnings
-    warnings = check_warnings(ingredients.lower()) + health_warnings + synergy_warnings + extra_warnings
+    warnings = check_warnings(ingredients.lower()) + health_warnings + extra_warnings
 
     return {
         "Product": name,
@@ -0,0 +1,274 @@
+"""nutrient_store.py
+
+Columnar in-memory nutrient store for product catalogs.
+
+Instead of one `nutriments` dict per product (with values that may be numbers,
+numeric strings or "80g"-style strings), the catalog keeps one typed float
+array per nutrient, a barcode -> row index, and NaN as the null marker
+(null_mask() / valid_mask() expose it as boolean masks). A 1M-product catalog
+with 11 nutrients is ~88 MB of float64 (44 MB as float32) versus hundreds of MB of
+dicts, and filters / aggregations are single numpy passes.
+
+    catalog = NutrientCatalog.from_products(products)   # OFF product dicts
+    rows = catalog.filter({"sugars_100g": (">", 22.5), "fiber_100g": ("notnull", None)})
+    catalog.aggregate("salt_100g", "mean", rows)
+    batch_scoring.nutri_score_batch(**catalog.nutriscore_columns())
+"""
+from __future__ import annotations
+import re
+from typing import Dict, Any, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+NUTRIENT_FIELDS = (
+    "energy-kj_100g", "energy_100g", "fat_100g", "saturated-fat_100g", "carbohydrates_100g",
+    "sugars_100g", "fiber_100g", "proteins_100g", "salt_100g", "sodium_100g",
+    "fruits-vegetables-nuts_100g",
+)
+
+_NUMBER = re.compile(r"^\s*([-+]?\d+(?:[.,]\d+)?)")
+
+_OPS = {
+    ">": np.greater, ">=": np.greater_equal, "<": np.less, "<=": np.less_equal,
+    "==": np.equal, "!=": np.not_equal,
+}
+
+
+def to_float(value: Any) -> float:
+    """Nutrient value -> float; None, "" and unparseable strings become NaN. "80g" -> 80.0"""
+    if value is None or isinstance(value, bool):
+        return np.nan
+    if isinstance(value, (int, float)):
+        return float(value)
+    m = _NUMBER.match(str(value))
+    return float(m.group(1).replace(",", ".")) if m else np.nan
+
+
+class NutrientCatalog:
+    """One float array per nutrient, a barcode -> row index and NaN nulls."""
+
+    def __init__(self, fields: Sequence[str] = NUTRIENT_FIELDS, capacity: int = 1024, dtype=np.float64):
+        self.fields = tuple(fields)
+        self.dtype = np.dtype(dtype)
+        self._columns = {f: np.full(capacity, np.nan, dtype=self.dtype) for f in self.fields}
+        self._barcodes: List[str] = []
+        self._index: Dict[str, int] = {}
+
+    # ---------- Loading ----------
+    def __len__(self) -> int:
+        return len(self._barcodes)
+
+    def __contains__(self, barcode: str) -> bool:
+        return barcode in self._index
+
+    def _grow(self, needed: int) -> None:
+        capacity = len(next(iter(self._columns.values())))
+        if needed <= capacity:
+            return
+        new_capacity = max(needed, capacity * 2)
+        for f, col in self._columns.items():
+            grown = np.full(new_capacity, np.nan, dtype=self.dtype)
+            grown[:capacity] = col
+            self._columns[f] = grown
+
+    def add(self, barcode: str, nutriments: Dict[str, Any]) -> int:
+        """Insert or replace one product's nutrients; returns its row."""
+        row = self._index.get(barcode)
+        if row is None:
+            row = len(self._barcodes)
+            self._grow(row + 1)
+            self._barcodes.append(barcode)
+            self._index[barcode] = row
+        for f in self.fields:
+            self._columns[f][row] = to_float(nutriments.get(f))
+        return row
+
+    def add_product(self, product: Dict[str, Any], barcode: Optional[str] = None) -> int:
+        """Insert an OFF product dict (fruit % lives on the product, not in nutriments)."""
+        nutriments = dict(product.get("nutriments") or {})
+        fruit = product.get("fruits-vegetables-nuts_100g") or product.get("fruits-vegetables-nuts-estimate_100g")
+        if fruit is not None:
+            nutriments["fruits-vegetables-nuts_100g"] = fruit
+        return self.add(barcode or str(product.get("code") or product.get("_id") or len(self)), nutriments)
+
+    @classmethod
+    def from_products(cls, products: Iterable[Dict[str, Any]], **kwargs) -> "NutrientCatalog":
+        products = list(products)
+        catalog = cls(capacity=max(1, len(products)), **kwargs)
+        for p in products:
+            catalog.add_product(p)
+        return catalog
+
+    @classmethod
+    def from_columns(cls, barcodes: Sequence[str], columns: Dict[str, Sequence[float]], dtype=np.float64) -> "NutrientCatalog":
+        """Bulk build from ready-made arrays (missing fields are all-null)."""
+        n = len(barcodes)
+        catalog = cls(fields=tuple(dict.fromkeys([*NUTRIENT_FIELDS, *columns])), capacity=max(1, n), dtype=dtype)
+        for f, values in columns.items():
+            catalog._columns[f][:n] = np.asarray(values, dtype=catalog.dtype)
+        catalog._barcodes = [str(b) for b in barcodes]
+        catalog._index = {b: i for i, b in enumerate(catalog._barcodes)}
+        if len(catalog._index) != n:
+            raise ValueError("Duplicate barcodes in from_columns")
+        return catalog
+
+    # ---------- Access ----------
+    def column(self, field: str) -> np.ndarray:
+        """Read-only view of one nutrient for every product (NaN = missing)."""
+        view = self._columns[field][:len(self)]
+        view.flags.writeable = False
+        return view
+
+    def null_mask(self, field: str) -> np.ndarray:
+        return np.isnan(self._columns[field][:len(self)])
+
+    def valid_mask(self, field: str) -> np.ndarray:
+        return ~self.null_mask(field)
+
+    def row(self, barcode: str) -> Optional[int]:
+        return self._index.get(barcode)
+
+    def barcodes(self, rows: Optional[np.ndarray] = None) -> List[str]:
+        if rows is None:
+            return list(self._barcodes)
+        return [self._barcodes[i] for i in np.asarray(rows).tolist()]
+
+    def get(self, barcode: str) -> Optional[Dict[str, float]]:
+        """Non-null nutrients of one product as a plain dict."""
+        row = self._index.get(barcode)
+        if row is None:
+            return None
+        out = {}
+        for f in self.fields:
+            value = self._columns[f][row]
+            if not np.isnan(value):
+                out[f] = float(value)
+        return out
+
+    # ---------- Filters & aggregations ----------
+    def mask(self, conditions: Dict[str, Tuple[str, Any]]) -> np.ndarray:
+        """
+        Boolean row mask for {field: (op, value)}, all conditions ANDed.
+        ops: > >= < <= == != between (value=(lo, hi), inclusive), null, notnull.
+        Comparisons are False on nulls.
+        """
+        result = np.ones(len(self), dtype=bool)
+        for field, (op, value) in conditions.items():
+            col = self._columns[field][:len(self)]
+            if op == "null":
+                result &= np.isnan(col)
+            elif op == "notnull":
+                result &= ~np.isnan(col)
+            elif op == "between":
+                lo, hi = value
+                result &= (col >= lo) & (col <= hi)
+            elif op in _OPS:
+                result &= _OPS[op](col, value)
+            else:
+                raise ValueError(f"Unknown filter op {op!r}")
+        return result
+
+    def filter(self, conditions: Dict[str, Tuple[str, Any]]) -> np.ndarray:
+        """Row indices matching every condition (see mask())."""
+        return np.flatnonzero(self.mask(conditions))
+
+    def aggregate(self, field: str, how: str = "mean", rows: Optional[np.ndarray] = None) -> float:
+        """mean / sum / min / max / median / count / nulls over non-null values (optionally only rows)."""
+        col = self._columns[field][:len(self)]
+        if rows is not None:
+            col = col[rows]
+        if how == "nulls":
+            return int(np.isnan(col).sum())
+        valid = col[~np.isnan(col)]
+        if how == "count":
+            return int(valid.size)
+        if valid.size == 0:
+            return float("nan")
+        funcs = {"mean": np.mean, "sum": np.sum, "min": np.min, "max": np.max, "median": np.median}
+        if how not in funcs:
+            raise ValueError(f"Unknown aggregation {how!r}")
+        return float(funcs[how](valid.astype(np.float64)))
+
+    def describe(self, rows: Optional[np.ndarray] = None) -> Dict[str, Dict[str, float]]:
+        return {f: {how: self.aggregate(f, how, rows) for how in ("count", "nulls", "mean", "min", "max")}
+                for f in self.fields}
+
+    def nbytes(self) -> int:
+        """Bytes held by the nutrient columns (barcode index not included)."""
+        return sum(col[:len(self)].nbytes for col in self._columns.values())
+
+    # ---------- Scoring bridge ----------
+    def nutriscore_columns(self, rows: Optional[np.ndarray] = None) -> Dict[str, np.ndarray]:
+        """
+        Inputs for batch_scoring.nutri_score_batch, derived exactly like
+        ingrescan_barcode.extract_for_nutriscore (0/missing falls through to the next source).
+        """
+        def col(field):
+            values = self._columns[field][:len(self)].astype(np.float64)
+            return values if rows is None else values[rows]
+
+        def first(*cols):
+            out = np.zeros_like(cols[0])
+            done = np.zeros(out.shape, dtype=bool)
+            for c in cols:
+                take = ~done & ~np.isnan(c) & (c != 0)
+                out[take] = c[take]
+                done |= take
+            return out
+
+        sodium_mg = first(col("sodium_100g")) * 1000.0
+        salt = col("salt_100g")
+        use_salt = (sodium_mg == 0) & ~np.isnan(salt)
+        sodium_mg[use_salt] = salt[use_salt] * 0.393 * 1000.0
+        return {
+            "energy_kj": first(col("energy-kj_100g"), col("energy_100g")),
+            "sugars_g": first(col("sugars_100g")),
+            "sat_fat_g": first(col("saturated-fat_100g")),
+            "sodium_mg": sodium_mg,
+            "fruit_pct": first(col("fruits-vegetables-nuts_100g")),
+            "fiber_g": first(col("fiber_100g")),
+            "protein_g": first(col("proteins_100g")),
+        }
+
+    # ---------- Persistence ----------
+    def save(self, path: str) -> None:
+        n = len(self)
+        np.savez_compressed(path, __barcodes__=np.array(self._barcodes, dtype=str),
+                            **{f"col:{f}": col[:n] for f, col in self._columns.items()})
+
+    @classmethod
+    def load(cls, path: str) -> "NutrientCatalog":
+        with np.load(path, allow_pickle=False) as data:
+            barcodes = data["__barcodes__"].tolist()
+            columns = {k[4:]: data[k] for k in data.files if k.startswith("col:")}
+        dtype = next(iter(columns.values())).dtype if columns else np.float64
+        return cls.from_columns(barcodes, columns, dtype=dtype)
+
+
+# 🔍 Example: memory and filter speed on a synthetic catalog
+if __name__ == "__main__":
+    import sys
+    import time
+
+    n = 200_000
+    rng = np.random.default_rng(3)
+    products = []
+    for i in range(n):
+        nutriments = {"energy-kj_100g": float(rng.uniform(0, 3000)), "sugars_100g": round(float(rng.uniform(0, 60)), 1),
+                      "saturated-fat_100g": round(float(rng.uniform(0, 15)), 1), "salt_100g": f"{rng.uniform(0, 3):.2f}g",
+                      "proteins_100g": round(float(rng.uniform(0, 25)), 1)}
+        if i % 3:
+            nutriments["fiber_100g"] = round(float(rng.uniform(0, 8)), 1)
+        products.append({"code": f"{8900000000000 + i}", "nutriments": nutriments})
+
+    dict_bytes = sum(sys.getsizeof(p["nutriments"]) + sum(sys.getsizeof(v) for v in p["nutriments"].values())
+                     for p in products)
+    catalog = NutrientCatalog.from_products(products)
+    print(f"{n:,} products: dicts ~{dict_bytes / 1e6:.1f} MB, columns {catalog.nbytes() / 1e6:.1f} MB")
+
+    start = time.perf_counter()
+    rows = catalog.filter({"sugars_100g": (">", 22.5), "salt_100g": (">", 1.5), "fiber_100g": ("notnull", None)})
+    mean_salt = catalog.aggregate("salt_100g", "mean", rows)
+    print(f"High sugar+salt with fiber data: {len(rows):,} products, mean salt {mean_salt:.2f} g "
+          f"({(time.perf_counter() - start) * 1000:.1f} ms)")
+    print(catalog.get(products[0]["code"]))
@@ -0,0 +1,87 @@
+"""test_alternatives_index.py"""
+from __future__ import annotations
+
+import pytest
+
+from alternatives_index import AlternativesIndex, allergen_classes, product_allergens
+
+
+def spread(code, sugars, allergens=(), category="en:spreads", fat=30.0):
+    return {
+        "code": code, "product_name": f"Spread {code}",
+        "categories_tags": ["en:foods", category],
+        "allergens_tags": list(allergens),
+        "nutriments": {"energy-kj_100g": 1500, "fat_100g": fat, "saturated-fat_100g": 5, "sugars_100g": sugars,
+                       "carbohydrates_100g": sugars + 5, "fiber_100g": 1, "proteins_100g": 2, "salt_100g": 0.5},
+    }
+
+
+@pytest.fixture(scope="module")
+def index():
+    products = [
+        spread("scanned", 40, ["en:milk"]),
+        spread("milk-1", 5, ["en:milk"]),
+        spread("soy-1", 10, ["en:soybeans"]),
+        spread("nut-1", 12, ["en:nuts"]),
+        spread("almond-1", 14, ["en:almonds"]),
+        spread("clean-1", 20),
+        spread("clean-2", 35, fat=10),
+        spread("worse-1", 45),
+        spread("cereal-1", 0, category="en:breakfast-cereals"),
+    ]
+    return AlternativesIndex.build(products)
+
+
+def barcodes(hits):
+    return [h["barcode"] for h in hits]
+
+
+@pytest.mark.parametrize("tag, expected", [
+    ("en:soybeans", {"soy"}), ("soya", {"soy"}), ("Peanuts", {"peanut"}),
+    ("nuts", {"peanut", "tree nut"}), ("en:celery", {"celery"}),
+])
+def test_allergen_names_are_reduced_to_kb_classes(tag, expected):
+    assert allergen_classes(tag) == expected
+
+
+def test_product_allergens_include_traces():
+    product = {"allergens_tags": ["en:milk"], "traces_tags": ["en:soybeans"]}
+    assert product_allergens(product) == allergen_classes("milk") | {"soy"}
+
+
+def test_only_strictly_better_products_from_the_same_category(index):
+    hits = index.query("scanned", k=10, min_candidates=1)
+    assert "scanned" not in barcodes(hits) and "worse-1" not in barcodes(hits)
+    assert "cereal-1" not in barcodes(hits)
+    scanned = index.scores[index.barcodes.index("scanned")]
+    assert all(h["nutri_score"] < scanned and h["category"] == "en:spreads" for h in hits)
+
+
+def test_results_are_ordered_by_distance(index):
+    hits = index.query("scanned", k=10, min_candidates=1)
+    assert [h["distance"] for h in hits] == sorted(h["distance"] for h in hits)
+    assert len(index.query("scanned", k=2, min_candidates=1)) == 2
+
+
+@pytest.mark.parametrize("allergens, excluded", [
+    (["milk"], {"milk-1"}),
+    (["soya"], {"soy-1"}),
+    (["nuts"], {"nut-1", "almond-1"}),
+    # "en:nuts" may mean tree nuts, so an almond allergy rules it out too
+    (["almonds"], {"almond-1", "nut-1"}),
+    (["peanut"], {"nut-1"}),
+])
+def test_user_allergens_are_filtered_out(index, allergens, excluded):
+    everything = set(barcodes(index.query("scanned", k=10, min_candidates=1)))
+    filtered = set(barcodes(index.query("scanned", k=10, allergens=allergens, min_candidates=1)))
+    assert filtered == everything - excluded
+
+
+def test_query_by_product_dict(index):
+    product = spread("not-indexed", 40)
+    hits = index.query(product, k=10, min_candidates=1)
+    assert hits and "not-indexed" not in barcodes(hits)
+
+
+def test_unknown_barcode(index):
+    assert index.query("0000") == []
@@ -0,0 +1,82 @@
+"""test_batch_cli.py
+
+Runs the batch CLI offline against a seeded product cache, so no row touches OFF.
+"""
+from __future__ import annotations
+
+import json
+
+import pytest
+
+import batch_cli
+import product_cache
+from offline_mode import OFFLINE_ENV
+from product_cache import ProductCache
+
+PRODUCT = {
+    "product_name": "Choco Spread",
+    "ingredients_text": "Sugar, palm oil, hazelnuts, skimmed milk powder",
+    "nutriments": {"energy-kj_100g": 2250, "sugars_100g": "56.3g", "saturated-fat_100g": 10.6, "salt_100g": 0.1,
+                   "fiber_100g": 3.4, "proteins_100g": 6.3, "carbohydrates_100g": 57.5, "fat_100g": 30.9},
+}
+
+
+@pytest.fixture
+def seeded(monkeypatch):
+    monkeypatch.setenv(OFFLINE_ENV, "1")
+    cache = ProductCache()
+    monkeypatch.setattr(product_cache, "_shared", cache)
+    cache.set("off:111", PRODUCT)
+    return cache
+
+
+@pytest.mark.parametrize("name, content", [
+    ("codes.csv", "name,barcode\nA,111\nB,\nC,222\n"),
+    ("codes.csv", "111\n222\n"),
+    ("codes.jsonl", '{"code": "111"}\n"222"\n\n'),
+    ("codes.txt", "111,extra\n\n222\n"),
+])
+def test_read_barcodes_formats(tmp_path, name, content):
+    path = tmp_path / name
+    path.write_text(content)
+    assert list(batch_cli.read_barcodes(str(path))) == ["111", "222"]
+
+
+def test_load_profile_normalizes(tmp_path):
+    path = tmp_path / "profile.json"
+    path.write_text(json.dumps({"conditions": [" Diabetes "], "allergies": ["Milk", " "]}))
+    assert batch_cli.load_profile(str(path)) == {"conditions": ["diabetes"], "allergies": ["milk"]}
+
+
+def test_clean_nutriments_parses_strings_and_drops_junk():
+    assert batch_cli.clean_nutriments({"a": "80g", "b": 1, "c": "traces", "d": None}) == {"a": 80.0, "b": 1.0}
+
+
+def test_cli_scores_without_prompts_and_marks_offline_rows(seeded, tmp_path, monkeypatch):
+    monkeypatch.setattr("builtins.input", pytest.fail)
+    (tmp_path / "codes.txt").write_text("111\n222\n")
+    (tmp_path / "profile.json").write_text(json.dumps({"conditions": ["diabetes"], "allergies": ["milk"]}))
+    out = tmp_path / "out.jsonl"
+
+    assert batch_cli.main([str(tmp_path / "codes.txt"), "--profile", str(tmp_path / "profile.json"),
+                           "-o", str(out), "--workers", "2", "--progress", "0"]) == 0
+
+    rows = {row["barcode"]: row for row in map(json.loads, out.read_text().splitlines())}
+    assert rows["222"]["status"] == "not_found"
+    found = rows["111"]
+    assert found["status"] in ("ok", "suspicious")
+    assert found["product_name"] == "Choco Spread"
+    assert found["nutri_grade"] in "ABCDE"
+    assert "[HIGH] Contains your allergen: milk" in found["warnings"]
+    assert all(row["offline"] is True for row in rows.values())
+
+
+def test_resume_skips_finished_barcodes(seeded, tmp_path):
+    (tmp_path / "codes.txt").write_text("111\n222\n")
+    out = tmp_path / "out.jsonl"
+    out.write_text(json.dumps({"barcode": "111", "status": "ok"}) + "\n"
+                   + json.dumps({"barcode": "222", "status": "error"}) + "\n")
+    batch_cli.main([str(tmp_path / "codes.txt"), "-o", str(out), "--resume", "--progress", "0"])
+    lines = [json.loads(line) for line in out.read_text().splitlines()]
+    assert [row["barcode"] for row in lines] == ["111", "222", "222"]
+    assert lines[-1]["status"] == "not_found"
@@ -0,0 +1,86 @@
+"""test_batch_scoring.py
+
+The vectorized scorers must agree with the scalar ones product for product,
+including threshold boundaries, NaN inputs and round() ties.
+"""
+from __future__ import annotations
+
+import numpy as np
+import pytest
+
+import ingrescan
+import ingrescan_barcode as scalar
+import ingrescan_barcode1 as scalar1
+from batch_scoring import (NUTRISCORE_FIELDS, custom_health_score_batch, nutri_score_batch, nutri_score_row,
+                           nutriscore_inputs, score_nutrients_batch)
+
+N = 5_000
+
+
+@pytest.fixture(scope="module")
+def columns():
+    rng = np.random.default_rng(11)
+    cols = {
+        "energy_kj": rng.choice([0, 335, 335.0001, 1675, 3350, 4000], N).astype(np.float64),
+        "sugars_g": rng.uniform(0, 60, N).round(1),
+        "sat_fat_g": rng.choice([0, 1, 5, 5.5, 10, 12], N).astype(np.float64),
+        "sodium_mg": rng.uniform(0, 1200, N).round(0),
+        "fruit_pct": rng.choice([0, 39.9, 40, 59.9, 60, 80, 100], N).astype(np.float64),
+        "fiber_g": rng.uniform(0, 8, N).round(2),
+        "protein_g": rng.uniform(0, 30, N).round(2),
+    }
+    cols["sugars_g"][:50] = np.nan
+    cols["fruit_pct"][50:100] = np.nan
+    return cols
+
+
+def row(cols, i):
+    return {name: float(values[i]) for name, values in cols.items()}
+
+
+def test_nutri_score_matches_the_scalar_scorer(columns):
+    result = nutri_score_batch(**columns)
+    for i in range(N):
+        assert nutri_score_row(result, i) == scalar.nutri_score_full(**row(columns, i)), i
+
+
+@pytest.mark.parametrize("module, weight", [(scalar, 2.0), (scalar1, 2.5)])
+def test_custom_health_score_matches_both_variants(columns, module, weight):
+    fields = ("sugars_g", "sat_fat_g", "sodium_mg", "fiber_g", "protein_g")
+    batch = custom_health_score_batch(*(np.nan_to_num(columns[f]) for f in fields), fiber_weight=weight)
+    for i in range(N):
+        nutrients = {f: float(np.nan_to_num(columns[f][i])) for f in fields}
+        assert batch[i] == module.custom_health_score(nutrients), i
+
+
+def test_round_half_ties_follow_python_round():
+    # 5.0 + 0.25 and friends sit exactly on .x5 ties in binary
+    protein = np.array([3.3333, 1.0, 0.6667, 2.0])
+    batch = custom_health_score_batch(np.zeros(4), np.zeros(4), np.zeros(4), np.zeros(4), protein)
+    for value, p in zip(batch, protein):
+        nutrients = {"sugars_g": 0.0, "sat_fat_g": 0.0, "sodium_mg": 0.0, "fiber_g": 0.0, "protein_g": float(p)}
+        assert value == scalar.custom_health_score(nutrients)
+
+
+def test_baseline_score_matches_score_nutrients(columns):
+    salt = columns["sodium_mg"] / 393.0
+    fields = [np.nan_to_num(columns["sugars_g"]), columns["sat_fat_g"], salt, columns["fiber_g"], columns["protein_g"]]
+    batch = score_nutrients_batch(*fields)
+    for i in range(N):
+        assert batch[i] == ingrescan.score_nutrients({
+            "sugars_100g": float(fields[0][i]), "saturated-fat_100g": float(fields[1][i]), "salt_100g": float(salt[i]),
+            "fiber_100g": float(fields[3][i]), "proteins_100g": float(fields[4][i]),
+        }), i
+
+
+def test_inputs_from_product_dicts():
+    products = [
+        {"nutriments": {"energy-kj_100g": 1500, "sugars_100g": 20, "saturated-fat_100g": 3, "salt_100g": 1.0,
+                        "fiber_100g": 2, "proteins_100g": 6}},
+        {"nutriments": {}},
+    ]
+    cols = nutriscore_inputs(products)
+    assert list(cols) == list(NUTRISCORE_FIELDS)
+    for i, product in enumerate(products):
+        expected = scalar.extract_for_nutriscore(product)
+        assert tuple(float(cols[name][i]) for name in NUTRISCORE_FIELDS) == expected
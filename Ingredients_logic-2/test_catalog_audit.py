@@ -0,0 +1,84 @@
+"""test_catalog_audit.py
+
+The vectorized audit must flag every product exactly like validate_nutrients.
+"""
+from __future__ import annotations
+
+import json
+
+import numpy as np
+
+import ingrescan
+from catalog_audit import AUDIT_FIELDS, audit_catalog, audit_file, audit_products
+from nutrient_store import NutrientCatalog
+
+TEXTS = [
+    "", "Sugar, wheat flour, palm oil", "Water, sodium benzoate, potassium sorbate", "Coffee extract, water",
+    "Glucose syrup, cocoa", "Maize, salt, E211, E202, sodium nitrite", "Rice,, , beans", "ENERGY drink base",
+]
+
+
+def random_products(n, seed):
+    rng = np.random.default_rng(seed)
+    fields = ("sugars_100g", "carbohydrates_100g", "fat_100g", "proteins_100g", "salt_100g", "sodium_100g",
+              "caffeine_100g")
+    values = [None, "", -1, 0, 0.2, 4.9, 5, 12, 30, 45, 60, "80g"]
+    products = []
+    for i in range(n):
+        nutriments = {f: values[rng.integers(len(values))] for f in fields if rng.random() < 0.8}
+        products.append({"code": str(i), "nutriments": nutriments, "ingredients_text": TEXTS[i % len(TEXTS)]})
+    return products
+
+
+def scalar(product):
+    nutrients = {k: ingrescan_value(v) for k, v in product["nutriments"].items()}
+    return ingrescan.validate_nutrients(nutrients, product["ingredients_text"].lower())
+
+
+def ingrescan_value(value):
+    # The audit parses "80g" like the catalog does; hand validate_nutrients the same number
+    return 80.0 if value == "80g" else value
+
+
+def test_audit_matches_validate_nutrients():
+    products = random_products(2000, 5)
+    result = audit_products(products)
+    for i, product in enumerate(products):
+        suspicious, warnings = scalar(product)
+        assert bool(result.suspicious[i]) == suspicious, product
+        assert result.warnings(i) == warnings, product
+
+
+def test_catalog_input_gives_the_same_result():
+    products = random_products(300, 6)
+    catalog = NutrientCatalog.from_products(products, fields=AUDIT_FIELDS)
+    texts = [p["ingredients_text"] for p in products]
+    by_catalog = audit_catalog(catalog, texts)
+    by_products = audit_products(products)
+    assert by_catalog.suspicious.tolist() == by_products.suspicious.tolist()
+    assert [by_catalog.codes(i) for i in range(300)] == [by_products.codes(i) for i in range(300)]
+
+
+def test_summary_counts_rules():
+    result = audit_products([
+        {"code": "a", "nutriments": {"salt_100g": 12}, "ingredients_text": "salt"},
+        {"code": "b", "nutriments": {"sodium_100g": 0.4}, "ingredients_text": "water"},
+        {"code": "c", "nutriments": {}, "ingredients_text": "water"},
+    ])
+    summary = result.summary()
+    assert summary["products"] == 3
+    assert summary["suspicious"] == 1          # sodium without salt is only a check
+    assert summary["with_issues"] == 2
+    assert summary["rules"]["salt_unrealistic"] == 1 and summary["rules"]["sodium_without_salt"] == 1
+
+
+def test_audit_file_reports_only_products_with_issues(tmp_path):
+    path = tmp_path / "catalog.jsonl"
+    path.write_text("\n".join(json.dumps(p) for p in random_products(50, 7)))
+    report = tmp_path / "issues.jsonl"
+    with open(report, "w", encoding="utf-8") as out:
+        totals = audit_file(str(path), report=out, chunk_size=16)
+    records = [json.loads(line) for line in report.read_text().splitlines()]
+    assert totals["products"] == 50
+    assert len(records) == totals["with_issues"]
+    assert all(record["issues"] for record in records)
@@ -0,0 +1,91 @@
+"""test_health_rule_engine.py
+
+evaluate_matrix() must give every (product, profile) pair the same adjustment
+and warnings as the scalar evaluate().
+"""
+from __future__ import annotations
+
+import itertools
+
+import numpy as np
+
+from health_rule_engine import HealthRulePlan, get_plan
+from nutrient_store import NutrientCatalog
+
+RULES = {
+    "diabetes": {
+        "nutrients": {
+            "sugars_100g": {"max": 5, "penalty": 3},
+            "indirect": {"carbohydrates_100g": {"max": 15, "penalty": 1}},
+            "protective": {"fiber_100g": {"min": 6, "bonus": 1}},
+        },
+        "ingredients": ["glucose", "corn syrup"],
+        "warnings": ["High sugar"],
+    },
+    "high_bp": {"nutrients": {"salt_100g": {"max": 0.5, "penalty": 3}}, "ingredients": [], "warnings": ["High salt"]},
+    "synergy_rules": [
+        {"nutrient1": "sugars_100g", "nutrient2": "fat_100g", "thresholds": [10, 15], "penalty": 2, "warning": "Sugar+Fat"},
+    ],
+}
+
+
+def all_profiles(plan):
+    profiles = [list(c) for k in range(len(plan.conditions) + 1) for c in itertools.combinations(plan.conditions, k)]
+    return profiles + [["Diabetes ", "diabetes"], ["unknown"]]
+
+
+def assert_matches_scalar(plan, columns, texts):
+    profiles = all_profiles(plan)
+    result = plan.evaluate_matrix(columns, texts, profiles)
+    n = len(texts)
+    for i in range(n):
+        nutrients = {name: values[i] for name, values in columns.items()}
+        for j, profile in enumerate(profiles):
+            adjustment, warnings = plan.evaluate(nutrients, texts[i], profile)
+            assert result.adjustments[i, j] == adjustment, (i, profile)
+            assert result.warnings(i, j) == warnings, (i, profile)
+
+
+def random_columns(plan, n, seed):
+    rng = np.random.default_rng(seed)
+    return {name: rng.choice([0.0, 0.3, 0.5, 5.0, 6.0, 12.0, 16.0, 20.0], n) for name in plan.nutrients}
+
+
+def test_every_rule_kind_matches_the_scalar_path():
+    plan = HealthRulePlan(RULES)
+    assert plan.rule_kind == ["direct", "indirect", "protective", "direct"]
+    texts = list(np.random.default_rng(1).choice(["sugar, glucose", "wheat", "corn syrup, salt", ""], 300))
+    assert_matches_scalar(plan, random_columns(plan, 300, 2), texts)
+
+
+def test_shipped_rules_match_the_scalar_path():
+    plan = get_plan()
+    texts = list(np.random.default_rng(3).choice(["glucose syrup", "tuna, alcohol", "raw_fish", "rice"], 200))
+    assert_matches_scalar(plan, random_columns(plan, 200, 4), texts)
+
+
+def test_scalar_path_on_one_product():
+    plan = HealthRulePlan(RULES)
+    adjustment, warnings = plan.evaluate(
+        {"sugars_100g": "12g", "fat_100g": 20, "fiber_100g": 6}, "glucose", ["diabetes"])
+    assert adjustment == -3 + 1 - 2
+    assert warnings == ["[HIGH] High sugar", "[LOW] diabetes: protective factor fiber_100g=6.0 (bonus)",
+                        "[HIGH] Sugar+Fat"]
+
+
+def test_catalog_and_dict_inputs_agree():
+    plan = HealthRulePlan(RULES)
+    products = [{"sugars_100g": 12, "salt_100g": 1.0}, {"fiber_100g": "7"}, {}]
+    catalog = NutrientCatalog.from_products([{"code": str(i), "nutriments": p} for i, p in enumerate(products)])
+    profiles = [["diabetes", "high_bp"]]
+    from_dicts = plan.evaluate_matrix(products, None, profiles)
+    from_catalog = plan.evaluate_matrix(catalog, None, profiles)
+    assert from_dicts.adjustments.tolist() == from_catalog.adjustments.tolist() == [[-6], [1], [0]]
+
+
+def test_fractional_penalties_stay_float():
+    penalty = 1.5
+    rules = {"x": {"nutrients": {"salt_100g": {"max": 0, "penalty": penalty}}, "warnings": ["w"]}}
+    result = HealthRulePlan(rules).evaluate_matrix({"salt_100g": np.array([1.0])}, None, [["x"]])
+    assert result.adjustments.dtype == np.float64
+    assert result.adjustments[0, 0] == -penalty
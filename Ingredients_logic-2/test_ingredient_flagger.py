@@ -0,0 +1,88 @@
+"""test_ingredient_flagger.py
+
+The combined scanner must flag exactly what one re.search per rule would.
+"""
+from __future__ import annotations
+
+import json
+import os
+import re
+
+import numpy as np
+import pytest
+
+from ingredient_flagger import IngredientFlagger, _top_level_alternation, load_rule_pack
+from ingrescan_barcode1 import SEED_PATTERNS
+
+PACK = os.path.join(os.path.dirname(os.path.abspath(__file__)), "rule_packs", "additives_extra.json")
+
+TEXTS = [
+    "", "Sugar, palm oil, hydrogenated vegetable fat, e211", "Water, partially hydrogenated soybean oil",
+    "Palmolein, glucose-fructose syrup, msg", "Wheat flour, trans fat, aspartame, e621, sodium nitrite",
+    "Cocoa butter, emulsifier (soy lecithin)", "unpalm oiled", "E-211, E 250, INS 330",
+]
+
+
+def reference(rules, text):
+    """The per-pattern loop the flagger replaces."""
+    text = (text or "").lower()
+    seen, out = set(), []
+    for pattern, label, consumption, reason in rules:
+        if re.search(pattern, text) and label not in seen:
+            seen.add(label)
+            out.append({"label": label, "consumption": consumption, "reason": reason})
+    return out
+
+
+@pytest.fixture(scope="module")
+def rules():
+    return list(SEED_PATTERNS) + load_rule_pack(PACK)
+
+
+def test_flags_match_one_search_per_rule(rules):
+    flagger = IngredientFlagger(rules)
+    rng = np.random.default_rng(0)
+    words = [w for text in TEXTS for w in re.split(r"[ ,]+", text) if w]
+    texts = TEXTS + [", ".join(rng.choice(words, rng.integers(1, 12))) for _ in range(500)]
+    for text in texts:
+        assert flagger.flag(text) == reference(rules, text), text
+    assert flagger.flag_batch(texts) == [reference(rules, t) for t in texts]
+
+
+def test_overlapping_rules_at_the_same_position():
+    rules = [(r"\bpalm", "A", "weekly", ""), (r"\bpalm oil\b", "B", "weekly", ""), (r"oil", "C", "daily", "")]
+    flagger = IngredientFlagger(rules)
+    assert [f["label"] for f in flagger.flag("palm oil")] == ["A", "B", "C"]
+
+
+def test_leading_word_boundary_binds_only_to_the_first_alternative():
+    # "\bfoo|bar" means (\bfoo)|(bar): "rebar" matches, "refoo" does not
+    rules = [(r"\bfoo|bar", "X", "weekly", ""), (r"\bbaz", "Y", "weekly", "")]
+    flagger = IngredientFlagger(rules)
+    for text in ("rebar", "refoo", "foo", "a baz", "abaz"):
+        assert flagger.flag(text) == reference(rules, text), text
+
+
+@pytest.mark.parametrize("pattern, expected", [
+    (r"\bfoo|bar", True), (r"\b(foo|bar)", False), (r"[|]x", False), (r"[]|]", False), (r"a\|b", False),
+])
+def test_top_level_alternation(pattern, expected):
+    assert _top_level_alternation(pattern) is expected
+
+
+def test_label_matrix(rules):
+    flagger = IngredientFlagger(rules)
+    matrix = flagger.label_matrix(TEXTS)
+    for i, text in enumerate(TEXTS):
+        labels = {f["label"] for f in reference(rules, text)}
+        assert {flagger.labels[j] for j in np.flatnonzero(matrix[i])} == labels
+
+
+def test_bad_rule_pack_names_the_rule(tmp_path):
+    path = tmp_path / "pack.json"
+    path.write_text(json.dumps({"rules": [{"pattern": "ok", "label": "L"}, {"pattern": "(", "label": "M"}]}))
+    with pytest.raises(ValueError, match="rule 1"):
+        load_rule_pack(str(path))
+    path.write_text(json.dumps([{"pattern": "x", "label": "L", "consumption": "hourly"}]))
+    with pytest.raises(ValueError, match="consumption"):
+        load_rule_pack(str(path))
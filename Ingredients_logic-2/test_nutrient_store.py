@@ -0,0 +1,91 @@
+"""test_nutrient_store.py"""
+from __future__ import annotations
+
+import math
+
+import numpy as np
+import pytest
+
+import ingrescan_barcode
+from nutrient_store import NutrientCatalog, to_float
+
+PRODUCTS = [
+    {"code": "111", "nutriments": {"sugars_100g": 30, "salt_100g": "1.2", "fiber_100g": "3,5g", "energy-kj_100g": 1500}},
+    {"code": "222", "nutriments": {"sugars_100g": "5", "salt_100g": None, "sodium_100g": 0.2, "energy_100g": 800}},
+    {"code": "333", "nutriments": {"sugars_100g": "", "salt_100g": 0.1}, "fruits-vegetables-nuts_100g": 60},
+]
+
+
+@pytest.fixture
+def catalog():
+    return NutrientCatalog.from_products(PRODUCTS)
+
+
+@pytest.mark.parametrize("value, expected", [(3, 3.0), ("80g", 80.0), ("3,5", 3.5), (" -1.5 mg", -1.5)])
+def test_to_float_parses_label_strings(value, expected):
+    assert to_float(value) == expected
+
+
+@pytest.mark.parametrize("value", [None, "", "traces", True])
+def test_to_float_nulls(value):
+    assert math.isnan(to_float(value))
+
+
+def test_rows_round_trip_without_nulls(catalog):
+    assert len(catalog) == 3 and "222" in catalog
+    assert catalog.get("111") == {"sugars_100g": 30.0, "salt_100g": 1.2, "fiber_100g": 3.5, "energy-kj_100g": 1500.0}
+    assert catalog.get("333") == {"salt_100g": 0.1, "fruits-vegetables-nuts_100g": 60.0}
+    assert catalog.get("999") is None
+
+
+def test_add_replaces_an_existing_row_and_grows(catalog):
+    assert catalog.add("111", {"sugars_100g": 1}) == 0
+    assert catalog.get("111") == {"sugars_100g": 1.0}
+    for i in range(10):
+        catalog.add(f"new{i}", {"salt_100g": i})
+    assert len(catalog) == 13
+    assert catalog.column("salt_100g")[-1] == 9.0
+
+
+def test_filters_treat_nulls_as_false(catalog):
+    assert catalog.barcodes(catalog.filter({"sugars_100g": (">", 10)})) == ["111"]
+    assert catalog.barcodes(catalog.filter({"sugars_100g": ("<=", 100)})) == ["111", "222"]
+    assert catalog.barcodes(catalog.filter({"sugars_100g": ("null", None)})) == ["333"]
+    assert catalog.barcodes(catalog.filter({"salt_100g": ("between", (0.1, 1.2)), "sugars_100g": ("notnull", None)})) == ["111"]
+    with pytest.raises(ValueError):
+        catalog.mask({"salt_100g": ("~", 1)})
+
+
+def test_aggregations_skip_nulls(catalog):
+    assert catalog.aggregate("sugars_100g", "mean") == 17.5
+    assert catalog.aggregate("sugars_100g", "nulls") == 1
+    assert catalog.aggregate("sugars_100g", "count", rows=np.array([1, 2])) == 1
+    assert math.isnan(catalog.aggregate("fiber_100g", "max", rows=np.array([1])))
+
+
+def test_columns_are_read_only(catalog):
+    with pytest.raises(ValueError):
+        catalog.column("sugars_100g")[0] = 0
+
+
+def test_nutriscore_columns_match_extract_for_nutriscore(catalog):
+    cols = catalog.nutriscore_columns()
+    fields = ("energy_kj", "sugars_g", "sat_fat_g", "sodium_mg", "fruit_pct", "fiber_g", "protein_g")
+    for i, product in enumerate(PRODUCTS):
+        expected = ingrescan_barcode.extract_for_nutriscore(
+            dict(product, nutriments={k: to_float(v) for k, v in product["nutriments"].items() if not math.isnan(to_float(v))}))
+        assert tuple(float(cols[f][i]) for f in fields) == pytest.approx(expected)
+
+
+def test_save_and_load(catalog, tmp_path):
+    path = str(tmp_path / "catalog.npz")
+    catalog.save(path)
+    loaded = NutrientCatalog.load(path)
+    assert loaded.barcodes() == catalog.barcodes()
+    for barcode in catalog.barcodes():
+        assert loaded.get(barcode) == catalog.get(barcode)
+
+
+def test_from_columns_rejects_duplicate_barcodes():
+    with pytest.raises(ValueError):
+        NutrientCatalog.from_columns(["1", "1"], {"salt_100g": [0.1, 0.2]})
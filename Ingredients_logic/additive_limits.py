@@ -0,0 +1,431 @@
+"""
+IngreScan Additive Limits
+=========================
+
+Compiles the FSSAI additive tables (Appendix A/B, scraped into output.json) into
+preservatives_limit.json: a normalized table keyed by additive (name or INS/E code)
+and food category, with parsed numeric limits in ppm. Limits only exist per food
+category; there is deliberately no single "maximum" per additive.
+
+    python additive_limits.py compile          # output.json -> preservatives_limit.json
+    python additive_limits.py extract [pdf]    # re-scrape the PDF (changed pages only), then compile
+
+Food categories are the numbered table columns of the appendix ("<table>:<column>"),
+or "<table>:<row label>" for tables that list products by row. In those tables the
+cells name the additives ("Sulphur dioxide- 450 ppm max"), so the row label is a
+food and never an additive. The appendix has no INS column: INS_CODES supplies it,
+and split-up names that are not additives on their own ("citric", "both") are dropped.
+The compiled table is served through the knowledge base (section "additive_limits"),
+so lookup_limits() is a dict lookup and follows KB hot reloads.
+"""
+
+import hashlib
+import json
+import os
+import re
+import sys
+
+from knowledge_base import get_kb, reload
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+PDF_FILE = os.path.join(script_dir, "appendix_a_and_b_revised(30-12-2011).pdf")
+ROWS_FILE = os.path.join(script_dir, "output.json")
+LIMITS_FILE = os.path.join(script_dir, "preservatives_limit.json")
+MANIFEST_FILE = os.path.join(script_dir, "appendix_pages.json")
+
+_COLUMN_LABEL = re.compile(r"^\(?\d{1,2}\)?$")
+_SECTION_LABEL = re.compile(r"^\(?[A-Za-z]\)?\.?$")
+_NOT_PERMITTED = re.compile(r"^[-‐–\s.]*$")
+_AMOUNT = re.compile(r"(\d+(?:\.\d+)?)(ppm|mg/kg|mg/l|gms?/kg|g/kg|%)")
+_PARENTHETICAL = re.compile(r"\((?:singly|natural|synthetic)[^)]*\)")
+_LIMIT_TOKEN = re.compile(r"gmp|\d+(?:\.\d+)?\s*(?:ppm|mg/kg|mg/l|gms?/kg|g/kg|%)")
+_LIMIT_WORDS = re.compile(r"\b(?:not more than|max(?:imum)?|singly|or in combination|in combination|"
+                          r"including salts? thereof|only)\b")
+_FILLER_WORDS = {"not", "more", "than", "max", "maximum", "singly", "or", "in", "combination", "and", "the",
+                 "as", "per", "up", "to", "its", "their", "both", "of", "mono", "di", "tri", "other", "any",
+                 "salt", "salts", "acid", "acids", "natural", "synthetic", "methyl", "ethyl", "propyl"}
+
+# INS numbers (Codex) for the additives the appendix lists; it has no INS column of its own
+INS_CODES = {
+    "acetic acid": "260", "lactic acid": "270", "malic acid": "296", "citric acid": "330",
+    "tartaric acid": "334", "phosphoric acid": "338", "fumaric acid": "297", "sodium fumarate": "365",
+    "potassium malate": "351", "sodium hydroxide": "524", "potassium hydroxide": "525",
+    "sodium citrate": "331", "potassium citrate": "332", "calcium citrate": "333",
+    "sodium carbonate": "500", "sodium bicarbonate": "500", "potassium carbonate": "501",
+    "ammonium carbonate": "503", "ammonium bicarbonate": "503", "magnesium carbonate": "504",
+    "calcium carbonate": "170", "ammonium chloride": "510", "calcium chloride": "509",
+    "magnesium chloride": "511", "calcium phosphate": "341", "ammonium phosphate": "342",
+    "sodium aluminium silicate": "554", "calcium silicate": "552", "silicon dioxide": "551",
+    "talc": "553", "sodium diacetate": "262", "sodium acetate": "262",
+    # emulsifiers, stabilisers, thickeners
+    "lecithin": "322", "lecithins": "322", "sucroglycerides": "474", "sucrose esters of fatty acids": "473",
+    "hydroxypropyl methyl cellulose": "464", "hydroxy propyl methyl cellulose": "464",
+    "methyl cellulose": "461", "carboxymethyl cellulose": "466", "guar gum": "412", "xanthan gum": "415",
+    "gum arabic": "414", "arabic gum": "414", "locust bean gum": "410", "carob bean gum": "410",
+    "carrageenan": "407", "agar": "406", "pectin": "440", "pectins": "440", "alginic acid": "400",
+    "sodium alginate": "401", "potassium alginate": "402", "ammonium alginate": "403",
+    "calcium alginate": "404", "propylene glycol alginate": "405", "glycerol": "422", "glycerine": "422",
+    "glycerol monostearate": "471", "mono and di glycerides of fatty acids": "471",
+    "di-acetyl tartaric acid esters of mono and di-glycerides": "472e",
+    "polyglycerol esters of fatty acids": "475", "polyglycerol esters of interesterified recinoleic acid": "476",
+    "sodium stearoyl lactylate": "481", "calcium stearoyl lactylate": "482",
+    "sorbitan monostearate": "491", "sorbitan tristearate": "492", "sorbitan monopalmitate": "495",
+    "dimethyl polysiloxane": "900a", "modified starches": "1400",
+    # flour treatment and improvers
+    "ammonium persulphate": "923", "benzoyl peroxide": "928", "l-cysteine monohydrochloride": "920",
+    "fungal alpha amylase": "1100", "bacterial amylase": "1100", "alpha-amylase": "1100",
+    # antioxidants
+    "ascorbic acid": "300", "sodium ascorbate": "301", "ascorbyl palmitate": "304",
+    "ascorbyl stearate": "305", "tocopherol": "307", "tocopherols": "307", "propyl gallate": "310",
+    "octyl gallate": "311", "dodecyl gallate": "312", "tbhq": "319", "bha": "320", "bht": "321",
+    # preservatives
+    "sorbic acid": "200", "sodium sorbate": "201", "potassium sorbate": "202", "calcium sorbate": "203",
+    "benzoic acid": "210", "sodium benzoate": "211", "potassium benzoate": "212", "calcium benzoate": "213",
+    "sulphur dioxide": "220", "sodium sulphite": "221", "sodium bisulphite": "222",
+    "sodium metabisulphite": "223", "potassium metabisulphite": "224", "potassium sulphite": "225",
+    "calcium sulphite": "226", "nisin": "234", "potassium nitrite": "249", "sodium nitrite": "250",
+    "sodium nitrate": "251", "potassium nitrate": "252", "propionic acid": "280",
+    "sodium propionate": "281", "calcium propionate": "282",
+    # colours
+    "curcumin": "100", "turmeric": "100", "riboflavin": "101", "tartrazine": "102", "sunset yellow fcf": "110",
+    "sunset yellow": "110", "carmoisine": "122", "ponceau 4r": "124", "erythrosine": "127",
+    "allura red": "129", "indigo carmine": "132", "brilliant blue fcf": "133", "chlorophyll": "140",
+    "fast green fcf": "143", "caramel": "150a", "caramel colours": "150a", "beta carotene": "160a",
+    "annatto": "160b", "annatto extracts": "160b", "beta apo-8 carotenal": "160e", "canthaxanthin": "161g",
+    "saffron": "164", "titanium dioxide": "171",
+    # sweeteners, polyols, bulking agents
+    "sorbitol": "420", "mannitol": "421", "isomalt": "953", "maltitol": "965", "lactitol": "966",
+    "xylitol": "967", "aspartame": "951", "acesulphame k": "950", "saccharin": "954",
+    "saccharin sodium": "954", "sucralose": "955", "polydextrose": "1200",
+    # miscellaneous
+    "monosodium glutamate": "621", "msg": "621", "candelilla wax": "902", "carnauba wax": "903",
+    "paraffin wax": "905", "nitrogen": "941", "carbon dioxide": "290",
+    "sodium ferrocyanide": "535", "potassium ferrocyanide": "536", "calcium ferrocyanide": "538",
+    "calcium hydroxide": "526", "calcium lactate": "327", "calcium gluconate": "578",
+    "calcium disodium edta": "385", "gellan gum": "418", "karaya gum": "416", "tragacanth gum": "413",
+    "glucono delta lactone": "575", "hydrochloric acid": "507", "microcrystalline cellulose": "460",
+    "potassium ascorbate": "303", "orthophosphoric acid": "338", "sodium pyrophosphate": "450",
+    "sodium hexameta phosphate": "452", "sodium hexametaphosphate": "452", "sodium polyphosphate": "452",
+    "polyglycerol polyricinoleate": "476", "ester gum": "445", "estergum": "445",
+    "carboxy methyl cellulose": "466", "sodium carboxymethyl cellulose": "466",
+    "butylated hydroxy anisole": "320", "tertiary butyl hydro quinone": "319",
+    "natural and synthetic tocopherols": "307", "synthetic tocopherols": "307",
+    "sodium hydrogen carbonate": "500", "calcium bisulphite": "227", "potassium bisulphite": "228",
+    "sodium phosphate": "339",
+}
+
+# Misspellings in the appendix, folded into one additive entry
+SPELLINGS = {
+    "sulphur dixoide": "sulphur dioxide", "carageenan": "carrageenan", "caragreenan": "carrageenan",
+    "annato": "annatto", "aspertame": "aspartame", "manitol": "mannitol", "poncea 4r": "ponceau 4r",
+    "nitrozen": "nitrogen", "ammonia carbonate": "ammonium carbonate", "chlorop hyll": "chlorophyll",
+    "sodium steroyl 2 lactylate": "sodium stearoyl lactylate", "calcium steroyl 2 lactylate": "calcium stearoyl lactylate",
+    "ponceau 4 r": "ponceau 4r", "xantham gum": "xanthan gum", "calcium lectate": "calcium lactate",
+}
+_DANGLING_WORDS = {"of", "and", "or", "with", "its", "their", "both", "mono", "di", "tri", "singly", "in",
+                   "combination", "the", "to", "as", "per", "any", "other"}
+# Acid names used without "acid" in shared lists ("esterified with acetic, citric, lactic ... acids")
+_ACID_STEMS = {name.split()[0] for name in INS_CODES if name.endswith(" acid")} | {"tartric", "stearic", "gallic"}
+
+# Multipliers to ppm (mg/kg)
+_UNIT_TO_PPM = {"ppm": 1.0, "mg/kg": 1.0, "mg/l": 1.0, "g/kg": 1000.0, "gm/kg": 1000.0, "gms/kg": 1000.0, "%": 10000.0}
+
+
+# ------------------ Cell parsing ------------------
+def _collapse(text):
+    return re.sub(r"\s+", " ", text or "").strip()
+
+
+def parse_limit(cell):
+    """
+    Parse one limit cell. Returns None for empty / not permitted cells, otherwise
+    {"status": "GMP"|"max", "limit_ppm": float|None, "raw": str}.
+    """
+    raw = _collapse(cell)
+    if _NOT_PERMITTED.match(raw):
+        return None
+    squashed = re.sub(r"\s+", "", raw.lower()).lstrip("-‐–")
+    amount = _AMOUNT.search(squashed)
+    if amount:
+        return {"status": "max", "limit_ppm": float(amount.group(1)) * _UNIT_TO_PPM[amount.group(2)], "raw": raw}
+    if "gmp" in squashed:
+        return {"status": "GMP", "limit_ppm": None, "raw": raw}
+    return None
+
+
+def clean_additive_name(name):
+    """'Potassium Sulphite\\nexpressed as sulphur\\ndioxide' -> ('potassium sulphite', 'sulphur dioxide')"""
+    text = re.sub(r"-\s+", "-", _collapse(name).lower())
+    text = _PARENTHETICAL.sub("", text).strip(" .,")
+    expressed_as = None
+    if " expressed as " in f" {text} ":
+        text, expressed_as = [part.strip() for part in text.split("expressed as", 1)]
+    return text, expressed_as
+
+
+_CATIONS = {"sodium", "potassium", "calcium", "ammonium", "magnesium", "na", "k", "ca"}
+_CATION_NAMES = {"na": "sodium", "k": "potassium", "ca": "calcium"}
+
+
+def expand_additive_names(label):
+    """
+    Split compound table labels into individual additives, e.g.
+    'benzoic acid/ sodium/ potassium benzoate' -> benzoic acid, sodium benzoate, potassium benzoate
+    'sorbic acid and its sodium, potassium salts' -> sorbic acid, sodium sorbate, potassium sorbate
+    """
+    text = re.sub(r"\(.*?\)", "", label)
+    text = re.sub(r"\s+(?:calculated\s+)?as\s+.*$", "", text).strip()
+    text = re.sub(r"\s+(?:singly|or in combination)\b.*$", "", text)
+    acid = re.match(r"^(\w+)ic acid\b", text)
+    salt_suffix = f"{acid.group(1)}ate" if acid else None
+    if re.search(r"\b(?:of|with)\b", text):
+        # "esters of ..." names are one additive each, unless the list is of such names:
+        # "polyglycerol esters of fatty acids and polyglycerol esters of ... acid"
+        parts = [_collapse(text)]
+        for separator in (r"\s*,\s*", r"\s+and\s+(?=\S+(?:\s+\S+)?\s+(?:esters|salts?)\s+of\b)", r"\s*/\s*"):
+            split = [_collapse(p) for p in re.split(separator, text) if _collapse(p)]
+            if len(split) > 1 and all(re.search(r"\bof\b", p) for p in split):
+                parts = split
+                break
+        return [n for n in dict.fromkeys([label] + parts) if n]
+    text = re.sub(r"\b(?:its|including)\b", ",", text)
+    text = re.sub(r"\bsalts?\b", " ", text)
+    parts = [_collapse(p) for p in re.split(r"\s*(?:/|,|;|&|\band\b|\bor\b)\s*|\s+(?=(?:sodium|potassium|calcium)\b)", text)]
+    parts = [p for p in parts if p]
+
+    # A bare cation borrows the anion of the next "<cation> <anion>" part, or the acid's salt name
+    names = []
+    for i, part in enumerate(parts):
+        if part in _CATIONS:
+            cation = _CATION_NAMES.get(part, part)
+            anion = next((p.split(" ", 1)[1] for p in parts[i + 1:]
+                          if " " in p and p.split(" ", 1)[0] in _CATIONS), salt_suffix)
+            if anion:
+                names.append(f"{cation} {anion}")
+            continue
+        names.append(part)
+    return [n for n in dict.fromkeys([label] + names) if n]
+
+
+def is_additive_name(name):
+    """Reject pieces of split labels: 'citric', 'sodium of citric', 'both', 'mono-', '1'."""
+    words = re.findall(r"[a-z][a-z0-9']*", name)
+    if not any(len(w) >= 3 and w not in _FILLER_WORDS for w in words):
+        return False
+    if re.search(r"[-‐–(]$", name) or words[-1] in _DANGLING_WORDS:
+        return False
+    return words[-1] not in _ACID_STEMS
+
+
+def named_limits(cell):
+    """
+    Additives named inside a product-by-row cell with their limits:
+    'Sulphur dioxide- 70 ppm max or Benzoic acid- 120 ppm max' -> [('sulphur dioxide', {...}), ('benzoic acid', {...})]
+    """
+    text = _collapse(cell).lower()
+    found, start = [], 0
+    for token in _LIMIT_TOKEN.finditer(text):
+        segment = text[start:token.start()]
+        start = token.end()
+        limit = parse_limit(token.group(0))
+        segment = re.sub(r"[()]", " ", re.sub(r"\([^()]*\)", " ", re.sub(r"\([^()]*\)", " ", segment)))
+        segment = _collapse(_LIMIT_WORDS.sub(" ", segment)).strip(" -‐–:,;.")
+        segment = re.sub(r"^(?:or|and)\s+", "", segment)
+        if segment and limit:
+            found.append((segment, dict(limit, raw=_collapse(cell))))
+    return found
+
+
+def _names_additives(cell):
+    """True when text before the first limit in a cell names something ('Nisin-5.0 ppm maximum')."""
+    text = _collapse(cell).lower()
+    token = _LIMIT_TOKEN.search(text)
+    return bool(token) and any(w not in _FILLER_WORDS for w in re.findall(r"[a-z]{3,}", text[:token.start()]))
+
+
+# ------------------ Compilation ------------------
+def _is_header(row):
+    cells = [c for c in row if c]
+    return len(cells) >= 2 and all(_COLUMN_LABEL.match(c.strip()) for c in cells)
+
+
+def _split_tables(rows):
+    """[(columns, rows)] per appendix table; a table starts where the numbered header changes."""
+    tables, columns = [], None
+    for row in rows:
+        if _is_header(row):
+            labels = [(c or "").strip("() ") for c in row]
+            if labels != columns:
+                columns = labels
+                tables.append((columns, []))
+            continue
+        if tables:
+            tables[-1][1].append(row)
+    return tables
+
+
+def _lists_products(rows):
+    """Product-by-row tables: most rows with limits name their additives inside the cells."""
+    with_limits = [r for r in rows if len(r) >= 3 and any(parse_limit(c) for c in r[2:])]
+    naming = [r for r in with_limits if any(_names_additives(c) for c in r[2:] if c)]
+    return bool(with_limits) and len(naming) * 2 >= len(with_limits)
+
+
+def _ins_code(name, synonym_map):
+    base = _collapse(re.sub(r"\(.*?\)", " ", name))
+    for candidate in (base, base.replace("-", ""), re.sub(r"^d?l-", "", base), re.sub(r"e?s$", "", base),
+                      re.sub(r"s$", "", base)):
+        code = INS_CODES.get(SPELLINGS.get(candidate, candidate))
+        if code:
+            return f"e{code}"
+    code = synonym_map.get(name)
+    if code and re.match(r"^e\d{3,4}[a-z]?$", code):
+        return code
+    return None
+
+
+def compile_limits(rows, synonym_map=None):
+    """Turn raw appendix rows into {"additives": {...}, "aliases": {...}}."""
+    synonym_map = synonym_map if synonym_map is not None else get_kb().section("synonym_map")
+    additives = {}
+    section = None
+
+    def record(name, category, limit, expressed_as):
+        name = SPELLINGS.get(name, name)
+        if not is_additive_name(name):
+            return
+        entry = additives.setdefault(name, {
+            "name": name,
+            "ins": _ins_code(name, synonym_map),
+            "section": section,
+            "expressed_as": expressed_as,
+            "limits": {},
+        })
+        entry["limits"].setdefault(category, limit)
+
+    for table, (columns, table_rows) in enumerate(_split_tables(rows), start=1):
+        by_product = _lists_products(table_rows)
+        section = None
+        for row in table_rows:
+            if len(row) < 3 or not row[1]:
+                continue
+            first = (row[0] or "").strip()
+            limits = [(i, parse_limit(cell)) for i, cell in enumerate(row[2:], start=2)]
+            limits = [(i, lim) for i, lim in limits if lim]
+
+            if _SECTION_LABEL.match(first) and not limits:
+                section = _collapse(row[1])
+                continue
+
+            label, expressed_as = clean_additive_name(row[1])
+            if by_product:
+                # The row is a food; only additives named in its cells are recorded
+                for cell in row[2:]:
+                    for named, limit in named_limits(cell or ""):
+                        named, named_as = clean_additive_name(named)
+                        for name in expand_additive_names(named):
+                            record(name, f"{table}:{label}", limit, named_as)
+                continue
+            for index, limit in limits:
+                column = columns[index] if index < len(columns) and columns[index] else str(index + 1)
+                for name in expand_additive_names(label):
+                    record(name, f"{table}:{column}", limit, expressed_as)
+
+    aliases = {}
+    for name, entry in additives.items():
+        # Several names share a code (sodium carbonate / bicarbonate): the first listed keeps it
+        if entry["ins"]:
+            aliases.setdefault(entry["ins"], name)
+    return {"additives": additives, "aliases": aliases}
+
+
+def build(rows_path=ROWS_FILE, out_path=LIMITS_FILE):
+    with open(rows_path, "r", encoding="utf-8") as f:
+        rows = json.load(f)
+    table = compile_limits(rows)
+    with open(out_path, "w", encoding="utf-8") as f:
+        json.dump(table, f, indent=1, ensure_ascii=False)
+    return table
+
+
+# ------------------ Incremental PDF extraction ------------------
+def _page_digest(page):
+    """Hash the raw page content streams (cheap) rather than re-running table extraction."""
+    try:
+        from pdfminer.pdftypes import resolve1
+        streams = page.page_obj.contents
+        return hashlib.sha256(b"".join(resolve1(s).get_data() for s in streams)).hexdigest()
+    except Exception:
+        return hashlib.sha256((page.extract_text() or "").encode("utf-8")).hexdigest()
+
+
+def extract_rows(pdf_path=PDF_FILE, rows_path=ROWS_FILE, manifest_path=MANIFEST_FILE):
+    """
+    Re-scrape the appendix tables, only running table extraction on pages whose
+    content changed since the last run. Requires pdfplumber.
+    Returns (rows, changed_pages).
+    """
+    import pdfplumber
+
+    manifest = {"pages": {}}
+    if os.path.exists(manifest_path):
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+
+    rows = []
+    changed = []
+    pages = {}
+    with pdfplumber.open(pdf_path) as pdf:
+        for number, page in enumerate(pdf.pages, start=1):
+            digest = _page_digest(page)
+            cached = manifest["pages"].get(str(number))
+            if cached and cached["sha256"] == digest:
+                page_rows = cached["rows"]
+            else:
+                page_rows = [r for t in page.extract_tables() for r in t]
+                changed.append(number)
+            pages[str(number)] = {"sha256": digest, "rows": page_rows}
+            rows.extend(page_rows)
+
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        json.dump({"pdf": os.path.basename(pdf_path), "pages": pages}, f)
+    with open(rows_path, "w", encoding="utf-8") as f:
+        json.dump(rows, f, indent=2, ensure_ascii=False)
+    return rows, changed
+
+
+# ------------------ Lookup ------------------
+def lookup_limits(ingredient, category=None):
+    """
+    O(1) lookup by additive name or E/INS code ("sodium benzoate", "e211", "INS 211").
+    With a category, returns that category's limit (or None); otherwise the full entry.
+    """
+    table = get_kb().section("additive_limits")
+    if not table:
+        return None
+    key = _collapse(ingredient).lower()
+    code = re.match(r"^(?:e|ins)?\s*-?\s*(\d{3,4}[a-z]?)(?:\s*\([ivx]+\))?$", key)
+    if code:
+        key = table["aliases"].get(f"e{code.group(1)}", key)
+    entry = table["additives"].get(key)
+    if entry is None:
+        alias = get_kb().section("synonym_map").get(key)
+        entry = table["additives"].get(table["aliases"].get(alias, ""))
+    if entry is None or category is None:
+        return entry
+    return entry["limits"].get(category)
+
+
+# 🔍 Example
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "compile"
+    if command == "extract":
+        _, changed = extract_rows(sys.argv[2] if len(sys.argv) > 2 else PDF_FILE)
+        print(f"Re-extracted {len(changed)} changed page(s): {changed}")
+    table = build()
+    reload()
+    with_ins = sum(1 for entry in table["additives"].values() if entry["ins"])
+    print(f"Compiled {len(table['additives'])} additives ({with_ins} with INS codes) → {LIMITS_FILE}")
+    for query in ("sodium benzoate", "INS 211", "ins 330", "e160a"):
+        entry = lookup_limits(query)
+        print(f"  {query:<16} → {entry['name'] if entry else None}")
@@ -0,0 +1,216 @@
+"""
+IngreScan Ingredient Cache Store
+================================
+
+Persistent backend for the ingredient_parser result cache.
+
+- SQLite in WAL mode (an append-only log that SQLite checkpoints for us)
+- Write-behind buffering: new results are batched and flushed in one transaction
+- Cross-process safety: every flush is a single BEGIN IMMEDIATE transaction,
+  so concurrent parsers never interleave partial writes
+- Periodic compaction (every COMPACT_INTERVAL seconds by default, None turns
+  it off): checkpoint + VACUUM, and an atomic rewrite of the human-readable
+  ingredient_cache.json snapshot
+"""
+
+import atexit
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+COMPACT_INTERVAL = 3600.0
+
+
+class IngredientCacheStore:
+    """Key/value store for processed ingredients with batched write-behind flushing."""
+
+    def __init__(self, db_path, seed_file=None, flush_size=32, flush_interval=2.0,
+                 compact_interval=COMPACT_INTERVAL, busy_timeout=10.0):
+        self.db_path = db_path
+        self.seed_file = seed_file
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.compact_interval = compact_interval
+        self._busy_timeout = busy_timeout
+
+        self._lock = threading.RLock()
+        self._memory = {}    # warm read view of everything we have seen
+        self._pending = {}   # results not yet committed to disk
+        self._closed = False
+        self._last_compact = time.monotonic()
+
+        self._conn = self._connect()
+        self._load()
+
+        self._wakeup = threading.Event()
+        self._flusher = threading.Thread(target=self._flush_loop, name="ingredient-cache-flusher", daemon=True)
+        self._flusher.start()
+        atexit.register(self.close)
+
+    # ------------------ Setup ------------------
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=self._busy_timeout,
+                               isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS ingredient_cache ("
+            " key TEXT PRIMARY KEY,"
+            " value TEXT NOT NULL,"
+            " updated_at REAL NOT NULL)"
+        )
+        return conn
+
+    def _load(self):
+        """Warm the in-memory view; import the JSON snapshot into an empty store."""
+        rows = self._conn.execute("SELECT key, value FROM ingredient_cache").fetchall()
+        if not rows and self.seed_file and os.path.exists(self.seed_file):
+            with open(self.seed_file, "r") as f:
+                seed = json.load(f)
+            now = time.time()
+            self._write_rows([(k.lower(), json.dumps(v), now) for k, v in seed.items()])
+            rows = [(k.lower(), json.dumps(v)) for k, v in seed.items()]
+        for key, value in rows:
+            self._memory[key] = json.loads(value)
+
+    # ------------------ Cache contract ------------------
+    def get(self, key, default=None):
+        """Return the cached result for key, checking disk for entries flushed by other processes."""
+        key = key.lower()
+        with self._lock:
+            if key in self._memory:
+                return self._memory[key]
+            row = self._conn.execute(
+                "SELECT value FROM ingredient_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return default
+            value = json.loads(row[0])
+            self._memory[key] = value
+            return value
+
+    def put(self, key, value):
+        """Buffer a result; it is committed with the next batch."""
+        key = key.lower()
+        with self._lock:
+            self._memory[key] = value
+            self._pending[key] = value
+            full = len(self._pending) >= self.flush_size
+        if full:
+            self._wakeup.set()
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def __len__(self):
+        with self._lock:
+            return len(self._memory)
+
+    def clear(self):
+        """Drop every cached result, in memory and on disk."""
+        with self._lock:
+            self._memory.clear()
+            self._pending.clear()
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute("DELETE FROM ingredient_cache")
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def invalidate(self, predicate):
+        """Drop every entry for which predicate(key, value) is true; returns the count."""
+        with self._lock:
+            self.flush()
+            rows = self._conn.execute("SELECT key, value FROM ingredient_cache").fetchall()
+            stale = [key for key, value in rows if predicate(key, json.loads(value))]
+            for key in stale:
+                self._memory.pop(key, None)
+            if not stale:
+                return 0
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.executemany("DELETE FROM ingredient_cache WHERE key = ?", [(k,) for k in stale])
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            return len(stale)
+
+    # ------------------ Write-behind ------------------
+    def _write_rows(self, rows):
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO ingredient_cache (key, value, updated_at) VALUES (?, ?, ?)",
+                rows,
+            )
+            self._conn.execute("COMMIT")
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+
+    def flush(self):
+        """Commit all buffered results in one atomic transaction."""
+        with self._lock:
+            if not self._pending:
+                return 0
+            batch = self._pending
+            self._pending = {}
+            now = time.time()
+            try:
+                self._write_rows([(k, json.dumps(v), now) for k, v in batch.items()])
+            except sqlite3.Error:
+                # Keep the batch for the next attempt (e.g. database locked for too long)
+                batch.update(self._pending)
+                self._pending = batch
+                return 0
+            return len(batch)
+
+    def _flush_loop(self):
+        while not self._closed:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            if self._closed:
+                break
+            self.flush()
+            if self.compact_interval and time.monotonic() - self._last_compact >= self.compact_interval:
+                self.compact()
+
+    # ------------------ Compaction ------------------
+    def compact(self, snapshot_path=None):
+        """Flush, fold the WAL back into the main file, VACUUM and rewrite the JSON snapshot."""
+        snapshot_path = snapshot_path or self.seed_file
+        with self._lock:
+            self.flush()
+            self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            self._conn.execute("VACUUM")
+            self._last_compact = time.monotonic()
+            if not snapshot_path:
+                return
+            rows = self._conn.execute("SELECT key, value FROM ingredient_cache ORDER BY key").fetchall()
+        snapshot = {k: json.loads(v) for k, v in rows}
+        directory = os.path.dirname(os.path.abspath(snapshot_path))
+        fd, tmp_path = tempfile.mkstemp(prefix=".ingredient_cache.", suffix=".json", dir=directory)
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(snapshot, f, indent=2)
+            os.replace(tmp_path, snapshot_path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def close(self):
+        """Flush outstanding writes and stop the background flusher."""
+        if self._closed:
+            return
+        self._closed = True
+        self._wakeup.set()
+        self.flush()
+        with self._lock:
+            self._conn.close()
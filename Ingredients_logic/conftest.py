@@ -0,0 +1,45 @@
+"""
+Shared pytest fixtures
+======================
+
+Tests run offline and never touch the on-disk ingredient cache.
+"""
+
+import os
+import shutil
+
+import pytest
+
+import knowledge_base
+from cache_store import IngredientCacheStore
+from offline_mode import OFFLINE_ENV
+
+
+@pytest.fixture
+def offline_env(monkeypatch):
+    """Offline mode for the test and any worker process it spawns."""
+    monkeypatch.setenv(OFFLINE_ENV, "1")
+
+
+@pytest.fixture
+def parser_cache(tmp_path, monkeypatch, offline_env):
+    """Point ingredient_parser at an empty, throwaway cache store."""
+    import ingredient_parser
+
+    store = IngredientCacheStore(str(tmp_path / "ingredient_cache.db"), flush_interval=60, compact_interval=None)
+    monkeypatch.setattr(ingredient_parser, "ingredient_cache", store)
+    yield store
+    store.close()
+
+
+@pytest.fixture
+def kb_sources(tmp_path, monkeypatch):
+    """Copy the knowledge-base sources into a scratch repo root; returns that root."""
+    root = tmp_path / "repo"
+    for rel_path, _, _ in knowledge_base.SOURCES:
+        src = os.path.join(knowledge_base.REPO_ROOT, *rel_path.split("/"))
+        dst = root.joinpath(*rel_path.split("/"))
+        dst.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copy2(src, dst)
+    monkeypatch.setattr(knowledge_base, "REPO_ROOT", str(root))
+    return root
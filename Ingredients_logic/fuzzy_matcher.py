@@ -1,33 +1,32 @@
 from fuzzywuzzy import fuzz
 from fuzzywuzzy import process
-import json
-import os
+from knowledge_base import get_kb
 
-# Get the directory of the current script
-script_dir = os.path.dirname(os.path.abspath(__file__))
-db_path = os.path.join(script_dir, 'ingredient_db.json')
-synonym_path = os.path.join(script_dir, 'synonym_map.json')
+# ING_DB / SYNONYM_MAP come from the compiled knowledge base on first use
+_LAZY_SECTIONS = {"ING_DB": "ingredient_db", "SYNONYM_MAP": "synonym_map"}
 
-with open(db_path, "r") as f:
-    ING_DB = json.load(f)
-
-with open(synonym_path, "r") as f:
-    SYNONYM_MAP = json.load(f)
+def __getattr__(name):
+    if name in _LAZY_SECTIONS:
+        return get_kb().section(_LAZY_SECTIONS[name])
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 def get_best_match(ingredient):
+    kb = get_kb()
+    ing_db = kb.section("ingredient_db")
     ing = ingredient.lower().strip()
 
-    # Synonym map first
-    if ing in SYNONYM_MAP:
-        ing = SYNONYM_MAP[ing]
+    # Synonyms that land in the DB are resolved at KB build time
+    resolved = kb.section("resolved_synonyms").get(ing)
+    if resolved is not None:
+        return resolved
+    ing = kb.section("synonym_map").get(ing, ing)
 
     # Exact match in DB
-    if ing in ING_DB:
+    if ing in ing_db:
         return ing
 
     # Fuzzy match
-    all_keys = list(ING_DB.keys())
-    match, score = process.extractOne(ing, all_keys)
+    match, score = process.extractOne(ing, kb.section("fuzzy_keys"))
     if score >= 85:
         return match
 
@@ -13,33 +13,59 @@ This module provides comprehensive ingredient parsing with support for:
 Author: IngreScan Project-Dhrub,Yesu,Deb,A.Idli
 """
 
+import multiprocessing
 import os
-import json
 import re
+from concurrent.futures import ProcessPoolExecutor
 from fuzzy_matcher import get_best_match
 from openfood_api import fetch_ingredient_info
+from cache_store import IngredientCacheStore
+from ingredient_tokenizer import tokenize_ingredients, iter_leaves
+from knowledge_base import get_kb, on_change
+from additive_limits import lookup_limits
+from offline_mode import is_offline, is_placeholder_result, OFFLINE_SOURCE
+from pipeline_events import stage, count
 
-# --- Load Local DB ---
-with open("ingredient_db.json") as f:
-    INGREDIENT_DB = json.load(f)
+# --- Local DB ---
+# INGREDIENT_DB is served from the compiled knowledge base on first use
+def __getattr__(name):
+    if name == "INGREDIENT_DB":
+        return get_kb().section("ingredient_db")
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # --- Cache Setup ---
-CACHE_FILE = "ingredient_cache.json"
-if os.path.exists(CACHE_FILE):
-    with open(CACHE_FILE, "r") as f:
-        ingredient_cache = json.load(f)
-else:
-    ingredient_cache = {}
+# Results live in a SQLite store with write-behind flushing; ingredient_cache.json
+# seeds an empty store and is rewritten as a snapshot whenever the store is compacted
+# (every INGRESCAN_CACHE_COMPACT_INTERVAL seconds, default one hour; 0 turns it off).
+script_dir = os.path.dirname(os.path.abspath(__file__))
+CACHE_FILE = os.path.join(script_dir, "ingredient_cache.json")
+CACHE_DB = os.path.join(script_dir, "ingredient_cache.db")
+CACHE_COMPACT_INTERVAL = float(os.environ.get("INGRESCAN_CACHE_COMPACT_INTERVAL", "3600"))
+ingredient_cache = IngredientCacheStore(CACHE_DB, seed_file=CACHE_FILE, compact_interval=CACHE_COMPACT_INTERVAL or None)
 
 def cache_result(ingredient, result):
-    """Store result in cache and update JSON file."""
-    ingredient_cache[ingredient.lower()] = result
-    with open(CACHE_FILE, "w") as f:
-        json.dump(ingredient_cache, f, indent=2)
+    """Store result in cache (committed to disk with the next batched flush)."""
+    # Placeholders (offline, or every source missed the deadline) must not shadow the real answer later
+    if is_placeholder_result(result):
+        return
+    ingredient_cache.put(ingredient, result)
 
 def get_cached_result(ingredient):
     """Check if result is already cached."""
-    return ingredient_cache.get(ingredient.lower(), None)
+    return ingredient_cache.get(ingredient)
+
+def compact_cache():
+    """Flush pending results, compact the store and refresh the JSON snapshot."""
+    ingredient_cache.compact()
+
+# Results fetched from Wikipedia/OFF do not depend on the local knowledge base
+_REMOTE_SOURCES = {"Wikipedia", "OpenFoodFacts"}
+
+def _invalidate_local_results(kb, changed_sections):
+    """After a KB reload, drop cached results that were derived from the local DB."""
+    ingredient_cache.invalidate(lambda key, value: value.get("source") not in _REMOTE_SOURCES)
+
+on_change(["ingredient_db", "synonym_map", "additive_limits"], _invalidate_local_results)
 
 def is_preservative(ingredient_info):
     """Check if ingredient is a preservative by looking for max_limit field."""
@@ -73,8 +99,34 @@ def normalize_e_number(ingredient):
         
     return ingredient
 
+def attach_regulatory_limits(result, ingredient_key=None):
+    """Attach the compiled FSSAI limits (per food category, in ppm) when the additive is listed."""
+    entry = None
+    for key in (ingredient_key, result.get("common_name")):
+        if key:
+            entry = lookup_limits(key)
+            if entry:
+                break
+    if entry is None:
+        return result
+    result["regulatory_limits"] = {
+        "additive": entry["name"],
+        "ins": entry["ins"],
+        "section": entry["section"],
+        "expressed_as": entry["expressed_as"],
+        "limits": entry["limits"],
+    }
+    # Preservatives from the appendix get their real limits instead of none / a generic string.
+    # Limits are per food category, so a spread is shown as a range, never as one maximum.
+    numeric = sorted(lim["limit_ppm"] for lim in entry["limits"].values() if lim["limit_ppm"] is not None)
+    if result.get("max_limit") is None and numeric and "preservative" in (entry["section"] or "").lower():
+        low, high = numeric[0], numeric[-1]
+        result["max_limit"] = f"{high:g} ppm" if low == high else f"{low:g}-{high:g} ppm depending on food category"
+    return result
+
 def enhance_with_preservative_info(result, ingredient_key=None):
     """Add preservative-specific information to the result."""
+    attach_regulatory_limits(result, ingredient_key)
     if is_preservative(result):
         preservative_info = get_preservative_info(result)
         result["preservative_info"] = {
@@ -182,22 +234,35 @@ def get_additive_type_info(ingredient):
             "description": "Approved food additive required for product manufacturing and quality maintenance."
         }
 
+def _enhance(result, ingredient):
+    with stage("enhancement", ingredient=ingredient):
+        return enhance_with_preservative_info(result, ingredient)
+
 def process_ingredient(ingredient):
     """Handle E-number normalization → fuzzy match → fallback API → enhanced default result."""
     # 1. Normalize E-numbers and INS numbers
-    normalized = normalize_e_number(ingredient)
+    with stage("normalize", ingredient=ingredient):
+        normalized = normalize_e_number(ingredient)
     
     # 2. Try fuzzy match in local DB
-    matched = get_best_match(normalized)
-    if matched and matched in INGREDIENT_DB:
-        result = INGREDIENT_DB[matched].copy()
-        return enhance_with_preservative_info(result, ingredient)
+    with stage("fuzzy_match", ingredient=ingredient):
+        matched = get_best_match(normalized)
+    ingredient_db = get_kb().section("ingredient_db")
+    if matched and matched in ingredient_db:
+        count("local_hit")
+        result = ingredient_db[matched].copy()
+        return _enhance(result, ingredient)
 
-    # 3. Fallback to external API
-    print(f"🔍 {ingredient} not found locally. Fetching from API...")
-    api_result = fetch_ingredient_info(ingredient)
-    if api_result:
-        return enhance_with_preservative_info(api_result, ingredient)
+    # 3. Fallback to external API (skipped entirely in offline mode)
+    offline = is_offline()
+    if not offline:
+        count("api_fallback")
+        with stage("api_fallback", ingredient=ingredient):
+            api_result = fetch_ingredient_info(ingredient)
+        if api_result:
+            return _enhance(api_result, ingredient)
+    else:
+        count("offline_skip")
 
     # 4. Enhanced default fallback for E-numbers/INS numbers
     is_e_or_ins = re.search(r'(?:e-?\d{3,4}|ins\s*\d{3,4}|\b\d{3,4}\b)', ingredient.lower())
@@ -241,8 +306,10 @@ def process_ingredient(ingredient):
             "found_in": [],
             "also_used_in": []
         }
+    if offline:
+        default_result["source"] = OFFLINE_SOURCE
     
-    return enhance_with_preservative_info(default_result, ingredient)
+    return _enhance(default_result, ingredient)
 
 def merge_duplicate_ingredients(results):
     """Merge ingredients that refer to the same substance (e.g., E211 and Sodium Benzoate)."""
@@ -278,28 +345,107 @@ def merge_duplicate_ingredients(results):
     
     return merged
 
+def annotate_leaf(info, node, class_name):
+    """Attach label-specific context (additive class, declared %) to a looked-up result."""
+    if class_name is None and node["percent"] is None:
+        return info
+    info = info.copy()
+    if class_name is not None:
+        info["ingredient_class"] = class_name
+    if node["percent"] is not None:
+        info["declared_percent"] = node["percent"]
+    return info
+
 def parse_ingredients(text):
     """Main parsing pipeline with deduplication."""
-    raw_ingredients = [item.strip().lower() for item in text.split(',')]
+    # Only real ingredient leaves are looked up; class headers such as
+    # "Stabilizers(...)" and percentage fragments never reach the cache or API.
+    leaves = iter_leaves(tokenize_ingredients(text))
     result = {}
 
-    for ing in raw_ingredients:
+    for ing, node, class_name in leaves:
+        if ing in result:
+            continue
         # Check cache first
-        cached = get_cached_result(ing)
+        with stage("cache_lookup", ingredient=ing):
+            cached = get_cached_result(ing)
         if cached:
-            print(f"✅ [CACHE HIT] {ing}")
-            result[ing] = cached
+            count("cache_hit")
+            result[ing] = annotate_leaf(cached, node, class_name)
             continue
 
-        print(f"🔍 [PROCESSING] {ing}")
+        count("cache_miss")
         processed = process_ingredient(ing)
-        result[ing] = processed
         cache_result(ing, processed)
+        result[ing] = annotate_leaf(processed, node, class_name)
 
     # Merge duplicate ingredients
     merged_results = merge_duplicate_ingredients(result)
     return merged_results
 
+def _resolve_ingredient(ingredient):
+    """Process-pool worker: resolve one uncached ingredient."""
+    return ingredient, process_ingredient(ingredient)
+
+def parse_ingredients_batch(texts, processes=None, stats=None):
+    """
+    Catalog-scale parsing: tokenize every label, resolve each unique ingredient
+    exactly once (optionally across a process pool) and map results back per label.
+    Returns one merged result dict per input text, in input order.
+    Pool workers are spawned, so scripts using processes > 1 need an `if __name__ == "__main__":` guard.
+    """
+    labels = [list(iter_leaves(tokenize_ingredients(text))) for text in texts]
+
+    unique = {}
+    for leaves in labels:
+        for ing, _, _ in leaves:
+            unique.setdefault(ing, None)
+
+    resolved = {}
+    missing = []
+    with stage("cache_lookup", batch=len(unique)):
+        for ing in unique:
+            cached = get_cached_result(ing)
+            if cached:
+                resolved[ing] = cached
+            else:
+                missing.append(ing)
+    count("cache_hit", len(unique) - len(missing))
+    count("cache_miss", len(missing))
+
+    if processes and processes > 1 and len(missing) > 1:
+        chunksize = max(1, len(missing) // (processes * 4))
+        # spawn, not fork: a forked child would inherit the cache store's SQLite connection and
+        # possibly-held lock from the flusher thread; spawned workers open their own store
+        with ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context("spawn")) as pool:
+            for ing, processed in pool.map(_resolve_ingredient, missing, chunksize=chunksize):
+                resolved[ing] = processed
+                cache_result(ing, processed)
+    else:
+        for ing in missing:
+            processed = process_ingredient(ing)
+            resolved[ing] = processed
+            cache_result(ing, processed)
+    ingredient_cache.flush()
+
+    results = []
+    for leaves in labels:
+        result = {}
+        for ing, node, class_name in leaves:
+            if ing not in result:
+                result[ing] = annotate_leaf(resolved[ing], node, class_name)
+        results.append(merge_duplicate_ingredients(result))
+
+    if stats is not None:
+        stats.update({
+            "labels": len(labels),
+            "leaf_tokens": sum(len(leaves) for leaves in labels),
+            "unique_ingredients": len(unique),
+            "cache_hits": len(unique) - len(missing),
+            "resolved": len(missing),
+        })
+    return results
+
 # 🔍 Sample test
 if __name__ == "__main__":
     # Test with a new ingredient not in cache/database
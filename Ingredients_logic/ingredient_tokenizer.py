@@ -0,0 +1,210 @@
+"""
+IngreScan Ingredient Tokenizer
+==============================
+
+Single-pass tokenizer for label ingredient lists. Instead of splitting on bare
+commas it builds an ingredient tree that understands:
+- Nested parentheses / brackets: "Vegetable[Tomato Paste(36%)]"
+- Class-name prefixes: "Stabilizers(INS 412,INS 415)", "Emulsifier: Soy Lecithin"
+- Declared percentages: "Herbs(0.8%)", "Sugar 10%"
+- "and/or" lists: "Palm and/or Sunflower Oil"
+- Additive sub-indices: "Raising Agent (INS 500(ii))"
+
+Each node is a plain dict:
+    {"name": "ins 412", "percent": None, "children": [], "is_class": False}
+
+Only ingredient leaves (see iter_leaves) need to be looked up, so class names
+and percentage fragments never reach the cache, the fuzzy matcher or the API.
+"""
+
+import re
+
+_OPENERS = {"(": ")", "[": "]", "{": "}"}
+_CLOSERS = {")", "]", "}"}
+_SEPARATORS = {",", ";"}
+
+_PERCENT_ONLY = re.compile(r"^(?:min(?:imum)?\.?\s*|max(?:imum)?\.?\s*)?(\d+(?:\.\d+)?)\s*%$")
+_PERCENT_SUFFIX = re.compile(r"^(.*?)\s*(\d+(?:\.\d+)?)\s*%$")
+_PERCENT_PREFIX = re.compile(r"^(\d+(?:\.\d+)?)\s*%\s+(.*)$")
+_ADDITIVE_CODE = re.compile(r"^(?:(?:ins|e)\s*-?\s*)?\d{3,4}[a-z]?$")
+_SUB_INDEX = re.compile(r"^(?:i|ii|iii|iv|v|vi|vii|viii|ix|x|[a-d])$")
+_AND_OR = re.compile(r"\s+(?:and|&)\s*/\s*or\s+")
+_AND = re.compile(r"\s+(?:and|&)\s+")
+_CLASS_NAME = re.compile(
+    r"^(?:(?:permitted|added|natural|synthetic|nature[- ]identical|artificial|edible|food)\s+)*"
+    r"(?:stabili[sz]ers?|stabili[sz]ing agents?|emulsifiers?|emulsifying agents?|preservatives?|"
+    r"acidity regulators?|acidulants?|antioxidants?|colou?rs?|colou?ring agents?|flavou?rs?|"
+    r"flavou?r enhancers?|thickeners?|thickening agents?|raising agents?|leavening agents?|"
+    r"humectants?|anti-?caking agents?|sweeteners?|gelling agents?|glazing agents?|firming agents?|"
+    r"improvers?|flour treatment agents?|dough conditioners?|vegetables?|fruits?)$"
+)
+
+
+def _clean(text):
+    text = re.sub(r"\s+", " ", text).strip().lower()
+    return text.strip(" .:-*")
+
+
+def _new_node(name):
+    return {"name": _clean(name), "percent": None, "children": [], "is_class": False}
+
+
+def _close_item(siblings, buf, node):
+    """Attach the item collected so far (pending node and/or buffered text) to siblings."""
+    text = "".join(buf)
+    if node is not None:
+        tail = _clean(text)
+        if tail:
+            node["name"] = f"{node['name']} {tail}".strip()
+        siblings.append(node)
+    elif _clean(text):
+        siblings.append(_new_node(text))
+
+
+def _scan(text):
+    """One left-to-right pass building the raw tree; unbalanced brackets are tolerated."""
+    root = []
+    siblings = root
+    stack = []
+    buf = []
+    node = None
+    for ch in text:
+        if ch in _OPENERS:
+            if node is None:
+                node = _new_node("".join(buf))
+            stack.append((siblings, node))
+            siblings = node["children"]
+            node = None
+            buf = []
+        elif ch in _CLOSERS:
+            if not stack:
+                continue
+            _close_item(siblings, buf, node)
+            siblings, node = stack.pop()
+            buf = []
+        elif ch in _SEPARATORS:
+            _close_item(siblings, buf, node)
+            buf = []
+            node = None
+        else:
+            buf.append(ch)
+    _close_item(siblings, buf, node)
+    while stack:
+        siblings, node = stack.pop()
+        siblings.append(node)
+    return root
+
+
+def _split_alternatives(node):
+    """Split "palm and/or sunflower oil" style leaves into separate leaves."""
+    if node["children"] or not _AND_OR.search(node["name"]):
+        return [node]
+    parts = [p for p in _AND_OR.split(node["name"]) if p]
+    # "palm and/or sunflower oil" -> "palm oil", "sunflower oil"
+    last_words = parts[-1].split(" ")
+    if len(last_words) > 1 and all(" " not in p for p in parts[:-1]):
+        suffix = last_words[-1]
+        parts = [f"{p} {suffix}" for p in parts[:-1]] + [parts[-1]]
+    return [dict(node, name=p, children=[]) for p in parts]
+
+
+def _normalize(nodes, parent_is_class=False):
+    out = []
+    for node in nodes:
+        name = node["name"]
+
+        # "Emulsifier: Soy Lecithin" -> class node with one child
+        if ":" in name and not node["children"]:
+            prefix, rest = name.split(":", 1)
+            if _CLASS_NAME.match(_clean(prefix)) and _clean(rest):
+                node = dict(node, name=_clean(prefix), children=[_new_node(rest)])
+                name = node["name"]
+
+        m = _PERCENT_SUFFIX.match(name)
+        if m and m.group(1):
+            node["name"], node["percent"] = _clean(m.group(1)), float(m.group(2))
+        else:
+            m = _PERCENT_PREFIX.match(name)
+            if m:
+                node["name"], node["percent"] = _clean(m.group(2)), float(m.group(1))
+
+        children = []
+        for child in node["children"]:
+            pm = _PERCENT_ONLY.match(child["name"]) if not child["children"] else None
+            if pm:
+                node["percent"] = float(pm.group(1))
+            elif not (_SUB_INDEX.match(child["name"]) and _ADDITIVE_CODE.match(node["name"])):
+                # "INS 500(ii)": the sub-index is not an ingredient of its own
+                children.append(child)
+        node["children"] = children
+
+        if children:
+            codes = [c for c in children if _ADDITIVE_CODE.match(c["name"])]
+            node["is_class"] = bool(_CLASS_NAME.match(node["name"])) or len(codes) == len(children)
+            node["children"] = _normalize(children, node["is_class"])
+        if not node["name"] and not node["children"]:
+            continue
+
+        for part in _split_alternatives(node):
+            # "INS 322 and INS 471" inside an additive class
+            if parent_is_class and not part["children"] and _AND.search(part["name"]):
+                pieces = _AND.split(part["name"])
+                if all(_ADDITIVE_CODE.match(p) for p in pieces):
+                    out.extend(dict(part, name=p) for p in pieces)
+                    continue
+            out.append(part)
+    return out
+
+
+def tokenize_ingredients(text):
+    """Parse an ingredient list into a tree of ingredient nodes (linear in len(text))."""
+    return _normalize(_scan(text or ""))
+
+
+def iter_leaves(nodes, class_name=None):
+    """
+    Yield (name, node, class_name) for every ingredient that should be looked up.
+    Class headers ("stabilizers", "preservative") are skipped; compound ingredients
+    such as "chocolate (sugar, cocoa butter)" yield both the compound and its parts.
+    """
+    for node in nodes:
+        if node["is_class"]:
+            yield from iter_leaves(node["children"], node["name"])
+            continue
+        if node["name"]:
+            yield node["name"], node, class_name
+        if node["children"]:
+            yield from iter_leaves(node["children"], class_name)
+
+
+def leaf_names(text):
+    """Unique ingredient names to look up for a label, in label order."""
+    seen = {}
+    for name, _, _ in iter_leaves(tokenize_ingredients(text)):
+        seen.setdefault(name, None)
+    return list(seen)
+
+
+def lookup_savings(text):
+    """Compare lookups made by the old bare-comma split with the tree tokenizer."""
+    naive = [item.strip().lower() for item in (text or "").split(",")]
+    leaves = leaf_names(text)
+    leaf_set = set(leaves)
+    wasted = [tok for tok in naive if tok not in leaf_set]
+    return {
+        "naive_lookups": len(naive),
+        "tree_lookups": len(leaves),
+        "wasted_naive_lookups": len(wasted),
+        "wasted_tokens": wasted,
+    }
+
+
+# 🔍 Example
+if __name__ == "__main__":
+    sample = "Vegetable[Tomato Paste(36%)],Water,Sugar,Refined Soyabean Oil,Iodised salt,Stabilizers(INS 412,INS 415),Spices and Condiments,Acidity Regulator(INS 330),Preservative(INS 211),Antioxidant(INS 300),Herbs(0.8%)"
+    for name, node, cls in iter_leaves(tokenize_ingredients(sample)):
+        pct = f" {node['percent']}%" if node["percent"] is not None else ""
+        print(f"{name}{pct}" + (f"  [{cls}]" if cls else ""))
+    stats = lookup_savings(sample)
+    print(f"\nLookups: {stats['naive_lookups']} (comma split) → {stats['tree_lookups']} (tree)")
+    print(f"Wasted comma-split tokens: {stats['wasted_tokens']}")
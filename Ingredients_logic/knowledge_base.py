@@ -0,0 +1,365 @@
+"""
+IngreScan Knowledge Base
+========================
+
+Compiles every piece of ingredient knowledge into one versioned artifact:
+- ingredient_db.json, synonym_map.json (Ingredients_logic)
+- preservatives_limit.json, the compiled FSSAI additive limits (additive_limits.py)
+- INGREDIENT_SYNONYMS / HARMFUL_INGREDIENTS / SAFE_INGREDIENTS (Api/utils.py)
+- ALLERGEN_SYNONYMS / ALLERGEN_INFO (Api/allergens.py)
+- health_rules.json (Ingredients_logic-2)
+
+Artifact layout (knowledge_base.kb):
+    b"IGKB" | format version (u32) | header length (u32) | header JSON | section payloads
+
+The header records the KB version, source fingerprints and the (offset, length,
+sha256) of every section. The file is memory-mapped read-only and a section is
+only decoded on first access.
+
+What workers share: the artifact's raw bytes (one copy in the page cache, no
+per-process read of the JSON sources) and the compile step, which runs once per
+build instead of once per worker. What they do not share: a decoded section is
+an ordinary dict in each worker that touches it, so the resident memory of the
+Python objects is still paid per process. The gain is startup time and never
+decoding sections a worker does not use, not one in-memory copy of the data.
+
+Build explicitly with:
+    python knowledge_base.py build
+get_kb() also rebuilds transparently when the artifact is missing or stale.
+
+Hot reload: the current KB is a single reference that reload() swaps atomically
+after building the new version (reload_async() does the build on a background
+thread, start_watcher() polls the sources). Caches register with on_change() for
+the sections they depend on and are only invalidated when those sections change.
+"""
+
+import ast
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import threading
+import time
+
+MAGIC = b"IGKB"
+FORMAT_VERSION = 1
+_PREAMBLE = struct.Struct("<4sII")
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(script_dir)
+KB_FILE = os.path.join(script_dir, "knowledge_base.kb")
+
+# (relative path, kind, names) — kind "json" loads the file, kind "python"
+# reads literal assignments without importing the module (and its heavy deps).
+SOURCES = [
+    ("Ingredients_logic/ingredient_db.json", "json", None),
+    ("Ingredients_logic/synonym_map.json", "json", None),
+    ("Ingredients_logic/preservatives_limit.json", "json", None),
+    ("Api/utils.py", "python", ["INGREDIENT_SYNONYMS", "HARMFUL_INGREDIENTS", "SAFE_INGREDIENTS"]),
+    ("Api/allergens.py", "python", ["ALLERGEN_SYNONYMS", "ALLERGEN_INFO"]),
+    ("Ingredients_logic-2/health_rules.json", "json", None),
+]
+
+
+# ------------------ Source loading ------------------
+def _source_path(rel_path):
+    return os.path.join(REPO_ROOT, *rel_path.split("/"))
+
+
+def _fingerprint(rel_path):
+    path = _source_path(rel_path)
+    if not os.path.exists(path):
+        return None
+    st = os.stat(path)
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+def _python_literals(path, names):
+    with open(path, "r", encoding="utf-8") as f:
+        tree = ast.parse(f.read(), filename=path)
+    found = {}
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and len(node.targets) == 1 and isinstance(node.targets[0], ast.Name):
+            if node.targets[0].id in names:
+                found[node.targets[0].id] = ast.literal_eval(node.value)
+    return found
+
+
+def _load_json(rel_path):
+    path = _source_path(rel_path)
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _load_sources():
+    raw = {}
+    for rel_path, kind, names in SOURCES:
+        if kind == "json":
+            raw[rel_path] = _load_json(rel_path)
+        else:
+            path = _source_path(rel_path)
+            raw[rel_path] = _python_literals(path, names) if os.path.exists(path) else {}
+    return raw
+
+
+# ------------------ Compilation ------------------
+def compile_sections(raw):
+    """Turn raw source data into the named sections (with prebuilt lookup tables)."""
+    ingredient_db = raw["Ingredients_logic/ingredient_db.json"]
+    synonym_map = raw["Ingredients_logic/synonym_map.json"]
+    utils_data = raw["Api/utils.py"]
+    allergen_data = raw["Api/allergens.py"]
+
+    # synonym -> DB key, only where the chain actually lands in the DB
+    resolved_synonyms = {}
+    for alias, target in synonym_map.items():
+        key = target.lower().strip()
+        if key in ingredient_db:
+            resolved_synonyms[alias.lower().strip()] = key
+
+    # any synonym (or the allergen name itself) -> allergens it belongs to
+    allergen_synonyms = allergen_data.get("ALLERGEN_SYNONYMS", {})
+    allergen_terms = {allergen.lower(): [allergen] for allergen in allergen_synonyms}
+    for allergen, terms in allergen_synonyms.items():
+        for term in terms:
+            classes = allergen_terms.setdefault(term.lower(), [])
+            if allergen not in classes:
+                classes.append(allergen)
+
+    return {
+        "ingredient_db": ingredient_db,
+        "synonym_map": synonym_map,
+        "resolved_synonyms": resolved_synonyms,
+        "fuzzy_keys": list(ingredient_db.keys()),
+        "api_synonyms": utils_data.get("INGREDIENT_SYNONYMS", {}),
+        "harmful_ingredients": utils_data.get("HARMFUL_INGREDIENTS", {}),
+        "safe_ingredients": utils_data.get("SAFE_INGREDIENTS", []),
+        "allergen_synonyms": allergen_synonyms,
+        "allergen_info": allergen_data.get("ALLERGEN_INFO", {}),
+        "allergen_terms": allergen_terms,
+        "health_rules": raw["Ingredients_logic-2/health_rules.json"],
+        "additive_limits": raw["Ingredients_logic/preservatives_limit.json"],
+    }
+
+
+def build_blob():
+    """Compile all sources into artifact bytes."""
+    sources = {rel_path: _fingerprint(rel_path) for rel_path, _, _ in SOURCES}
+    sections = compile_sections(_load_sources())
+
+    payloads = []
+    index = {}
+    offset = 0
+    digest = hashlib.sha256()
+    for name in sorted(sections):
+        payload = json.dumps(sections[name], ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        sha = hashlib.sha256(payload).hexdigest()
+        index[name] = [offset, len(payload), sha]
+        digest.update(name.encode("utf-8") + b"\0" + sha.encode("ascii"))
+        payloads.append(payload)
+        offset += len(payload)
+
+    header = json.dumps({
+        "version": digest.hexdigest()[:16],
+        "built_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "sources": sources,
+        "sections": index,
+    }, separators=(",", ":")).encode("utf-8")
+    return _PREAMBLE.pack(MAGIC, FORMAT_VERSION, len(header)) + header + b"".join(payloads)
+
+
+def build(path=KB_FILE):
+    """Write the artifact atomically and return its version."""
+    blob = build_blob()
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=".knowledge_base.", suffix=".kb", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(blob)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return KnowledgeBase(blob).version
+
+
+# ------------------ Reading ------------------
+class KnowledgeBase:
+    """Read-only view over an artifact buffer; sections decode lazily and are memoized."""
+
+    def __init__(self, buffer, path=None):
+        magic, fmt, header_len = _PREAMBLE.unpack_from(buffer, 0)
+        if magic != MAGIC or fmt != FORMAT_VERSION:
+            raise ValueError(f"Not a knowledge base artifact (format {fmt})")
+        start = _PREAMBLE.size
+        header = json.loads(bytes(buffer[start:start + header_len]).decode("utf-8"))
+        self._buffer = buffer
+        self._base = start + header_len
+        self._sections = header["sections"]
+        self._decoded = {}
+        self._lock = threading.Lock()
+        self.path = path
+        self.version = header["version"]
+        self.built_at = header["built_at"]
+        self.sources = header["sources"]
+
+    @classmethod
+    def open(cls, path=KB_FILE):
+        with open(path, "rb") as f:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return cls(buffer, path)
+
+    def section(self, name):
+        try:
+            return self._decoded[name]
+        except KeyError:
+            pass
+        with self._lock:
+            if name in self._decoded:
+                return self._decoded[name]
+            if self._buffer is None:
+                # Swapped out and closed by reload(): a late reader gets the current KB's copy
+                return get_kb().section(name)
+            offset, length, _ = self._sections[name]
+            start = self._base + offset
+            value = json.loads(bytes(self._buffer[start:start + length]).decode("utf-8"))
+            self._decoded[name] = value
+            return value
+
+    def close(self):
+        """Release the mapping; sections already decoded stay readable."""
+        with self._lock:
+            buffer, self._buffer = self._buffer, None
+        if isinstance(buffer, mmap.mmap):
+            buffer.close()
+
+    def section_hashes(self):
+        return {name: meta[2] for name, meta in self._sections.items()}
+
+    def is_stale(self):
+        """True when any source file changed since this artifact was built."""
+        return any(self.sources.get(rel_path) != _fingerprint(rel_path) for rel_path, _, _ in SOURCES)
+
+
+_kb = None
+_kb_lock = threading.Lock()
+
+
+def load(path=KB_FILE):
+    """Open the artifact, rebuilding it first when missing or stale."""
+    kb = None
+    if os.path.exists(path):
+        try:
+            kb = KnowledgeBase.open(path)
+        except (ValueError, struct.error, OSError):
+            kb = None
+    if kb is None or kb.is_stale():
+        try:
+            build(path)
+            kb = KnowledgeBase.open(path)
+        except OSError:
+            # Read-only deployment: keep the compiled KB in memory instead
+            kb = KnowledgeBase(build_blob())
+    return kb
+
+
+def get_kb():
+    """Shared knowledge base, loaded on first use."""
+    global _kb
+    if _kb is None:
+        with _kb_lock:
+            if _kb is None:
+                _kb = load()
+    return _kb
+
+
+# ------------------ Hot reload ------------------
+_listeners = []
+_reload_lock = threading.Lock()
+_reload_start_lock = threading.Lock()
+_reload_thread = None
+_watcher = None
+
+
+def on_change(sections, callback):
+    """Call callback(kb, changed_sections) after a reload touching any of sections."""
+    _listeners.append((frozenset(sections), callback))
+
+
+def reload(path=KB_FILE, force=False):
+    """
+    Rebuild from sources and swap the new KB in. Requests keep using the old KB
+    until the swap, after which its mapping is closed. Returns (version, changed_sections).
+    """
+    global _kb
+    with _reload_lock:
+        old = get_kb()
+        if not force and not old.is_stale():
+            return old.version, []
+        try:
+            build(path)
+            new = KnowledgeBase.open(path)
+        except OSError:
+            new = KnowledgeBase(build_blob())
+        old_hashes = old.section_hashes()
+        changed = sorted(name for name, sha in new.section_hashes().items() if old_hashes.get(name) != sha)
+        with _kb_lock:
+            _kb = new
+        old.close()
+
+    changed_set = set(changed)
+    for sections, callback in list(_listeners):
+        if sections & changed_set:
+            try:
+                callback(new, changed)
+            except Exception:
+                continue
+    return new.version, changed
+
+
+def reload_async(path=KB_FILE, force=False):
+    """Start a background reload; returns the thread (None if one is already running)."""
+    global _reload_thread
+    with _reload_start_lock:
+        if _reload_lock.locked() or (_reload_thread is not None and _reload_thread.is_alive()):
+            return None
+        _reload_thread = threading.Thread(target=reload, args=(path, force), name="kb-reload", daemon=True)
+        _reload_thread.start()
+        return _reload_thread
+
+
+def _watch(interval, path):
+    while True:
+        time.sleep(interval)
+        try:
+            if get_kb().is_stale():
+                reload(path)
+        except Exception:
+            continue
+
+
+def start_watcher(interval=2.0, path=KB_FILE):
+    """Poll the source files and hot-reload when any of them changes."""
+    global _watcher
+    if _watcher is None:
+        _watcher = threading.Thread(target=_watch, args=(interval, path), name="kb-watcher", daemon=True)
+        _watcher.start()
+    return _watcher
+
+
+# 🔍 Example
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "build":
+        out = sys.argv[2] if len(sys.argv) > 2 else KB_FILE
+        print(f"Built {out} (version {build(out)})")
+    else:
+        kb = get_kb()
+        print(f"Knowledge base {kb.version} built {kb.built_at}")
+        for name, (_, length, _) in sorted(kb._sections.items()):
+            print(f"  {name:<22} {length:>8} bytes")
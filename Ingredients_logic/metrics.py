@@ -0,0 +1,285 @@
+"""
+IngreScan Metrics
+=================
+
+Prometheus metrics (text exposition format 0.0.4) without a client library.
+
+- Counter, Gauge and Histogram with labels, in the prometheus_client style:
+      REQUESTS.labels("GET", "/scan/barcode/{barcode}").inc()
+  A labelled child is created once and cached, so a hot-path update is a dict
+  lookup, one lock and an add (a bisect for histograms)
+- Collectors are callables run only at scrape time, for values that already
+  live elsewhere (cache stats): nothing is counted twice on the hot path
+- Upstream HTTP calls go through upstream_call() / upstream_get(), which time
+  them per host and fallback stage, count outcomes, keep an in-flight gauge and
+  add to the per-request call tally started by track_upstream_calls()
+
+    with upstream_call("en.wikipedia.org", "wikipedia_summary"):
+        summary = wikipedia.summary(query)
+    resp = upstream_get(url, "html_scrape", timeout=8)
+    text = REGISTRY.render()
+"""
+
+import bisect
+import threading
+import time
+from contextvars import ContextVar
+from urllib.parse import urlsplit
+
+import requests
+
+import tracing
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+CALLS_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=None):
+    pairs = list(zip(names, values)) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(v)}"' for n, v in pairs) + "}"
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+# ------------------ Metric types ------------------
+class _Metric:
+    type = ""
+
+    def __init__(self, name, documentation, labelnames=(), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        (REGISTRY if registry is None else registry).register(self)
+
+    def labels(self, *values):
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}, got {values}")
+            with self._lock:
+                child = self._children.setdefault(values, self._child())
+        return child
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        for values, child in sorted(self._children.items()):
+            lines.extend(self._samples(values, child))
+        return lines
+
+    def _samples(self, values, child):
+        return [f"{self.name}{_labels(self.labelnames, values)} {_number(child.value)}"]
+
+
+class _Value:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount=1):
+        with self._lock:
+            self.value -= amount
+
+    def set(self, value):
+        self.value = value
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def _child(self):
+        return _Value()
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+
+class Gauge(_Metric):
+    type = "gauge"
+
+    def _child(self):
+        return _Value()
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+    def dec(self, amount=1):
+        self.labels().dec(amount)
+
+    def set(self, value):
+        self.labels().set(value)
+
+
+class _HistogramValue:
+    __slots__ = ("bounds", "counts", "sum", "_lock")
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        i = bisect.bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS, registry=None):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _child(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+    def _samples(self, values, child):
+        with child._lock:
+            counts, total = list(child.counts), child.sum
+        lines, cumulative = [], 0
+        for bound, n in zip(self.buckets + (float("inf"),), counts):
+            cumulative += n
+            lines.append(f"{self.name}_bucket{_labels(self.labelnames, values, ('le', _number(bound)))} {cumulative}")
+        lines.append(f"{self.name}_sum{_labels(self.labelnames, values)} {_number(total)}")
+        lines.append(f"{self.name}_count{_labels(self.labelnames, values)} {cumulative}")
+        return lines
+
+
+# ------------------ Registry ------------------
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            if any(m.name == metric.name for m in self._metrics):
+                raise ValueError(f"metric {metric.name} is already registered")
+            self._metrics.append(metric)
+
+    def register_collector(self, collector):
+        """collector() -> [(name, type, help, [(labels dict, value), ...]), ...], run on every scrape."""
+        with self._lock:
+            self._collectors.append(collector)
+        return collector
+
+    def render(self):
+        lines = []
+        for metric in list(self._metrics):
+            lines.extend(metric.render())
+        for collector in list(self._collectors):
+            try:
+                families = collector()
+            except Exception:
+                continue
+            for name, kind, documentation, samples in families:
+                lines += [f"# HELP {name} {documentation}", f"# TYPE {name} {kind}"]
+                for labels, value in samples:
+                    lines.append(f"{name}{_labels(labels.keys(), labels.values())} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+# ------------------ Upstream calls ------------------
+UPSTREAM_SECONDS = Histogram("ingrescan_upstream_request_seconds",
+                             "Upstream HTTP call latency by host and fallback stage.", ("host", "stage"))
+UPSTREAM_REQUESTS = Counter("ingrescan_upstream_requests_total",
+                            "Upstream HTTP calls by host, fallback stage and outcome (status class or error).",
+                            ("host", "stage", "outcome"))
+UPSTREAM_IN_FLIGHT = Gauge("ingrescan_upstream_requests_in_flight", "Upstream HTTP calls in progress.", ("host",))
+
+_request_calls = ContextVar("ingrescan_upstream_calls", default=None)
+
+
+class upstream_call:
+    """Times one upstream call (and traces it when a trace is active); set .status to the HTTP status."""
+    __slots__ = ("host", "stage", "status", "_start", "_span")
+
+    def __init__(self, host, stage):
+        self.host = host
+        self.stage = stage
+        self.status = None
+
+    def __enter__(self):
+        UPSTREAM_IN_FLIGHT.labels(self.host).inc()
+        calls = _request_calls.get()
+        if calls is not None:
+            calls[self.host] = calls.get(self.host, 0) + 1
+        self._span = tracing.start_span("upstream", host=self.host, stage=self.stage)
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self._start
+        if self.status:
+            self._span.set("status", self.status)
+        self._span.__exit__(exc_type, exc, tb)
+        UPSTREAM_IN_FLIGHT.labels(self.host).dec()
+        UPSTREAM_SECONDS.labels(self.host, self.stage).observe(elapsed)
+        if exc_type is not None:
+            outcome = "error"
+        else:
+            outcome = f"{self.status // 100}xx" if self.status else "ok"
+        UPSTREAM_REQUESTS.labels(self.host, self.stage, outcome).inc()
+        return False
+
+
+def upstream_get(url, stage, session=None, **kwargs):
+    """requests.get (or session.get) timed as one upstream call labelled by host and stage."""
+    with upstream_call(urlsplit(url).hostname or "unknown", stage) as call:
+        response = (session or requests).get(url, **kwargs)
+        call.status = response.status_code
+    return response
+
+
+def track_upstream_calls():
+    """Start a per-request tally of upstream calls by host; returns (tally, token for untrack)."""
+    calls = {}
+    return calls, _request_calls.set(calls)
+
+
+def untrack_upstream_calls(token):
+    _request_calls.reset(token)
+
+
+# 🔍 Example
+if __name__ == "__main__":
+    hits = Counter("demo_cache_hits_total", "Demo counter.", ("cache",))
+    latency = Histogram("demo_seconds", "Demo latency.", ("route",), buckets=(0.001, 0.01, 0.1))
+    for i in range(100):
+        hits.labels("product").inc()
+        latency.labels("/scan/barcode/{barcode}").observe(i / 1000)
+    with upstream_call("world.openfoodfacts.org", "v2_product") as call:
+        call.status = 200
+    start = time.perf_counter()
+    for _ in range(100_000):
+        latency.labels("/scan/barcode/{barcode}").observe(0.02)
+    print(f"observe: {(time.perf_counter() - start) * 10:.2f} us/call\n")
+    print(REGISTRY.render())
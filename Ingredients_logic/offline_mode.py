@@ -0,0 +1,68 @@
+"""
+IngreScan Offline Mode
+======================
+
+One switch for deployments without outbound network (batch jobs, kiosks).
+When offline, every network path (Wikipedia, OpenFoodFacts) is skipped up
+front instead of waiting out its timeout, and answers come only from the local
+knowledge base, caches and catalogs. Placeholder results produced because a
+source was skipped carry source "offline" and are never written to the cache,
+so they are resolved properly once the network is back. The same goes for the
+"Offline Fallback" placeholder returned when no source answered in time.
+
+Enable with the INGRESCAN_OFFLINE=1 environment variable (inherited by
+process-pool workers) or at runtime:
+
+    from offline_mode import set_offline
+    set_offline(True)
+"""
+
+import os
+from contextlib import contextmanager
+
+OFFLINE_ENV = "INGRESCAN_OFFLINE"
+OFFLINE_SOURCE = "offline"
+FALLBACK_SOURCE = "Offline Fallback"   # online, but no source answered before the deadline
+
+_TRUTHY = {"1", "true", "yes", "on"}
+
+
+def is_offline():
+    """True when network lookups must be skipped."""
+    return os.environ.get(OFFLINE_ENV, "").strip().lower() in _TRUTHY
+
+
+def set_offline(enabled=True):
+    """Switch offline mode on/off (through the environment, so worker processes follow)."""
+    os.environ[OFFLINE_ENV] = "1" if enabled else "0"
+
+
+@contextmanager
+def offline(enabled=True):
+    """Temporarily force offline mode, e.g. `with offline(): parse_ingredients(text)`."""
+    previous = os.environ.get(OFFLINE_ENV)
+    set_offline(enabled)
+    try:
+        yield
+    finally:
+        if previous is None:
+            os.environ.pop(OFFLINE_ENV, None)
+        else:
+            os.environ[OFFLINE_ENV] = previous
+
+
+def is_offline_result(result):
+    """True for placeholder results produced because the network was skipped."""
+    return bool(result) and result.get("source") == OFFLINE_SOURCE
+
+
+def is_placeholder_result(result):
+    """True for placeholders that must not be cached: network skipped, or no source answered in time."""
+    return bool(result) and result.get("source") in (OFFLINE_SOURCE, FALLBACK_SOURCE)
+
+
+# 🔍 Example
+if __name__ == "__main__":
+    print(f"Offline mode: {is_offline()}")
+    with offline():
+        print(f"Inside offline(): {is_offline()}")
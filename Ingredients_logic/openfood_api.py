@@ -39,10 +39,31 @@
 
 
 
-import requests
+import os
+import queue
 import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
 import wikipedia
 
+from offline_mode import is_offline, OFFLINE_SOURCE, FALLBACK_SOURCE
+from pipeline_events import count, emit, enabled
+
+# --- Source race settings ---
+# All sources start together; the first answer from the best source wins outright,
+# a lesser answer waits up to GRACE_WINDOW for something better, and nothing waits
+# past FETCH_DEADLINE.
+FETCH_DEADLINE = 3.0
+GRACE_WINDOW = 0.3
+SOURCE_QUALITY = {"Wikipedia": 2, "OpenFoodFacts": 1}
+# Shared, bounded pool for source calls: wikipedia.summary has no timeout, so a call
+# that outlives its deadline keeps a worker busy instead of adding a thread per lookup
+SOURCE_WORKERS = int(os.environ.get("INGRESCAN_SOURCE_WORKERS", "8"))
+_source_pool = ThreadPoolExecutor(max_workers=SOURCE_WORKERS, thread_name_prefix="source")
+
 def clean_text(text):
     """Remove unwanted patterns and standardize text."""
     if not text:
@@ -54,107 +75,201 @@ def clean_text(text):
     text = re.sub(r"\[\d+\]", "", text)
     return text.strip()
 
-def fetch_from_wikipedia(query):
-    """Fallback to Wikipedia summary if API fails or is vague."""
-    try:
-        print(f"📖 Fetching from Wikipedia: {query}")
-        # Try different search terms if the first fails
-        search_terms = [
-            query,
-            f"{query} food additive",
-            f"{query} preservative",
-            f"{query} ingredient"
-        ]
-        
-        for term in search_terms:
-            try:
-                summary = wikipedia.summary(term, sentences=2, auto_suggest=True, redirect=True)
-                if summary and len(summary.strip()) > 20:  # Ensure meaningful content
-                    return clean_text(summary)
-            except wikipedia.exceptions.DisambiguationError as e:
-                # Try the first option from disambiguation
-                if e.options:
+def fetch_from_wikipedia(query, deadline=None):
+    """Wikipedia summary for the ingredient; gives up on further search terms past deadline."""
+    if is_offline():
+        return None
+    search_terms = [
+        query,
+        f"{query} food additive",
+        f"{query} preservative",
+        f"{query} ingredient"
+    ]
+
+    for term in search_terms:
+        if deadline is not None and time.monotonic() >= deadline:
+            return None
+        try:
+            summary = wikipedia.summary(term, sentences=2, auto_suggest=True, redirect=True)
+            if summary and len(summary.strip()) > 20:  # Ensure meaningful content
+                return clean_text(summary)
+        except wikipedia.exceptions.DisambiguationError as e:
+            # Try the first option from disambiguation
+            if e.options:
+                try:
                     summary = wikipedia.summary(e.options[0], sentences=2)
-                    if summary:
-                        return clean_text(summary)
-            except wikipedia.exceptions.PageError:
-                continue  # Try next search term
-            except:
-                continue
-                
+                except Exception:
+                    continue
+                if summary:
+                    return clean_text(summary)
+        except wikipedia.exceptions.PageError:
+            continue  # Try next search term
+        except requests.exceptions.RequestException:
+            raise  # Network down: no point trying the other terms
+        except Exception:
+            continue
+
+    return None
+
+def fetch_from_openfoodfacts(query, timeout=2):
+    """Product-name hint from the OpenFoodFacts search API."""
+    if is_offline():
         return None
-    except Exception as e:
-        print(f"📖 Wikipedia fallback failed: {e}")
+    search_term = query.lower().strip().replace(' ', '+')
+    url = f"https://world.openfoodfacts.org/cgi/search.pl?search_terms={search_term}&search_simple=1&action=process&json=1&page_size=2"
+
+    headers = {
+        'User-Agent': 'IngreScan/1.0',
+        'Accept': 'application/json'
+    }
+
+    response = requests.get(url, headers=headers, timeout=timeout)
+    if response.status_code != 200:
         return None
+    products = response.json().get("products", [])
+    if products and products[0].get("product_name"):
+        return clean_text(f"Found in products like: {products[0]['product_name']}.")
+    return None
 
 def is_vague_or_missing(desc):
     """Check if description is missing or non-informative."""
     vague_terms = {"no data", "n/a", "not available", "unknown", ""}
     return desc.lower().strip() in vague_terms
 
+# ------------------ Source statistics ------------------
+_stats_lock = threading.Lock()
+SOURCE_STATS = {}
+
+def _record(source, **counts):
+    with _stats_lock:
+        stats = SOURCE_STATS.setdefault(source, {
+            "calls": 0, "hits": 0, "misses": 0, "errors": 0,
+            "wins": 0, "late": 0, "latency_total": 0.0, "latency_max": 0.0,
+        })
+        latency = counts.pop("latency", None)
+        if latency is not None:
+            stats["latency_total"] += latency
+            stats["latency_max"] = max(stats["latency_max"], latency)
+        for key, value in counts.items():
+            stats[key] += value
+
+def get_source_stats():
+    """Per-source calls, hit rate, win count and latency, for tuning the race."""
+    with _stats_lock:
+        report = {}
+        for source, stats in SOURCE_STATS.items():
+            finished = stats["hits"] + stats["misses"] + stats["errors"]
+            report[source] = dict(
+                stats,
+                hit_rate=round(stats["hits"] / finished, 3) if finished else None,
+                avg_latency=round(stats["latency_total"] / finished, 3) if finished else None,
+            )
+        return report
+
+def reset_source_stats():
+    with _stats_lock:
+        SOURCE_STATS.clear()
+
+# ------------------ Source race ------------------
+def _run_source(source, fetch, ingredient_name, results, end):
+    started = time.monotonic()
+    if started >= end:
+        # Queued behind slow calls until the race was already over
+        results.put((source, None))
+        return
+    try:
+        description = fetch(ingredient_name)
+    except Exception as e:
+        latency = time.monotonic() - started
+        _record(source, calls=1, errors=1, latency=latency)
+        if enabled():
+            emit({"event": "stage", "name": f"source:{source}", "duration_ms": round(latency * 1000.0, 4),
+                  "ts": time.time(), "ingredient": ingredient_name, "error": e.__class__.__name__})
+        results.put((source, None))
+        return
+    latency = time.monotonic() - started
+    _record(source, calls=1, latency=latency, **({"hits": 1} if description else {"misses": 1}))
+    if enabled():
+        emit({"event": "stage", "name": f"source:{source}", "duration_ms": round(latency * 1000.0, 4),
+              "ts": time.time(), "ingredient": ingredient_name, "hit": bool(description)})
+    results.put((source, description))
+
+def _source_result(ingredient_name, source, description):
+    return {
+        "common_name": ingredient_name.title(),
+        "description": description,
+        "risk_level": "unknown",
+        "found_in": ["processed foods"] if source == "OpenFoodFacts" else [],
+        "also_used_in": [],
+        "source": source
+    }
+
+def race_sources(ingredient_name, deadline=FETCH_DEADLINE, grace=GRACE_WINDOW):
+    """
+    Query every source concurrently and return (source, description) for the
+    best-quality answer, or (None, None) when nothing useful arrived in time.
+    Sources still running at the deadline finish in the background on the shared
+    pool (their latency is still recorded) but are not waited for; ones still
+    queued at the deadline are skipped.
+    """
+    end = time.monotonic() + deadline
+    sources = {
+        "Wikipedia": lambda name: fetch_from_wikipedia(name, deadline=end),
+        "OpenFoodFacts": lambda name: fetch_from_openfoodfacts(name, timeout=deadline),
+    }
+    results = queue.Queue()
+    for source, fetch in sources.items():
+        _source_pool.submit(_run_source, source, fetch, ingredient_name, results, end)
+
+    best_quality = max(SOURCE_QUALITY.values())
+    best = (None, None)
+    grace_end = end
+    pending = set(sources)
+    while pending:
+        remaining = min(end, grace_end) - time.monotonic()
+        if remaining <= 0:
+            break
+        try:
+            source, description = results.get(timeout=remaining)
+        except queue.Empty:
+            break
+        pending.discard(source)
+        if not description:
+            continue
+        if best[0] is None or SOURCE_QUALITY[source] > SOURCE_QUALITY[best[0]]:
+            if best[0] is None:
+                grace_end = min(end, time.monotonic() + grace)
+            best = (source, description)
+        if SOURCE_QUALITY[best[0]] >= best_quality:
+            break
+
+    for source in pending:
+        _record(source, late=1)
+    if best[0] is not None:
+        _record(best[0], wins=1)
+    if enabled():
+        count("source_win" if best[0] else "source_none", source=best[0], late=sorted(pending))
+    return best
+
 def fetch_ingredient_info(ingredient_name):
     """
-    Fetch ingredient information with aggressive timeout and offline-first approach.
-    If network fails, returns basic structured data for unknown ingredients.
+    Fetch ingredient information by racing Wikipedia and OpenFoodFacts under one deadline.
+    If no source answers in time, returns basic structured data for unknown ingredients.
     """
-    
-    # First try Wikipedia (usually faster and more reliable)
-    print(f"📘 Trying Wikipedia first for: {ingredient_name}")
-    wiki_result = fetch_from_wikipedia(ingredient_name)
-    if wiki_result:
-        return {
-            "common_name": ingredient_name.title(),
-            "description": wiki_result,
-            "risk_level": "unknown",
-            "found_in": [],
-            "also_used_in": [],
-            "source": "Wikipedia"
-        }
-    
-    # Then try OpenFoodFacts with very short timeout
-    try:
-        search_term = ingredient_name.lower().strip().replace(' ', '+')
-        url = f"https://world.openfoodfacts.org/cgi/search.pl?search_terms={search_term}&search_simple=1&action=process&json=1&page_size=2"
-        
-        headers = {
-            'User-Agent': 'IngreScan/1.0',
-            'Accept': 'application/json'
-        }
-        
-        print(f"🌐 Quick API try for: {ingredient_name}")
-        response = requests.get(url, headers=headers, timeout=2)  # Very short timeout
-        
-        if response.status_code == 200:
-            data = response.json()
-            products = data.get("products", [])
-            
-            if products:
-                product = products[0]
-                product_name = product.get("product_name", "")
-                
-                if product_name:
-                    description = f"Found in products like: {product_name}."
-                    return {
-                        "common_name": ingredient_name.title(),
-                        "description": clean_text(description),
-                        "risk_level": "unknown",
-                        "found_in": ["processed foods"],
-                        "also_used_in": [],
-                        "source": "OpenFoodFacts"
-                    }
-    
-    except Exception as e:
-        print(f"⚡ API skipped ({e.__class__.__name__})")
-    
+    offline = is_offline()
+    if not offline:
+        source, description = race_sources(ingredient_name)
+        if source is not None:
+            return _source_result(ingredient_name, source, description)
+
     # Return structured "unknown" result instead of None
-    print(f"🏠 Using offline fallback for: {ingredient_name}")
     return {
         "common_name": ingredient_name.title(),
         "description": f"{ingredient_name.title()} is a food ingredient. Detailed information not available offline. Consider checking food safety databases for more details.",
         "risk_level": "unknown",
         "found_in": ["various food products"],
         "also_used_in": [],
-        "source": "Offline Fallback"
+        "source": OFFLINE_SOURCE if offline else FALLBACK_SOURCE
     }
 
 def extract_ingredient_context(ingredients_text, ingredient_name):
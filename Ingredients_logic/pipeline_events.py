@@ -0,0 +1,195 @@
+"""
+IngreScan Pipeline Events
+=========================
+
+Structured timing and counters for the ingredient pipeline, replacing the old
+status prints. Code under measurement only calls:
+
+    with stage("fuzzy_match", ingredient=name):
+        ...
+    count("cache_hit")
+
+Nothing is recorded until a sink is attached; with no sink, stage() hands back
+a shared no-op context and count()/emit() return after one list check.
+
+Every event is a plain dict:
+    {"event": "stage", "name": "fuzzy_match", "duration_ms": 0.41, "ts": ..., "ingredient": "sugar"}
+    {"event": "count", "name": "cache_hit", "value": 1, "ts": ...}
+
+Sinks are callables taking one event (or objects with an emit(event) method):
+- LoggingSink: one log record per event
+- JsonLinesSink: appends events to a JSON-lines file
+- Aggregator: in-memory per-stage count/total/max and counter totals
+
+Sinks live in the current process; process-pool workers report nothing unless
+they attach their own.
+"""
+
+import json
+import logging
+import threading
+import time
+
+_sinks = []
+_sinks_lock = threading.Lock()
+
+
+# ------------------ Sink registry ------------------
+def attach_sink(sink):
+    """Start sending events to sink; returns it so it can be detached later."""
+    with _sinks_lock:
+        _sinks.append(sink.emit if hasattr(sink, "emit") else sink)
+    return sink
+
+
+def detach_sink(sink):
+    with _sinks_lock:
+        target = sink.emit if hasattr(sink, "emit") else sink
+        for i, registered in enumerate(_sinks):
+            if registered == target:
+                del _sinks[i]
+                break
+
+
+def enabled():
+    """True when at least one sink is attached."""
+    return bool(_sinks)
+
+
+# ------------------ Recording ------------------
+def emit(event):
+    if not _sinks:
+        return
+    for sink in list(_sinks):
+        try:
+            sink(event)
+        except Exception:
+            continue
+
+
+def count(name, value=1, **fields):
+    if not _sinks:
+        return
+    emit(dict(fields, event="count", name=name, value=value, ts=time.time()))
+
+
+class _Stage:
+    __slots__ = ("name", "fields", "_start")
+
+    def __init__(self, name, fields):
+        self.name = name
+        self.fields = fields
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration_ms = (time.perf_counter() - self._start) * 1000.0
+        event = dict(self.fields, event="stage", name=self.name,
+                     duration_ms=round(duration_ms, 4), ts=time.time())
+        if exc_type is not None:
+            event["error"] = exc_type.__name__
+        emit(event)
+        return False
+
+
+class _NullStage:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+def stage(name, **fields):
+    """Context manager timing one pipeline stage (a no-op when no sink is attached)."""
+    if not _sinks:
+        return _NULL_STAGE
+    return _Stage(name, fields)
+
+
+# ------------------ Sinks ------------------
+class LoggingSink:
+    """Send every event to a logger (DEBUG by default)."""
+
+    def __init__(self, logger=None, level=logging.DEBUG):
+        self.logger = logger or logging.getLogger("ingrescan.pipeline")
+        self.level = level
+
+    def emit(self, event):
+        if event["event"] == "stage":
+            self.logger.log(self.level, "stage %s %.3f ms %s", event["name"], event["duration_ms"],
+                            {k: v for k, v in event.items() if k not in ("event", "name", "duration_ms", "ts")})
+        else:
+            self.logger.log(self.level, "%s %s %s", event["event"], event["name"], event.get("value", ""))
+
+
+class JsonLinesSink:
+    """Append events as JSON lines to a path or an open text file."""
+
+    def __init__(self, target):
+        self._own = isinstance(target, str)
+        self._file = open(target, "a", encoding="utf-8") if self._own else target
+        self._lock = threading.Lock()
+
+    def emit(self, event):
+        line = json.dumps(event, ensure_ascii=False, default=str)
+        with self._lock:
+            self._file.write(line + "\n")
+
+    def close(self):
+        with self._lock:
+            self._file.flush()
+            if self._own:
+                self._file.close()
+
+
+class Aggregator:
+    """In-memory per-stage timings and counter totals."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.stages = {}
+            self.counters = {}
+
+    def emit(self, event):
+        name = event["name"]
+        with self._lock:
+            if event["event"] == "stage":
+                stats = self.stages.setdefault(name, {"count": 0, "total_ms": 0.0, "max_ms": 0.0})
+                stats["count"] += 1
+                stats["total_ms"] += event["duration_ms"]
+                stats["max_ms"] = max(stats["max_ms"], event["duration_ms"])
+            elif event["event"] == "count":
+                self.counters[name] = self.counters.get(name, 0) + event["value"]
+
+    def snapshot(self):
+        """{"stages": {name: {count, total_ms, avg_ms, max_ms}}, "counters": {name: total}}"""
+        with self._lock:
+            stages = {
+                name: dict(stats, total_ms=round(stats["total_ms"], 3),
+                           avg_ms=round(stats["total_ms"] / stats["count"], 4))
+                for name, stats in self.stages.items()
+            }
+            return {"stages": stages, "counters": dict(self.counters)}
+
+
+# 🔍 Example
+if __name__ == "__main__":
+    agg = attach_sink(Aggregator())
+    for _ in range(3):
+        with stage("demo", ingredient="sugar"):
+            time.sleep(0.001)
+        count("demo_calls")
+    detach_sink(agg)
+    print(json.dumps(agg.snapshot(), indent=2))
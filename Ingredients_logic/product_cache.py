@@ -0,0 +1,304 @@
+"""
+IngreScan Product Cache
+=======================
+
+In-memory cache for fetched product data, shared by the API and the CLI fetchers.
+
+- Lock striping: keys hash to one of N segments, each with its own lock, so
+  concurrent lookups for different products rarely contend
+- Memory budget in bytes (deep size of the cached value), split across segments,
+  instead of an entry count
+- TTLs on time.monotonic(), so wall-clock jumps never expire or resurrect entries
+- W-TinyLFU admission: new entries land in a small LRU window; when the window
+  overflows, its oldest entry only enters the main area if a count-min sketch
+  says it is requested more often than the main area's LRU victim. One-off
+  barcodes from a bulk scan therefore cannot flush the popular products
+- Metrics: hits, misses, evictions, expirations, rejections, bytes; stats()
+  sums them over segments and hits/misses are also counted in pipeline_events
+- Optional shared tier (shared_cache.SharedCache): local misses fall through to
+  a SQLite file every worker process reads and writes, and sets go to both
+
+Values are shared, not copied: callers must treat what get() returns as read-only.
+
+    cache = get_product_cache()
+    product = cache.get("off:8901058851427")
+    cache.set("off:8901058851427", product)
+
+Sizing comes from INGRESCAN_PRODUCT_CACHE_MB (default 64) and
+INGRESCAN_PRODUCT_CACHE_TTL seconds (default 300); INGRESCAN_SHARED_CACHE=<path>
+turns on the shared tier.
+"""
+
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import pipeline_events
+from shared_cache import SharedCache
+
+ENTRY_OVERHEAD = 160     # key, OrderedDict node and entry record
+WINDOW_RATIO = 0.01
+SKETCH_DEPTH = 4
+COUNTER_MAX = 15         # 4-bit counters, as in TinyLFU
+
+
+def deep_sizeof(value, _seen=None):
+    """Approximate bytes held by value, following dicts, lists, tuples and sets."""
+    if _seen is None:
+        _seen = set()
+    if id(value) in _seen:
+        return 0
+    _seen.add(id(value))
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        for k, v in value.items():
+            size += deep_sizeof(k, _seen) + deep_sizeof(v, _seen)
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        for v in value:
+            size += deep_sizeof(v, _seen)
+    return size
+
+
+# ------------------ Frequency sketch ------------------
+class CountMinSketch:
+    """4-row count-min sketch of small saturating counters, halved periodically so old popularity fades."""
+
+    def __init__(self, width):
+        self.width = 1 << max(6, (int(width) - 1).bit_length())
+        self._mask = self.width - 1
+        self._rows = [bytearray(self.width) for _ in range(SKETCH_DEPTH)]
+        self._additions = 0
+        self._sample_size = 10 * self.width
+
+    def _indexes(self, key):
+        h = hash(key) & 0xFFFFFFFFFFFFFFFF
+        h1, h2 = h & 0xFFFFFFFF, (h >> 32) | 1
+        return [(h1 + i * h2) & self._mask for i in range(SKETCH_DEPTH)]
+
+    def increment(self, key):
+        for row, i in zip(self._rows, self._indexes(key)):
+            if row[i] < COUNTER_MAX:
+                row[i] += 1
+        self._additions += 1
+        if self._additions >= self._sample_size:
+            self._age()
+
+    def frequency(self, key):
+        return min(row[i] for row, i in zip(self._rows, self._indexes(key)))
+
+    def _age(self):
+        self._rows = [bytearray(c >> 1 for c in row) for row in self._rows]
+        self._additions //= 2
+
+
+# ------------------ Segment ------------------
+class _Segment:
+    """One lock's worth of the cache: LRU window + main area + sketch + counters."""
+
+    def __init__(self, max_bytes, sketch_width):
+        self.lock = threading.Lock()
+        self.window = OrderedDict()      # key -> [value, size, expires_at]
+        self.main = OrderedDict()
+        self.window_bytes = 0
+        self.main_bytes = 0
+        self.window_budget = max(1, int(max_bytes * WINDOW_RATIO))
+        self.main_budget = max(1, max_bytes - self.window_budget)
+        self.sketch = CountMinSketch(sketch_width)
+        self.hits = self.shared_hits = self.misses = self.sets = 0
+        self.evictions = self.expirations = self.rejections = 0
+
+    def remove(self, key):
+        for area in (self.window, self.main):
+            entry = area.pop(key, None)
+            if entry is not None:
+                if area is self.window:
+                    self.window_bytes -= entry[1]
+                else:
+                    self.main_bytes -= entry[1]
+                return entry
+        return None
+
+    def admit(self, key, entry, now):
+        """Move a window overflow candidate into main if it beats the LRU victims it would displace."""
+        if entry[1] > self.main_budget:
+            self.evictions += 1
+            return
+        # Pick the victims without touching main, so a rejected candidate never costs an entry
+        candidate_freq = self.sketch.frequency(key)
+        expired, victims = [], []
+        needed = self.main_bytes + entry[1] - self.main_budget
+        for victim_key, victim in self.main.items():
+            if needed <= 0:
+                break
+            (expired if victim[2] <= now else victims).append(victim_key)
+            needed -= victim[1]
+        # Expired entries are dead either way
+        for victim_key in expired:
+            self.main_bytes -= self.main.pop(victim_key)[1]
+            self.expirations += 1
+        if any(self.sketch.frequency(victim_key) >= candidate_freq for victim_key in victims):
+            self.evictions += 1
+            return
+        for victim_key in victims:
+            self.main_bytes -= self.main.pop(victim_key)[1]
+            self.evictions += 1
+        self.main[key] = entry
+        self.main_bytes += entry[1]
+
+
+# ------------------ Cache ------------------
+class ProductCache:
+    """Thread-safe, byte-budgeted TTL cache with TinyLFU admission."""
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, ttl_seconds=300, segments=16,
+                 avg_entry_bytes=8192, sizeof=deep_sizeof, clock=time.monotonic, shared=None):
+        self.max_bytes = int(max_bytes)
+        self.ttl = ttl_seconds
+        self.shared = shared
+        self._sizeof = sizeof
+        self._clock = clock
+        per_segment = max(1, self.max_bytes // segments)
+        sketch_width = max(64, per_segment // avg_entry_bytes)
+        self._segments = [_Segment(per_segment, sketch_width) for _ in range(segments)]
+
+    def _segment(self, key):
+        return self._segments[hash(key) % len(self._segments)]
+
+    def get(self, key, default=None):
+        seg = self._segment(key)
+        now = self._clock()
+        with seg.lock:
+            seg.sketch.increment(key)
+            area = seg.window if key in seg.window else seg.main if key in seg.main else None
+            if area is not None:
+                entry = area[key]
+                if entry[2] > now:
+                    area.move_to_end(key)
+                    seg.hits += 1
+                    pipeline_events.count("product_cache_hit")
+                    return entry[0]
+                seg.remove(key)
+                seg.expirations += 1
+        found = self.shared.get(key) if self.shared is not None else None
+        with seg.lock:
+            if found is None:
+                seg.misses += 1
+            else:
+                seg.shared_hits += 1
+        if found is None:
+            pipeline_events.count("product_cache_miss")
+            return default
+        # Another process fetched it: keep a local copy for the rest of its shared lifetime
+        value, expires_at = found
+        pipeline_events.count("product_cache_shared_hit")
+        self._store(key, value, expires_at - time.time())
+        return value
+
+    def set(self, key, value, ttl=None):
+        """Cache value for ttl seconds (default: the cache TTL). False if it can never fit locally."""
+        ttl = self.ttl if ttl is None else ttl
+        if self.shared is not None:
+            self.shared.set(key, value, ttl)
+        return self._store(key, value, ttl)
+
+    def _store(self, key, value, ttl):
+        size = self._sizeof(value) + ENTRY_OVERHEAD
+        seg = self._segment(key)
+        entry = [value, size, self._clock() + ttl]
+        with seg.lock:
+            if size > seg.main_budget:
+                seg.rejections += 1
+                return False
+            seg.remove(key)
+            seg.sets += 1
+            seg.window[key] = entry
+            seg.window_bytes += size
+            now = self._clock()
+            while seg.window_bytes > seg.window_budget and seg.window:
+                candidate_key, candidate = seg.window.popitem(last=False)
+                seg.window_bytes -= candidate[1]
+                seg.admit(candidate_key, candidate, now)
+        return True
+
+    def delete(self, key):
+        if self.shared is not None:
+            self.shared.delete(key)
+        seg = self._segment(key)
+        with seg.lock:
+            return seg.remove(key) is not None
+
+    def clear(self):
+        """Empty the local tier (the shared tier belongs to every process and is left alone)."""
+        for seg in self._segments:
+            with seg.lock:
+                seg.window.clear()
+                seg.main.clear()
+                seg.window_bytes = seg.main_bytes = 0
+
+    def __contains__(self, key):
+        seg = self._segment(key)
+        with seg.lock:
+            entry = seg.window.get(key) or seg.main.get(key)
+            return entry is not None and entry[2] > self._clock()
+
+    def __len__(self):
+        return sum(len(seg.window) + len(seg.main) for seg in self._segments)
+
+    def stats(self):
+        totals = {"hits": 0, "shared_hits": 0, "misses": 0, "sets": 0, "evictions": 0, "expirations": 0,
+                  "rejections": 0, "entries": 0, "bytes": 0}
+        for seg in self._segments:
+            with seg.lock:
+                for name in ("hits", "shared_hits", "misses", "sets", "evictions", "expirations", "rejections"):
+                    totals[name] += getattr(seg, name)
+                totals["entries"] += len(seg.window) + len(seg.main)
+                totals["bytes"] += seg.window_bytes + seg.main_bytes
+        lookups = totals["hits"] + totals["shared_hits"] + totals["misses"]
+        totals["hit_rate"] = round((totals["hits"] + totals["shared_hits"]) / lookups, 4) if lookups else 0.0
+        totals["max_bytes"] = self.max_bytes
+        if self.shared is not None:
+            totals["shared"] = self.shared.stats()
+        return totals
+
+
+# ------------------ Shared instance ------------------
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def get_product_cache():
+    """Process-wide cache used by every product fetcher."""
+    global _shared
+    if _shared is None:
+        with _shared_lock:
+            if _shared is None:
+                shared_path = os.environ.get("INGRESCAN_SHARED_CACHE")
+                _shared = ProductCache(
+                    max_bytes=float(os.environ.get("INGRESCAN_PRODUCT_CACHE_MB", "64")) * 1024 * 1024,
+                    ttl_seconds=float(os.environ.get("INGRESCAN_PRODUCT_CACHE_TTL", "300")),
+                    shared=SharedCache(shared_path) if shared_path else None,
+                )
+    return _shared
+
+
+# 🔍 Example: skewed traffic with a one-off bulk scan mixed in
+if __name__ == "__main__":
+    import random
+
+    product = {"product_name": "Sample", "nutriments": {f"n{i}_100g": i * 1.5 for i in range(30)},
+               "ingredients_text": "sugar, wheat flour, palm oil, milk solids " * 10}
+    cache = ProductCache(max_bytes=2 * 1024 * 1024)
+    popular = [f"off:{8900000000000 + i}" for i in range(300)]
+    rng = random.Random(1)
+    start = time.perf_counter()
+    for step in range(200_000):
+        key = rng.choice(popular) if step % 2 else f"off:{9000000000000 + step}"
+        if cache.get(key) is None:
+            cache.set(key, product)
+    elapsed = time.perf_counter() - start
+    stats = cache.stats()
+    print(f"{200_000 / elapsed:,.0f} ops/s, hit rate {stats['hit_rate']:.1%} "
+          f"(popular half alone caps it at 50%), {stats['entries']} entries, {stats['bytes'] / 1e6:.2f} MB")
+    print(stats)
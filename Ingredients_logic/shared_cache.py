@@ -0,0 +1,210 @@
+"""
+IngreScan Shared Cache Tier
+===========================
+
+Cross-process cache behind ProductCache, so uvicorn workers (and CLI runs on
+the same host) reuse each other's upstream lookups instead of each warming its
+own empty in-memory cache.
+
+- One local SQLite file in WAL mode: readers never block, and each write is a
+  single-statement transaction, so writers hold the lock only briefly
+- A connection per thread, so concurrent request threads read in parallel
+- Values are compact JSON, zlib-compressed when that pays off, behind a one-byte
+  format tag ("j" plain / "z" zlib)
+- Expiry is wall-clock (time.time()) because it is compared across processes;
+  expired rows are skipped on read and pruned every few hundred writes, along
+  with the soonest-expiring rows when the file grows past its byte budget
+
+Enable it for the shared product cache with INGRESCAN_SHARED_CACHE=<path>
+(Api/serve.py does this for multi-worker runs).
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+COMPRESS_MIN_BYTES = 256
+PRUNE_EVERY = 256
+
+
+def encode(value):
+    raw = json.dumps(value, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    if len(raw) >= COMPRESS_MIN_BYTES:
+        packed = zlib.compress(raw, 6)
+        if len(packed) < len(raw):
+            return b"z" + packed
+    return b"j" + raw
+
+
+def decode(blob):
+    blob = bytes(blob)
+    body = zlib.decompress(blob[1:]) if blob[:1] == b"z" else blob[1:]
+    return json.loads(body)
+
+
+class SharedCache:
+    """SQLite-backed key/value tier with TTLs, shared by every process that opens the same path."""
+
+    def __init__(self, path, max_bytes=512 * 1024 * 1024, busy_timeout=5.0):
+        self.path = path
+        self.max_bytes = int(max_bytes)
+        self._busy_timeout = busy_timeout
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+        self._writes_since_prune = 0
+        self.hits = self.misses = self.writes = self.errors = 0
+        self.bytes_written = 0
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS shared_cache ("
+            " key TEXT PRIMARY KEY,"
+            " value BLOB NOT NULL,"
+            " expires_at REAL NOT NULL,"
+            " size INTEGER NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS shared_cache_expiry ON shared_cache (expires_at)")
+
+    # ------------------ Connections ------------------
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            # A forked child must not reuse its parent's connection
+            conn = sqlite3.connect(self.path, timeout=self._busy_timeout, isolation_level=None,
+                                   check_same_thread=False)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _count(self, name, n=1):
+        with self._stats_lock:
+            setattr(self, name, getattr(self, name) + n)
+
+    # ------------------ Cache contract ------------------
+    def get(self, key):
+        """(value, expires_at) for a live entry, else None."""
+        try:
+            row = self._conn().execute(
+                "SELECT value, expires_at FROM shared_cache WHERE key = ? AND expires_at > ?",
+                (key, time.time()),
+            ).fetchone()
+        except sqlite3.Error:
+            self._count("errors")
+            return None
+        if row is None:
+            self._count("misses")
+            return None
+        self._count("hits")
+        return decode(row[0]), row[1]
+
+    def set(self, key, value, ttl):
+        blob = encode(value)
+        try:
+            self._conn().execute(
+                "INSERT OR REPLACE INTO shared_cache (key, value, expires_at, size) VALUES (?, ?, ?, ?)",
+                (key, blob, time.time() + ttl, len(blob) + len(key)),
+            )
+        except sqlite3.Error:
+            # Another process holding the write lock past busy_timeout: the entry just isn't shared
+            self._count("errors")
+            return False
+        with self._stats_lock:
+            self.writes += 1
+            self.bytes_written += len(blob)
+            self._writes_since_prune += 1
+            prune = self._writes_since_prune >= PRUNE_EVERY
+            if prune:
+                self._writes_since_prune = 0
+        if prune:
+            self.prune()
+        return True
+
+    def delete(self, key):
+        try:
+            self._conn().execute("DELETE FROM shared_cache WHERE key = ?", (key,))
+        except sqlite3.Error:
+            self._count("errors")
+
+    def clear(self):
+        self._conn().execute("DELETE FROM shared_cache")
+
+    def prune(self):
+        """Drop expired rows, then the soonest-expiring ones while over max_bytes; returns rows removed."""
+        conn = self._conn()
+        try:
+            removed = conn.execute("DELETE FROM shared_cache WHERE expires_at <= ?", (time.time(),)).rowcount
+            total, rows = conn.execute("SELECT COALESCE(SUM(size), 0), COUNT(*) FROM shared_cache").fetchone()
+            if total > self.max_bytes and rows:
+                excess = (total - self.max_bytes) / total
+                limit = max(1, int(rows * min(1.0, excess + 0.1)))
+                removed += conn.execute(
+                    "DELETE FROM shared_cache WHERE key IN "
+                    "(SELECT key FROM shared_cache ORDER BY expires_at LIMIT ?)", (limit,)
+                ).rowcount
+        except sqlite3.Error:
+            self._count("errors")
+            return 0
+        return removed
+
+    def stats(self):
+        with self._stats_lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits, "misses": self.misses, "writes": self.writes, "errors": self.errors,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "bytes_written": self.bytes_written,
+            }
+
+    def storage(self):
+        """Rows and payload bytes currently in the shared file."""
+        rows, size = self._conn().execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM shared_cache").fetchone()
+        return {"entries": rows, "bytes": size, "max_bytes": self.max_bytes}
+
+
+# 🔍 Example: hit rate at 1 / 4 / 16 workers, per-process cache vs. shared tier
+def _bench_worker(args):
+    worker, workers, requests, shared_path = args
+    from product_cache import ProductCache
+
+    product = {"product_name": "Sample product", "nutriments": {f"n{i}_100g": i * 1.25 for i in range(25)},
+               "ingredients_text": "sugar, wheat flour, palm oil, milk solids, salt, emulsifier (e322)"}
+    shared = SharedCache(shared_path) if shared_path else None
+    cache = ProductCache(shared=shared)
+    hits = 0
+    for key in requests[worker::workers]:   # round-robin load balancing
+        if cache.get(key) is not None:
+            hits += 1
+        else:
+            cache.set(key, dict(product, code=key))
+    return hits, len(requests[worker::workers])
+
+
+if __name__ == "__main__":
+    import random
+    import tempfile
+    from multiprocessing import Pool
+
+    rng = random.Random(5)
+    catalog = [f"off:{8900000000000 + i}" for i in range(20_000)]
+    weights = [1 / (rank + 1) ** 0.9 for rank in range(len(catalog))]   # Zipf-like popularity
+    requests = rng.choices(catalog, weights=weights, k=80_000)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        print("workers | per-process hit rate | with shared tier | shared file")
+        for workers in (1, 4, 16):
+            rates = []
+            for shared_path in (None, os.path.join(tmp, f"shared_{workers}.db")):
+                start = time.perf_counter()
+                with Pool(workers) as pool:
+                    results = pool.map(_bench_worker, [(w, workers, requests, shared_path) for w in range(workers)])
+                hits = sum(h for h, _ in results)
+                rates.append((hits / len(requests), time.perf_counter() - start))
+            storage = SharedCache(shared_path).storage()
+            print(f"{workers:>7} | {rates[0][0]:>19.1%} | {rates[1][0]:>15.1%} | "
+                  f"{storage['entries']:,} entries, {storage['bytes'] / 1e6:.1f} MB ({rates[1][1]:.1f}s)")
@@ -0,0 +1,78 @@
+"""
+Tests for the compiled FSSAI additive limits
+============================================
+"""
+
+import pytest
+
+from additive_limits import (clean_additive_name, compile_limits, expand_additive_names, is_additive_name,
+                             lookup_limits, named_limits, parse_limit)
+
+
+@pytest.mark.parametrize("cell, expected", [
+    ("250 ppm max", {"status": "max", "limit_ppm": 250.0}),
+    ("0.5 g/kg", {"status": "max", "limit_ppm": 500.0}),
+    ("0.1 %", {"status": "max", "limit_ppm": 1000.0}),
+    ("GMP", {"status": "GMP", "limit_ppm": None}),
+])
+def test_parse_limit_normalizes_to_ppm(cell, expected):
+    assert parse_limit(cell) == dict(expected, raw=cell)
+
+
+@pytest.mark.parametrize("cell", ["", "-", " – ", "..."])
+def test_not_permitted_cells_have_no_limit(cell):
+    assert parse_limit(cell) is None
+
+
+def test_compound_labels_expand_into_single_additives():
+    assert expand_additive_names("benzoic acid/ sodium/ potassium benzoate")[1:] == [
+        "benzoic acid", "sodium benzoate", "potassium benzoate"]
+    assert expand_additive_names("sorbic acid and its sodium, potassium salts")[1:] == [
+        "sorbic acid", "sodium sorbate", "potassium sorbate"]
+
+
+def test_split_fragments_are_not_additives():
+    assert is_additive_name("sodium benzoate")
+    for fragment in ("citric", "both", "mono-", "1"):
+        assert not is_additive_name(fragment)
+
+
+def test_clean_additive_name_keeps_the_expressed_as_basis():
+    assert clean_additive_name("Potassium Sulphite\nexpressed as sulphur\ndioxide") == (
+        "potassium sulphite", "sulphur dioxide")
+
+
+def test_named_limits_in_product_rows():
+    found = named_limits("Sulphur dioxide- 70 ppm max or Benzoic acid- 120 ppm max")
+    assert [(name, limit["limit_ppm"]) for name, limit in found] == [("sulphur dioxide", 70.0), ("benzoic acid", 120.0)]
+
+
+def test_compile_limits_keys_by_table_column():
+    rows = [
+        ["", "", "(1)", "(2)"],
+        ["1", "Sodium benzoate", "250 ppm", "GMP"],
+        ["2", "Citric", "10 ppm", ""],
+    ]
+    table = compile_limits(rows, synonym_map={})
+    assert list(table["additives"]) == ["sodium benzoate"]
+    entry = table["additives"]["sodium benzoate"]
+    assert entry["ins"] == "e211"
+    assert entry["limits"]["1:1"]["limit_ppm"] == 250.0
+    assert entry["limits"]["1:2"]["status"] == "GMP"
+    assert table["aliases"] == {"e211": "sodium benzoate"}
+
+
+@pytest.mark.parametrize("query", ["sodium benzoate", "E211", "e-211", "INS 211", "ins 211"])
+def test_lookup_by_name_or_code(query):
+    assert lookup_limits(query)["name"] == "sodium benzoate"
+
+
+def test_lookup_for_one_category():
+    entry = lookup_limits("sodium benzoate")
+    category, limit = next(iter(entry["limits"].items()))
+    assert lookup_limits("INS 211", category) == limit
+    assert lookup_limits("INS 211", "no such category") is None
+
+
+def test_unknown_additive():
+    assert lookup_limits("xyzzy") is None
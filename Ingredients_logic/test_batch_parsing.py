@@ -0,0 +1,55 @@
+"""
+Tests for catalog-scale batch parsing
+=====================================
+"""
+
+import ingredient_parser
+from ingredient_parser import parse_ingredients, parse_ingredients_batch
+
+LABELS = [
+    "Sugar, Salt, Stabilizers(INS 412,INS 415)",
+    "Salt, Xyzzy Powder, Herbs(0.8%)",
+    "Sugar, Sugar",
+]
+
+
+def test_each_unique_ingredient_is_resolved_once(parser_cache, monkeypatch):
+    calls = []
+    real = ingredient_parser.process_ingredient
+    monkeypatch.setattr(ingredient_parser, "process_ingredient", lambda ing: calls.append(ing) or real(ing))
+
+    stats = {}
+    parse_ingredients_batch(LABELS, stats=stats)
+
+    assert sorted(calls) == sorted(set(calls))
+    assert stats["labels"] == 3
+    assert stats["unique_ingredients"] == 6
+    assert stats["resolved"] == len(calls) == 6
+    assert stats["cache_hits"] == 0
+
+
+def test_batch_results_match_parse_ingredients(parser_cache):
+    batch = parse_ingredients_batch(LABELS)
+    parser_cache.clear()
+    assert batch == [parse_ingredients(text) for text in LABELS]
+
+
+def test_second_batch_is_served_from_the_cache(parser_cache):
+    # E211 resolves from the local knowledge base; offline placeholders would not be cached
+    parse_ingredients_batch(["Preservative(E211)"])
+    stats = {}
+    parse_ingredients_batch(["Preservative(E211)"], stats=stats)
+    assert stats["resolved"] == 0
+    assert stats["cache_hits"] == stats["unique_ingredients"] == 1
+
+
+def test_offline_placeholders_are_not_cached(parser_cache):
+    (result,) = parse_ingredients_batch(["Xyzzy Powder"])
+    assert result["xyzzy powder"]["source"] == "offline"
+    assert parser_cache.get("xyzzy powder") is None
+
+
+def test_process_pool_matches_serial_results(parser_cache):
+    serial = parse_ingredients_batch(LABELS)
+    parser_cache.clear()
+    assert parse_ingredients_batch(LABELS, processes=2) == serial
@@ -0,0 +1,86 @@
+"""
+Tests for the write-behind ingredient cache store
+=================================================
+"""
+
+import json
+
+import cache_store
+from cache_store import IngredientCacheStore
+
+
+def make_store(tmp_path, **kwargs):
+    kwargs.setdefault("flush_interval", 60)
+    return IngredientCacheStore(str(tmp_path / "cache.db"), **kwargs)
+
+
+def test_puts_are_buffered_until_flush_and_survive_reopen(tmp_path):
+    store = make_store(tmp_path)
+    store.put("Sugar", {"common_name": "Sugar"})
+    assert store.get("sugar") == {"common_name": "Sugar"}
+    assert store.flush() == 1
+    assert store.flush() == 0
+    store.close()
+
+    reopened = make_store(tmp_path)
+    try:
+        assert reopened.get("SUGAR") == {"common_name": "Sugar"}
+        assert len(reopened) == 1
+    finally:
+        reopened.close()
+
+
+def test_close_flushes_pending_writes(tmp_path):
+    store = make_store(tmp_path)
+    store.put("salt", {"common_name": "Salt"})
+    store.close()
+
+    reopened = make_store(tmp_path)
+    try:
+        assert "salt" in reopened
+    finally:
+        reopened.close()
+
+
+def test_empty_store_is_seeded_from_the_json_snapshot(tmp_path):
+    seed = tmp_path / "seed.json"
+    seed.write_text(json.dumps({"Palm Oil": {"common_name": "Palm Oil"}}))
+    store = make_store(tmp_path, seed_file=str(seed))
+    try:
+        assert store.get("palm oil") == {"common_name": "Palm Oil"}
+    finally:
+        store.close()
+
+
+def test_compact_rewrites_the_snapshot_atomically(tmp_path):
+    snapshot = tmp_path / "snapshot.json"
+    store = make_store(tmp_path)
+    try:
+        store.put("b", {"n": 2})
+        store.put("a", {"n": 1})
+        store.compact(snapshot_path=str(snapshot))
+        assert json.loads(snapshot.read_text()) == {"a": {"n": 1}, "b": {"n": 2}}
+        assert not list(tmp_path.glob(".ingredient_cache.*"))
+    finally:
+        store.close()
+
+
+def test_invalidate_drops_matching_entries(tmp_path):
+    store = make_store(tmp_path)
+    try:
+        store.put("e330", {"risk_level": "low"})
+        store.put("e250", {"risk_level": "high"})
+        assert store.invalidate(lambda key, value: value["risk_level"] == "high") == 1
+        assert store.get("e250") is None
+        assert store.get("e330") == {"risk_level": "low"}
+    finally:
+        store.close()
+
+
+def test_compaction_is_on_by_default(tmp_path):
+    store = make_store(tmp_path)
+    try:
+        assert store.compact_interval == cache_store.COMPACT_INTERVAL
+        assert cache_store.COMPACT_INTERVAL > 0
+    finally:
+        store.close()
@@ -0,0 +1,69 @@
+"""
+Tests for the tree ingredient tokenizer
+=======================================
+"""
+
+import pytest
+
+from ingredient_tokenizer import iter_leaves, leaf_names, lookup_savings, tokenize_ingredients
+
+
+def leaves(text):
+    return [(name, node["percent"], cls) for name, node, cls in iter_leaves(tokenize_ingredients(text))]
+
+
+@pytest.mark.parametrize("text", [
+    "Sugar, Wheat Flour, Salt",
+    "Water,Iodised salt , Refined Soyabean Oil",
+    "milk solids",
+])
+def test_flat_lists_match_the_old_comma_split(text):
+    assert leaf_names(text) == [item.strip().lower() for item in text.split(",")]
+    assert lookup_savings(text)["wasted_naive_lookups"] == 0
+
+
+def test_nested_groups_classes_and_percentages():
+    text = "Vegetable[Tomato Paste(36%)],Water,Stabilizers(INS 412,INS 415),Herbs(0.8%)"
+    assert leaves(text) == [
+        ("tomato paste", 36.0, "vegetable"),
+        ("water", None, None),
+        ("ins 412", None, "stabilizers"),
+        ("ins 415", None, "stabilizers"),
+        ("herbs", 0.8, None),
+    ]
+
+
+def test_class_prefix_with_colon():
+    assert leaves("Emulsifier: Soy Lecithin") == [("soy lecithin", None, "emulsifier")]
+
+
+def test_and_or_lists_share_the_trailing_noun():
+    assert leaf_names("Palm and/or Sunflower Oil") == ["palm oil", "sunflower oil"]
+
+
+def test_additive_sub_index_is_not_an_ingredient():
+    assert leaves("Raising Agent (INS 500(ii))") == [("ins 500", None, "raising agent")]
+
+
+def test_and_between_additive_codes_inside_a_class():
+    assert leaf_names("Emulsifiers (INS 322 and INS 471)") == ["ins 322", "ins 471"]
+
+
+def test_compound_ingredient_yields_itself_and_its_parts():
+    assert leaf_names("Chocolate (Sugar, Cocoa Butter), Sugar") == ["chocolate", "sugar", "cocoa butter"]
+
+
+def test_unbalanced_brackets_are_tolerated():
+    assert leaf_names("Salt), (Sugar") == ["salt", "sugar"]
+
+
+def test_lookup_savings_reports_broken_comma_tokens():
+    stats = lookup_savings("Stabilizers(INS 412,INS 415),Water")
+    assert stats["naive_lookups"] == 3
+    assert stats["tree_lookups"] == 3
+    assert stats["wasted_tokens"] == ["stabilizers(ins 412", "ins 415)"]
+
+
+def test_empty_text():
+    assert tokenize_ingredients("") == []
+    assert tokenize_ingredients(None) == []
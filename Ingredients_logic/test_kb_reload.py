@@ -0,0 +1,80 @@
+"""
+Tests for knowledge-base hot reload
+===================================
+"""
+
+import json
+import os
+
+import pytest
+
+import knowledge_base
+from knowledge_base import KnowledgeBase, build, get_kb, on_change, reload, reload_async
+
+
+@pytest.fixture
+def live_kb(kb_sources, tmp_path, monkeypatch):
+    """A scratch artifact installed as the shared KB, with no listeners registered."""
+    path = str(tmp_path / "kb.kb")
+    build(path)
+    monkeypatch.setattr(knowledge_base, "_kb", KnowledgeBase.open(path))
+    monkeypatch.setattr(knowledge_base, "_listeners", [])
+    return path
+
+
+def edit_synonyms(kb_sources, mapping):
+    synonyms = kb_sources / "Ingredients_logic" / "synonym_map.json"
+    synonyms.write_text(json.dumps(mapping))
+    os.utime(synonyms, ns=(0, 0))
+
+
+def test_reload_without_changes_keeps_the_current_kb(live_kb):
+    before = get_kb()
+    assert reload(live_kb) == (before.version, [])
+    assert get_kb() is before
+
+
+def test_reload_swaps_in_the_new_sources(kb_sources, live_kb):
+    before = get_kb()
+    edit_synonyms(kb_sources, {"kb test alias": "sugar"})
+    version, changed = reload(live_kb)
+    assert version != before.version
+    assert "synonym_map" in changed
+    assert "health_rules" not in changed
+    assert get_kb().section("synonym_map") == {"kb test alias": "sugar"}
+
+
+def test_only_listeners_of_changed_sections_are_called(kb_sources, live_kb):
+    calls = []
+    on_change(["synonym_map"], lambda kb, changed: calls.append(("synonyms", changed)))
+    on_change(["health_rules"], lambda kb, changed: calls.append(("rules", changed)))
+    edit_synonyms(kb_sources, {"kb test alias": "sugar"})
+    _, changed = reload(live_kb)
+    assert calls == [("synonyms", changed)]
+
+
+def test_failing_listener_does_not_stop_the_others(kb_sources, live_kb):
+    calls = []
+    on_change(["synonym_map"], lambda kb, changed: 1 / 0)
+    on_change(["synonym_map"], lambda kb, changed: calls.append(kb.version))
+    edit_synonyms(kb_sources, {})
+    version, _ = reload(live_kb)
+    assert calls == [version]
+
+
+def test_swapped_out_kb_stays_readable(kb_sources, live_kb):
+    old = get_kb()
+    decoded = old.section("ingredient_db")
+    edit_synonyms(kb_sources, {"kb test alias": "sugar"})
+    reload(live_kb)
+    # Decoded sections survive the close; undecoded ones are served by the new KB
+    assert old.section("ingredient_db") is decoded
+    assert old.section("synonym_map") == {"kb test alias": "sugar"}
+
+
+def test_reload_async_does_not_start_while_a_reload_runs(live_kb):
+    with knowledge_base._reload_lock:
+        assert reload_async(live_kb) is None
+    thread = reload_async(live_kb)
+    thread.join(10)
+    assert not thread.is_alive()
@@ -0,0 +1,77 @@
+"""
+Tests for the compiled knowledge-base artifact
+==============================================
+"""
+
+import json
+import os
+
+import pytest
+
+import knowledge_base
+from knowledge_base import KnowledgeBase, build, load
+
+
+def test_build_round_trips_every_section(kb_sources, tmp_path):
+    path = str(tmp_path / "kb.kb")
+    version = build(path)
+    kb = KnowledgeBase.open(path)
+    try:
+        assert kb.version == version
+        with open(kb_sources / "Ingredients_logic" / "ingredient_db.json", encoding="utf-8") as f:
+            assert kb.section("ingredient_db") == json.load(f)
+        assert set(kb.section_hashes()) == {
+            "ingredient_db", "synonym_map", "resolved_synonyms", "fuzzy_keys", "api_synonyms",
+            "harmful_ingredients", "safe_ingredients", "allergen_synonyms", "allergen_info",
+            "allergen_terms", "health_rules", "additive_limits",
+        }
+        assert not kb.is_stale()
+    finally:
+        kb.close()
+
+
+def test_sections_decode_lazily_and_are_memoized(kb_sources):
+    kb = KnowledgeBase(knowledge_base.build_blob())
+    assert kb._decoded == {}
+    first = kb.section("synonym_map")
+    assert kb.section("synonym_map") is first
+    assert list(kb._decoded) == ["synonym_map"]
+
+
+def test_resolved_synonyms_only_point_into_the_db(kb_sources):
+    kb = KnowledgeBase(knowledge_base.build_blob())
+    db = kb.section("ingredient_db")
+    assert all(key in db for key in kb.section("resolved_synonyms").values())
+
+
+def test_same_sources_give_the_same_version(kb_sources, tmp_path):
+    assert build(str(tmp_path / "a.kb")) == build(str(tmp_path / "b.kb"))
+
+
+def test_editing_a_source_makes_the_artifact_stale(kb_sources, tmp_path):
+    path = str(tmp_path / "kb.kb")
+    build(path)
+    kb = KnowledgeBase.open(path)
+    try:
+        synonyms = kb_sources / "Ingredients_logic" / "synonym_map.json"
+        synonyms.write_text(json.dumps({"kb test alias": "sugar"}))
+        os.utime(synonyms, ns=(0, 0))
+        assert kb.is_stale()
+    finally:
+        kb.close()
+
+
+def test_load_rebuilds_a_corrupt_artifact(kb_sources, tmp_path):
+    path = tmp_path / "kb.kb"
+    path.write_bytes(b"not a knowledge base")
+    kb = load(str(path))
+    try:
+        assert not kb.is_stale()
+        assert path.read_bytes().startswith(knowledge_base.MAGIC)
+    finally:
+        kb.close()
+
+
+def test_rejects_foreign_buffers():
+    with pytest.raises(ValueError):
+        KnowledgeBase(b"NOPE" + bytes(8))
@@ -0,0 +1,89 @@
+"""
+Tests for the Prometheus metrics
+================================
+"""
+
+import pytest
+
+import metrics
+from metrics import Counter, Gauge, Histogram, Registry, upstream_call
+
+
+@pytest.fixture
+def registry():
+    return Registry()
+
+
+def sample(text, line_start):
+    return [line for line in text.splitlines() if line.startswith(line_start)]
+
+
+def test_counter_and_gauge_exposition(registry):
+    hits = Counter("demo_hits_total", "Demo hits.", ("cache",), registry=registry)
+    hits.labels("product").inc()
+    hits.labels("product").inc(2)
+    depth = Gauge("demo_depth", "Demo depth.", registry=registry)
+    depth.inc(5)
+    depth.dec(2)
+    text = registry.render()
+    assert "# HELP demo_hits_total Demo hits.\n# TYPE demo_hits_total counter" in text
+    assert 'demo_hits_total{cache="product"} 3' in text
+    assert "demo_depth 3" in text.splitlines()
+
+
+def test_histogram_buckets_are_cumulative(registry):
+    latency = Histogram("demo_seconds", "Demo latency.", ("route",), buckets=(0.1, 0.01), registry=registry)
+    for value in (0.005, 0.01, 0.05, 2.0):
+        latency.labels("/x").observe(value)
+    lines = sample(registry.render(), "demo_seconds_")
+    assert lines == [
+        'demo_seconds_bucket{route="/x",le="0.01"} 2',
+        'demo_seconds_bucket{route="/x",le="0.1"} 3',
+        'demo_seconds_bucket{route="/x",le="+Inf"} 4',
+        'demo_seconds_sum{route="/x"} 2.065',
+        'demo_seconds_count{route="/x"} 4',
+    ]
+
+
+def test_label_values_are_escaped(registry):
+    counter = Counter("demo_total", "Demo.", ("name",), registry=registry)
+    counter.labels('say "hi"\\\n').inc()
+    assert 'demo_total{name="say \\"hi\\"\\\\\\n"} 1' in registry.render()
+
+
+def test_misuse_is_refused(registry):
+    counter = Counter("demo_total", "Demo.", ("a", "b"), registry=registry)
+    with pytest.raises(ValueError, match="expects labels"):
+        counter.labels("only-one")
+    with pytest.raises(ValueError, match="already registered"):
+        Counter("demo_total", "Again.", registry=registry)
+
+
+def test_collectors_run_at_scrape_time_and_failures_are_skipped(registry):
+    state = {"entries": 1}
+    registry.register_collector(lambda: [("demo_entries", "gauge", "Entries.", [({"tier": "local"}, state["entries"])])])
+    registry.register_collector(lambda: 1 / 0)
+    state["entries"] = 7
+    text = registry.render()
+    assert 'demo_entries{tier="local"} 7' in text
+
+
+def test_upstream_call_outcomes_and_request_tally():
+    def count(outcome):
+        return metrics.UPSTREAM_REQUESTS.labels("upstream.test", "demo", outcome).value
+
+    before = {o: count(o) for o in ("2xx", "5xx", "error")}
+    calls, token = metrics.track_upstream_calls()
+    try:
+        with upstream_call("upstream.test", "demo") as call:
+            call.status = 200
+        with upstream_call("upstream.test", "demo") as call:
+            call.status = 503
+        with pytest.raises(OSError):
+            with upstream_call("upstream.test", "demo"):
+                raise OSError("connection reset")
+    finally:
+        metrics.untrack_upstream_calls(token)
+    assert calls == {"upstream.test": 3}
+    assert {o: count(o) - before[o] for o in before} == {"2xx": 1, "5xx": 1, "error": 1}
+    assert metrics.UPSTREAM_IN_FLIGHT.labels("upstream.test").value == 0
@@ -0,0 +1,58 @@
+"""
+Tests for offline mode
+======================
+"""
+
+import os
+
+import pytest
+
+import ingredient_parser
+import openfood_api
+from offline_mode import OFFLINE_ENV, OFFLINE_SOURCE, is_offline, is_offline_result, offline, set_offline
+
+
+def test_offline_context_restores_the_previous_setting(monkeypatch):
+    monkeypatch.delenv(OFFLINE_ENV, raising=False)
+    assert not is_offline()
+    with offline():
+        assert is_offline()
+        with offline(False):
+            assert not is_offline()
+        assert is_offline()
+    assert OFFLINE_ENV not in os.environ
+
+
+@pytest.mark.parametrize("value, expected", [("1", True), ("TRUE", True), (" yes ", True), ("0", False), ("", False)])
+def test_environment_switch(monkeypatch, value, expected):
+    monkeypatch.setenv(OFFLINE_ENV, value)
+    assert is_offline() is expected
+
+
+def test_set_offline_goes_through_the_environment(monkeypatch):
+    monkeypatch.delenv(OFFLINE_ENV, raising=False)
+    set_offline(True)
+    assert os.environ[OFFLINE_ENV] == "1"
+    set_offline(False)
+    assert not is_offline()
+
+
+def test_network_sources_are_skipped_up_front(offline_env, monkeypatch):
+    def no_network(*args, **kwargs):
+        raise AssertionError("network used in offline mode")
+
+    monkeypatch.setattr(openfood_api.requests, "get", no_network)
+    monkeypatch.setattr(openfood_api.wikipedia, "summary", no_network)
+    assert openfood_api.fetch_from_wikipedia("sugar") is None
+    assert openfood_api.fetch_from_openfoodfacts("sugar") is None
+    assert openfood_api.fetch_ingredient_info("sugar")["source"] == OFFLINE_SOURCE
+
+
+def test_parsing_offline_never_races_the_sources(parser_cache, monkeypatch):
+    monkeypatch.setattr(ingredient_parser, "fetch_ingredient_info", pytest.fail)
+    result = ingredient_parser.parse_ingredients("Xyzzy Powder, E211")
+    assert is_offline_result(result["xyzzy powder"])
+    assert not is_offline_result(result["e211"])
+    # Placeholders are not cached, local answers are
+    assert parser_cache.get("xyzzy powder") is None
+    assert parser_cache.get("e211") is not None
@@ -0,0 +1,91 @@
+"""
+Tests for the concurrent source race
+====================================
+
+Both sources are replaced with fakes, so nothing here touches the network.
+"""
+
+import queue
+import time
+
+import pytest
+
+import openfood_api
+from offline_mode import FALLBACK_SOURCE, OFFLINE_ENV, is_placeholder_result, offline
+from openfood_api import fetch_ingredient_info, get_source_stats, race_sources, reset_source_stats
+
+
+def fake_source(answer, delay=0.0, error=None):
+    def fetch(name, **kwargs):
+        time.sleep(delay)
+        if error is not None:
+            raise error
+        return answer
+    return fetch
+
+
+@pytest.fixture
+def sources(monkeypatch):
+    """Install fake sources: sources(wikipedia=fetch, off=fetch)."""
+    monkeypatch.delenv(OFFLINE_ENV, raising=False)
+    reset_source_stats()
+
+    def install(wikipedia, off):
+        monkeypatch.setattr(openfood_api, "fetch_from_wikipedia", wikipedia)
+        monkeypatch.setattr(openfood_api, "fetch_from_openfoodfacts", off)
+
+    yield install
+    reset_source_stats()
+
+
+def test_best_source_wins_within_the_grace_window(sources):
+    sources(wikipedia=fake_source("Wiki text", delay=0.05), off=fake_source("OFF text"))
+    assert race_sources("sugar", deadline=1.0, grace=0.5) == ("Wikipedia", "Wiki text")
+
+
+def test_lesser_answer_is_kept_when_the_grace_window_runs_out(sources):
+    sources(wikipedia=fake_source("Wiki text", delay=0.5), off=fake_source("OFF text"))
+    start = time.monotonic()
+    assert race_sources("sugar", deadline=2.0, grace=0.05) == ("OpenFoodFacts", "OFF text")
+    assert time.monotonic() - start < 0.4
+    assert get_source_stats()["Wikipedia"]["late"] == 1
+
+
+def test_misses_and_errors_fall_through_to_the_other_source(sources):
+    sources(wikipedia=fake_source(None, error=OSError("down")), off=fake_source("OFF text"))
+    assert race_sources("sugar", deadline=1.0, grace=0.1) == ("OpenFoodFacts", "OFF text")
+    stats = get_source_stats()
+    assert stats["Wikipedia"]["errors"] == 1
+    assert stats["OpenFoodFacts"]["wins"] == 1
+
+
+def test_nothing_waits_past_the_deadline(sources):
+    sources(wikipedia=fake_source("late", delay=0.5), off=fake_source("late", delay=0.5))
+    start = time.monotonic()
+    assert race_sources("sugar", deadline=0.1) == (None, None)
+    assert time.monotonic() - start < 0.4
+
+
+def test_fallback_result_is_a_placeholder(sources):
+    sources(wikipedia=fake_source(None), off=fake_source(None))
+    result = fetch_ingredient_info("xyzzy")
+    assert result["source"] == FALLBACK_SOURCE
+    assert is_placeholder_result(result)
+
+
+def test_calls_queued_past_the_deadline_are_skipped():
+    calls, results = [], queue.Queue()
+    openfood_api._run_source("Wikipedia", calls.append, "sugar", results, time.monotonic() - 1)
+    assert calls == []
+    assert results.get_nowait() == ("Wikipedia", None)
+
+
+def test_fallback_result_is_not_cached(sources, parser_cache):
+    import ingredient_parser
+
+    sources(wikipedia=fake_source(None), off=fake_source(None))
+    with offline(False):    # parser_cache runs offline; this placeholder must come from the race
+        result = fetch_ingredient_info("xyzzy")
+    assert result["source"] == FALLBACK_SOURCE
+    ingredient_parser.cache_result("xyzzy", result)
+    assert parser_cache.get("xyzzy") is None
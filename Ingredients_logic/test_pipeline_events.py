@@ -0,0 +1,96 @@
+"""
+Tests for structured pipeline events
+====================================
+"""
+
+import io
+import json
+
+import pytest
+
+import pipeline_events
+from pipeline_events import Aggregator, JsonLinesSink, attach_sink, count, detach_sink, emit, enabled, stage
+
+
+@pytest.fixture
+def events():
+    """Collect every event emitted during the test."""
+    seen = []
+    attach_sink(seen.append)
+    yield seen
+    detach_sink(seen.append)
+
+
+def test_nothing_is_recorded_without_a_sink():
+    assert not enabled()
+    assert stage("fuzzy_match") is pipeline_events._NULL_STAGE
+    count("cache_hit")
+
+
+def test_stage_emits_its_duration_and_fields(events):
+    with stage("fuzzy_match", ingredient="sugar"):
+        pass
+    (event,) = events
+    assert event["event"] == "stage"
+    assert event["name"] == "fuzzy_match"
+    assert event["ingredient"] == "sugar"
+    assert event["duration_ms"] >= 0
+    assert "error" not in event
+
+
+def test_stage_records_the_exception_and_lets_it_propagate(events):
+    with pytest.raises(KeyError):
+        with stage("api_fallback"):
+            raise KeyError("x")
+    assert events[0]["error"] == "KeyError"
+
+
+def test_failing_sink_does_not_break_the_pipeline(events):
+    def broken(event):
+        raise RuntimeError("sink down")
+
+    attach_sink(broken)
+    try:
+        count("cache_miss", 2)
+    finally:
+        detach_sink(broken)
+    assert [(e["name"], e["value"]) for e in events] == [("cache_miss", 2)]
+
+
+def test_aggregator_totals():
+    agg = attach_sink(Aggregator())
+    try:
+        for duration in (1.0, 3.0):
+            emit({"event": "stage", "name": "normalize", "duration_ms": duration, "ts": 0})
+        count("cache_hit")
+        count("cache_hit", 4)
+    finally:
+        detach_sink(agg)
+    snapshot = agg.snapshot()
+    assert snapshot["stages"]["normalize"] == {"count": 2, "total_ms": 4.0, "avg_ms": 2.0, "max_ms": 3.0}
+    assert snapshot["counters"] == {"cache_hit": 5}
+    assert not enabled()
+
+
+def test_json_lines_sink_writes_one_event_per_line():
+    out = io.StringIO()
+    sink = attach_sink(JsonLinesSink(out))
+    try:
+        count("local_hit", ingredient="salt")
+    finally:
+        detach_sink(sink)
+    (line,) = out.getvalue().splitlines()
+    assert json.loads(line)["ingredient"] == "salt"
+
+
+def test_parser_reports_its_stages(parser_cache):
+    import ingredient_parser
+
+    agg = attach_sink(Aggregator())
+    try:
+        ingredient_parser.parse_ingredients("E211, E211")
+    finally:
+        detach_sink(agg)
+    snapshot = agg.snapshot()
+    assert snapshot["counters"]["cache_miss"] == 1
+    assert {"cache_lookup", "normalize", "fuzzy_match"} <= set(snapshot["stages"])
@@ -0,0 +1,125 @@
+"""
+Tests for the TinyLFU product cache
+===================================
+
+With max_bytes=1000 and one segment the window holds nothing (budget 10 bytes),
+so every set goes straight to admission against a main area of 990 bytes.
+"""
+
+import pytest
+
+from product_cache import ENTRY_OVERHEAD, CountMinSketch, ProductCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def item(size=200):
+    return {"size": size - ENTRY_OVERHEAD}
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def cache(clock):
+    return ProductCache(max_bytes=1000, ttl_seconds=60, segments=1, sizeof=lambda v: v["size"], clock=clock)
+
+
+def request(cache, key, times):
+    for _ in range(times):
+        cache.get(key)
+
+
+def test_get_set_and_stats(cache):
+    assert cache.get("a") is None
+    assert cache.set("a", item())
+    assert cache.get("a") == item()
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"], stats["bytes"]) == (1, 1, 1, 200)
+    assert stats["hit_rate"] == 0.5
+
+
+def test_one_off_keys_cannot_flush_popular_ones(cache):
+    popular = [f"popular-{i}" for i in range(4)]
+    for key in popular:
+        request(cache, key, 3)
+        cache.set(key, item())
+    for i in range(50):
+        cache.set(f"one-off-{i}", item())
+    assert all(key in cache for key in popular)
+    assert cache.stats()["evictions"] == 50
+
+
+def test_frequently_requested_newcomer_is_admitted(cache):
+    for key in ("a", "b", "c", "d"):
+        request(cache, key, 1)
+        cache.set(key, item())
+    request(cache, "hot", 5)
+    cache.set("hot", item())
+    assert "hot" in cache
+    assert "a" not in cache      # the main area's LRU victim made room
+    assert len(cache) == 4
+
+
+def test_rejected_candidate_evicts_nothing(cache):
+    # The candidate needs both LRU victims; the second is more popular, so neither may go
+    cache.set("cold", item(400))
+    request(cache, "warm", 10)
+    cache.set("warm", item(400))
+    request(cache, "big", 3)
+    cache.set("big", item(600))
+    assert "big" not in cache
+    assert "cold" in cache and "warm" in cache
+
+
+def test_entries_expire_on_the_cache_clock(cache, clock):
+    cache.set("a", item(), ttl=10)
+    clock.now += 9.9
+    assert "a" in cache
+    clock.now += 0.2
+    assert "a" not in cache
+    assert cache.get("a") is None
+    assert cache.stats()["expirations"] == 1
+
+
+def test_expired_entries_make_room_for_free(cache, clock):
+    for key in ("a", "b", "c", "d"):
+        request(cache, key, 5)
+        cache.set(key, item(), ttl=1)
+    clock.now += 2
+    cache.set("new", item())
+    assert "new" in cache
+    assert cache.stats()["expirations"] == 1
+
+
+def test_values_larger_than_the_budget_are_refused(cache):
+    assert cache.set("huge", item(5000)) is False
+    assert cache.stats()["rejections"] == 1
+    assert "huge" not in cache
+
+
+def test_delete_and_clear(cache):
+    cache.set("a", item())
+    assert cache.delete("a") is True
+    assert cache.delete("a") is False
+    cache.set("b", item())
+    cache.clear()
+    assert len(cache) == 0 and cache.stats()["bytes"] == 0
+
+
+def test_sketch_counts_saturate_and_age():
+    sketch = CountMinSketch(64)
+    for _ in range(40):
+        sketch.increment("k")
+    assert sketch.frequency("k") == 15
+    assert sketch.frequency("other") <= sketch.frequency("k")
+    sketch._age()
+    assert sketch.frequency("k") == 7
@@ -0,0 +1,58 @@
+"""
+Tests for the sampling profiler
+===============================
+"""
+
+import time
+
+from sampling_profiler import SamplingProfiler
+
+
+def busy_leaf(seconds):
+    deadline = time.perf_counter() + seconds
+    n = 0
+    while time.perf_counter() < deadline:
+        n += 1
+    return n
+
+
+def busy_caller(seconds):
+    return busy_leaf(seconds)
+
+
+def test_registered_thread_is_sampled():
+    with SamplingProfiler(interval=0.001) as profiler:
+        busy_caller(0.2)
+    assert profiler.samples > 0
+    assert profiler.duration >= 0.2
+    hottest = profiler.top(1)[0][0]
+    assert hottest.startswith("busy_leaf (test_sampling_profiler.py:")
+    assert any("busy_caller" in stack and "busy_leaf" in stack for stack in profiler.stacks)
+
+
+def test_unregistered_threads_are_not_sampled():
+    profiler = SamplingProfiler(interval=0.001).start()
+    busy_caller(0.05)
+    profiler.stop()
+    assert profiler.samples == 0 and not profiler.stacks
+
+
+def test_folded_output_has_the_root_frame(tmp_path):
+    with SamplingProfiler(interval=0.001) as profiler:
+        busy_caller(0.1)
+    lines = profiler.folded(root="GET /scan;barcode").splitlines()
+    assert lines and all(line.startswith("GET /scan,barcode;") for line in lines)
+    assert sum(int(line.rsplit(" ", 1)[1]) for line in lines) == profiler.samples
+    path = profiler.save(str(tmp_path / "profiles" / "p.folded"), root="demo")
+    with open(path, encoding="utf-8") as f:
+        assert f.read() == profiler.folded(root="demo")
+
+
+def test_stacks_are_cut_at_max_depth():
+    def recurse(depth):
+        return busy_leaf(0.1) if depth == 0 else recurse(depth - 1)
+
+    with SamplingProfiler(interval=0.001, max_depth=5) as profiler:
+        recurse(20)
+    assert profiler.samples > 0
+    assert all(len(stack.split(";")) <= 5 for stack in profiler.stacks)
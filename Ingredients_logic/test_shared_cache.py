@@ -0,0 +1,90 @@
+"""
+Tests for the cross-process shared cache tier
+=============================================
+"""
+
+import multiprocessing
+import time
+
+import pytest
+
+import shared_cache
+from product_cache import ProductCache
+from shared_cache import SharedCache, decode, encode
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "shared.db")
+
+
+@pytest.mark.parametrize("value", [{"a": 1}, {"text": "sugar " * 200}, ["é", None, 1.5]])
+def test_encode_round_trip(value):
+    blob = encode(value)
+    assert blob[:1] in (b"j", b"z")
+    assert decode(blob) == value
+
+
+def test_large_values_are_compressed():
+    assert encode({"text": "sugar " * 200})[:1] == b"z"
+    assert encode({"a": 1})[:1] == b"j"
+
+
+def test_get_returns_value_and_wall_clock_expiry(path):
+    cache = SharedCache(path)
+    cache.set("off:1", {"name": "x"}, ttl=60)
+    value, expires_at = cache.get("off:1")
+    assert value == {"name": "x"}
+    assert expires_at == pytest.approx(time.time() + 60, abs=5)
+    cache.set("off:2", {"name": "y"}, ttl=-1)
+    assert cache.get("off:2") is None
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+
+def test_prune_drops_expired_then_soonest_expiring(path):
+    cache = SharedCache(path, max_bytes=2000)
+    cache.set("expired", {"v": 0}, ttl=-1)
+    for i in range(20):
+        cache.set(f"k{i}", {"v": "x" * 150}, ttl=100 + i)
+    removed = cache.prune()
+    assert removed >= 1
+    storage = cache.storage()
+    assert storage["bytes"] <= 2000
+    assert cache.get("k19") is not None and cache.get("k0") is None
+
+
+def test_second_product_cache_reads_the_first_ones_entries(path):
+    worker_a = ProductCache(shared=SharedCache(path))
+    worker_b = ProductCache(shared=SharedCache(path))
+    worker_a.set("off:890", {"product_name": "Choco"}, ttl=300)
+    assert worker_b.get("off:890") == {"product_name": "Choco"}
+    assert worker_b.stats()["shared_hits"] == 1
+    # Now held locally as well
+    assert "off:890" in worker_b
+    worker_b.delete("off:890")
+    assert worker_a.shared.get("off:890") is None
+
+
+def _write_in_child(path):
+    SharedCache(path).set("from-child", {"pid": "child"}, ttl=60)
+
+
+def test_entries_cross_process_boundaries(path):
+    SharedCache(path)   # create the schema first
+    process = multiprocessing.get_context("spawn").Process(target=_write_in_child, args=(path,))
+    process.start()
+    process.join(30)
+    assert process.exitcode == 0
+    assert SharedCache(path).get("from-child")[0] == {"pid": "child"}
+
+
+def test_database_errors_are_counted_not_raised(path, monkeypatch):
+    cache = SharedCache(path)
+
+    def locked():
+        raise shared_cache.sqlite3.OperationalError("database is locked")
+
+    monkeypatch.setattr(cache, "_conn", locked)
+    assert cache.set("k", {}, ttl=1) is False
+    assert cache.get("k") is None
+    assert cache.stats()["errors"] == 2
@@ -0,0 +1,90 @@
+"""
+Tests for request tracing
+=========================
+"""
+
+import pytest
+
+import tracing
+from tracing import SERVER_TIMING_MAX, end_trace, span, start_span, start_trace
+
+
+@pytest.fixture
+def trace():
+    trace, token = start_trace("t1")
+    yield trace
+    if tracing.active():
+        end_trace(token)
+
+
+def by_name(trace):
+    return {s["name"]: s for s in trace.spans}
+
+
+def test_spans_are_no_ops_without_a_trace():
+    assert not tracing.active()
+    with span("stage", key="value") as s:
+        s.set("more", 1)
+    start_span("manual").finish()
+
+
+def test_spans_nest_and_record_their_attributes(trace):
+    with span("outer", barcode="123"):
+        with span("inner") as inner:
+            inner.set("status", 200)
+        step = start_span("manual")
+        step.finish()
+    spans = by_name(trace)
+    assert spans["outer"]["parent"] is None
+    assert spans["inner"]["parent"] == spans["manual"]["parent"] == spans["outer"]["id"]
+    assert spans["outer"]["attrs"] == {"barcode": "123"}
+    assert spans["inner"]["attrs"] == {"status": 200}
+
+
+def test_span_closes_and_records_the_error_when_the_block_raises(trace):
+    with pytest.raises(KeyError):
+        with span("failing"):
+            raise KeyError("x")
+    with span("after"):
+        pass
+    spans = by_name(trace)
+    assert spans["failing"]["error"] == "KeyError"
+    assert spans["after"]["parent"] is None     # the failed span no longer is the current one
+
+
+def test_server_timing_is_a_safe_header_value(trace):
+    for hostile in ("crème fraîche", "jaggery (गुड़)", 'a\r\nX-Injected: 1 "quoted"', "50% cocoa\\"):
+        with span("ingredient lookup", ingredient=hostile):
+            pass
+    header = trace.server_timing()
+    header.encode("latin-1")
+    assert "\r" not in header and "\n" not in header
+    assert '"quoted"' not in header and "\\" not in header
+    assert "ingredient_lookup;dur=" in header
+    assert "cr%C3%A8me fra%C3%AEche" in header
+    assert "50%25 cocoa" in header
+
+
+def test_server_timing_keeps_the_longest_spans(trace):
+    for i in range(SERVER_TIMING_MAX + 10):
+        with span(f"s{i}"):
+            pass
+    trace.spans[0]["duration_ms"] = 10_000.0
+    header = trace.server_timing()
+    entries = header.split(", ")
+    assert entries[0].startswith("total;dur=")
+    assert len(entries) == SERVER_TIMING_MAX + 1
+    assert entries[1].startswith("s0;dur=10000.0")
+
+
+def test_end_trace_finishes_and_waterfall_orders_spans():
+    trace, token = start_trace()
+    with span("first"):
+        pass
+    with span("second"):
+        pass
+    assert end_trace(token) is trace
+    assert not tracing.active()
+    waterfall = trace.waterfall(route="/x")
+    assert waterfall["route"] == "/x" and waterfall["duration_ms"] is not None
+    assert [s["name"] for s in waterfall["spans"]] == ["first", "second"]
@@ -0,0 +1,175 @@
+"""
+Tests for upstream revalidation
+===============================
+
+A local HTTP server stands in for OpenFoodFacts / Wikipedia and records every
+request, so the tests can check what went over the wire.
+"""
+
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import product_cache
+import upstream_cache
+from offline_mode import OFFLINE_ENV
+from product_cache import ProductCache
+
+
+class Upstream:
+    """What the fake server answers, and what it was asked."""
+
+    def __init__(self):
+        self.body = {"product": {"product_name": "Sample"}}
+        self.etag = '"v1"'
+        self.status = 200
+        self.requests = []
+
+    def payload(self):
+        return json.dumps(self.body).encode("utf-8")
+
+
+@pytest.fixture
+def upstream():
+    state = Upstream()
+
+    class Handler(BaseHTTPRequestHandler):
+        def _answer(self, send_body):
+            state.requests.append((self.command, self.headers.get("If-None-Match")))
+            if state.etag and self.headers.get("If-None-Match") == state.etag:
+                self.send_response(304)
+                self.send_header("ETag", state.etag)
+                self.end_headers()
+                return
+            body = state.payload()
+            self.send_response(state.status)
+            if state.etag:
+                self.send_header("ETag", state.etag)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            if send_body:
+                self.wfile.write(body)
+
+        def do_GET(self):
+            self._answer(True)
+
+        def do_HEAD(self):
+            self._answer(False)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True)
+    thread.start()
+    state.url = f"http://127.0.0.1:{server.server_port}/api/v2/product/1"
+    yield state
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture(autouse=True)
+def fresh_cache(monkeypatch):
+    monkeypatch.delenv(OFFLINE_ENV, raising=False)
+    cache = ProductCache()
+    monkeypatch.setattr(product_cache, "_shared", cache)
+    return cache
+
+
+def delta(before):
+    after = upstream_cache.stats()
+    return {k: after[k] - before[k] for k in before if k != "not_modified_rate"}
+
+
+def test_fresh_entries_are_served_without_a_request(upstream):
+    assert upstream_cache.fetch_json(upstream.url) == (200, upstream.body)
+    assert upstream_cache.fetch_json(upstream.url) == (200, upstream.body)
+    assert upstream.requests == [("GET", None)]
+
+
+def test_stale_entry_costs_a_304_round_trip(upstream):
+    before = upstream_cache.stats()
+    upstream_cache.fetch_json(upstream.url, ttl=0)
+    status, data = upstream_cache.fetch_json(upstream.url, ttl=0)
+    assert (status, data) == (200, {"product": {"product_name": "Sample"}})
+    assert upstream.requests == [("GET", None), ("GET", '"v1"')]
+    counts = delta(before)
+    assert counts["revalidations"] == 1 and counts["not_modified"] == 1
+    assert counts["bytes_saved"] == len(upstream.payload())
+
+
+def test_changed_upstream_replaces_the_entry(upstream):
+    upstream_cache.fetch_json(upstream.url, ttl=0)
+    upstream.body, upstream.etag = {"product": {"product_name": "Renamed"}}, '"v2"'
+    assert upstream_cache.fetch_json(upstream.url, ttl=0)[1] == upstream.body
+    assert upstream_cache.fetch_json(upstream.url, ttl=0)[1] == upstream.body
+    assert upstream.requests[-1] == ("GET", '"v2"')
+
+
+def test_responses_without_validators_are_not_stored(upstream):
+    upstream.etag = None
+    upstream_cache.fetch_json(upstream.url)
+    upstream_cache.fetch_json(upstream.url)
+    assert len(upstream.requests) == 2
+
+
+def test_error_on_revalidation_drops_the_entry(upstream, fresh_cache):
+    upstream_cache.fetch_json(upstream.url, ttl=0)
+    upstream.status, upstream.etag = 404, None
+    assert upstream_cache.fetch_json(upstream.url, ttl=0) == (404, None)
+    assert f"http:{upstream.url}" not in fresh_cache
+
+
+def test_offline_serves_stale_entries_as_they_are(upstream, monkeypatch):
+    upstream_cache.fetch_json(upstream.url, ttl=0)
+    monkeypatch.setenv(OFFLINE_ENV, "1")
+    assert upstream_cache.fetch_json(upstream.url, ttl=0) == (200, upstream.body)
+    assert len(upstream.requests) == 1
+
+
+def test_lookup_with_a_parser_sends_no_head(upstream):
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        return "Sample", upstream.url
+
+    def parse(body):
+        return body["product"]["product_name"]
+
+    assert upstream_cache.lookup("wiki:sample", fetch, ttl=0, parse=parse) == "Sample"
+    assert upstream.requests == []
+    # First revalidation: a plain GET whose body is parsed and brings the validators
+    upstream.body = {"product": {"product_name": "Sample v2"}}
+    assert upstream_cache.lookup("wiki:sample", fetch, ttl=0, parse=parse) == "Sample v2"
+    assert upstream.requests == [("GET", None)]
+    # Second: conditional, answered with 304
+    assert upstream_cache.lookup("wiki:sample", fetch, ttl=0, parse=parse) == "Sample v2"
+    assert upstream.requests == [("GET", None), ("GET", '"v1"')]
+    assert calls == [1]
+
+
+def test_lookup_without_a_parser_takes_validators_from_a_head(upstream):
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        return "Sample", upstream.url
+
+    upstream_cache.lookup("wiki:sample", fetch, ttl=0)
+    assert upstream.requests == [("HEAD", None)]
+    assert upstream_cache.lookup("wiki:sample", fetch, ttl=0) == "Sample"
+    assert upstream.requests[-1] == ("GET", '"v1"')
+    assert calls == [1]
+
+
+def test_lookup_failures_propagate_and_are_not_cached(fresh_cache):
+    def fetch():
+        raise ConnectionError("upstream down")
+
+    with pytest.raises(ConnectionError):
+        upstream_cache.lookup("wiki:down", fetch)
+    assert "wiki:down" not in fresh_cache
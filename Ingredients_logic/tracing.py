@@ -0,0 +1,180 @@
+"""
+IngreScan Request Tracing
+=========================
+
+Opt-in spans for one request at a time, to see which stage or upstream call
+made it slow. Nothing is recorded unless a Trace is active in the current
+context, so a span outside a traced request costs one ContextVar lookup.
+
+- The active Trace and the current span live in ContextVars: spans nest by
+  themselves, and work that Starlette runs in its threadpool (sync endpoints)
+  inherits the request's context
+- metrics.upstream_call() opens a span for every upstream HTTP call, so stage
+  spans placed in the API only need to mark the stages themselves
+- Trace.server_timing() renders the longest spans as a Server-Timing header;
+  Trace.waterfall() is the full JSON-ready span list with start offsets.
+  Span attributes can be user input (ingredient names), so in the header their
+  control characters are dropped and anything outside printable ASCII is
+  percent-encoded; the waterfall keeps them as they are
+
+    trace, token = start_trace()
+    with span("off_lookup", barcode=barcode):
+        ...
+    end_trace(token)
+    header = trace.server_timing()
+"""
+
+import itertools
+import re
+import time
+import uuid
+from contextvars import ContextVar
+from urllib.parse import quote
+
+_trace = ContextVar("ingrescan_trace", default=None)
+_current = ContextVar("ingrescan_span", default=None)
+
+SERVER_TIMING_MAX = 30          # header entries; the waterfall keeps every span
+_TOKEN_CHARS = re.compile(r"[^A-Za-z0-9!#$%&'*+.^_`|~-]")
+_CONTROL_CHARS = re.compile(r"[\x00-\x1f\x7f]+")
+# Printable ASCII that may stay as-is inside a quoted header value ('"', '\\' and '%' are encoded)
+_DESC_SAFE = "".join(c for c in map(chr, range(0x20, 0x7f)) if c not in '"\\%' and not c.isalnum())
+
+
+def _header_desc(attrs):
+    desc = _CONTROL_CHARS.sub(" ", " ".join(str(v) for v in attrs.values())).strip()
+    return quote(desc[:80], safe=_DESC_SAFE)
+
+
+class Trace:
+    def __init__(self, trace_id=None):
+        self.trace_id = trace_id or uuid.uuid4().hex[:16]
+        self.started_at = time.time()
+        self._t0 = time.perf_counter()
+        self._ids = itertools.count(1)
+        self.spans = []          # list.append is atomic, spans may finish on threadpool threads
+        self.duration_ms = None
+
+    def finish(self):
+        self.duration_ms = (time.perf_counter() - self._t0) * 1000.0
+
+    def server_timing(self):
+        total = self.duration_ms if self.duration_ms is not None else (time.perf_counter() - self._t0) * 1000.0
+        entries = [f"total;dur={total:.1f}"]
+        for s in sorted(self.spans, key=lambda s: s["duration_ms"], reverse=True)[:SERVER_TIMING_MAX]:
+            desc = _header_desc(s["attrs"])
+            entry = f"{_TOKEN_CHARS.sub('_', s['name'])};dur={s['duration_ms']:.1f}"
+            entries.append(f'{entry};desc="{desc}"' if desc else entry)
+        return ", ".join(entries)
+
+    def waterfall(self, **fields):
+        return dict(fields, trace_id=self.trace_id, started_at=self.started_at,
+                    duration_ms=round(self.duration_ms, 3) if self.duration_ms is not None else None,
+                    spans=sorted(self.spans, key=lambda s: s["start_ms"]))
+
+
+class _Span:
+    __slots__ = ("trace", "name", "attrs", "id", "parent", "_start", "_token")
+
+    def __init__(self, trace, name, attrs):
+        self.trace = trace
+        self.name = name
+        self.attrs = attrs
+
+    def __enter__(self):
+        self.id = next(self.trace._ids)
+        self.parent = _current.get()
+        self._token = _current.set(self.id)
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end = time.perf_counter()
+        _current.reset(self._token)
+        record = {"id": self.id, "parent": self.parent, "name": self.name,
+                  "start_ms": round((self._start - self.trace._t0) * 1000.0, 3),
+                  "duration_ms": round((end - self._start) * 1000.0, 3), "attrs": self.attrs}
+        if exc_type is not None:
+            record["error"] = exc_type.__name__
+        self.trace.spans.append(record)
+        return False
+
+    def set(self, key, value):
+        self.attrs[key] = value
+
+    def finish(self):
+        """End a span opened with start_span()."""
+        self.__exit__(None, None, None)
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set(self, key, value):
+        pass
+
+    def finish(self):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def span(name, /, **attrs):
+    """Context manager recording one span in the active trace (a no-op when there is none)."""
+    trace = _trace.get()
+    if trace is None:
+        return _NULL_SPAN
+    return _Span(trace, name, attrs)
+
+
+def start_span(name, /, **attrs):
+    """span() for code that cannot wrap the stage in a with block; call .finish() on the result."""
+    return span(name, **attrs).__enter__()
+
+
+def start_trace(trace_id=None):
+    """Activate a new Trace in the current context; returns (trace, token for end_trace)."""
+    trace = Trace(trace_id)
+    return trace, _trace.set(trace)
+
+
+def end_trace(token):
+    trace = _trace.get()
+    if trace is not None:
+        trace.finish()
+    _trace.reset(token)
+    return trace
+
+
+def active():
+    return _trace.get() is not None
+
+
+# 🔍 Example
+if __name__ == "__main__":
+    import json
+
+    trace, token = start_trace()
+    with span("off_lookup", barcode="8901058851427"):
+        with span("upstream", host="world.openfoodfacts.org", stage="v2_product"):
+            time.sleep(0.02)
+        time.sleep(0.002)
+    step = start_span("ingredient", ingredient="sugar")
+    time.sleep(0.005)
+    step.finish()
+    for hostile in ("crème fraîche", "jaggery (गुड़)", 'a\r\nX-Injected: 1 "quoted"'):
+        with span("ingredient", ingredient=hostile):
+            pass
+    end_trace(token)
+    header = trace.server_timing()
+    header.encode("latin-1")          # raises for a value that is not a valid header
+    assert "\r" not in header and "\n" not in header and '"quoted"' not in header
+    print("Server-Timing:", header)
+    print(json.dumps(trace.waterfall(route="/scan/barcode/{barcode}"), indent=2))
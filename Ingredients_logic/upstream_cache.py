@@ -0,0 +1,222 @@
+"""
+IngreScan Upstream Revalidation
+===============================
+
+Conditional GETs for upstream sources (OpenFoodFacts, Wikipedia), layered on
+the product cache, so a stale entry costs a 304 instead of a full download
+when nothing changed upstream.
+
+- A cached response keeps the ETag / Last-Modified validators the server sent
+  and stays in the cache for INGRESCAN_REVALIDATE_WINDOW seconds (default one
+  day) past its freshness
+- Once stale, the next lookup sends If-None-Match / If-Modified-Since; a 304
+  just extends the freshness of the cached entry, while a 200 replaces it
+- Responses without validators are not stored here (they cannot be revalidated)
+- Freshness is wall-clock (time.time()) because entries reach the shared tier
+- Clients that hide response headers (the wikipedia library) go through
+  lookup(): the value comes from the client, the validators from a HEAD on an
+  equivalent URL (or from the first revalidation when the caller can parse that
+  URL's body), and revalidation is a conditional GET on that URL whose 200 body
+  replaces the value when the caller can parse it
+- Offline, stale entries are served as they are instead of revalidated
+
+stats() reports requests, revalidations, 304s, body bytes downloaded and body
+bytes saved by 304s (decoded sizes, before any transfer compression); the API
+shows them under /admin/cache.
+
+    status, data = fetch_json("https://world.openfoodfacts.org/api/v2/product/3017620422003")
+"""
+
+import os
+import threading
+import time
+from urllib.parse import urlencode, urlsplit
+
+import requests
+
+import pipeline_events
+from metrics import upstream_call, upstream_get
+from offline_mode import is_offline
+from product_cache import get_product_cache
+
+REVALIDATE_WINDOW = float(os.environ.get("INGRESCAN_REVALIDATE_WINDOW", "86400"))
+
+_stats_lock = threading.Lock()
+_stats = {"fresh_hits": 0, "requests": 0, "revalidations": 0, "not_modified": 0,
+          "bytes_downloaded": 0, "bytes_saved": 0}
+
+
+def _count(name, n=1):
+    with _stats_lock:
+        _stats[name] += n
+    pipeline_events.count(f"upstream_{name}", n)
+
+
+def stats():
+    with _stats_lock:
+        totals = dict(_stats)
+    totals["not_modified_rate"] = (round(totals["not_modified"] / totals["revalidations"], 4)
+                                   if totals["revalidations"] else 0.0)
+    return totals
+
+
+# ------------------ Validators ------------------
+def _validators(response):
+    return {"etag": response.headers.get("ETag"), "last_modified": response.headers.get("Last-Modified")}
+
+
+def _conditional_headers(entry, headers=None):
+    out = dict(headers or {})
+    if entry.get("etag"):
+        out["If-None-Match"] = entry["etag"]
+    if entry.get("last_modified"):
+        out["If-Modified-Since"] = entry["last_modified"]
+    return out
+
+
+def _store(cache, key, entry, ttl):
+    entry["fresh_until"] = time.time() + ttl
+    cache.set(key, entry, ttl + REVALIDATE_WINDOW)
+
+
+def _not_modified(cache, key, entry, ttl):
+    """304: keep the cached body for another ttl seconds."""
+    _count("not_modified")
+    _count("bytes_saved", entry["bytes"])
+    _store(cache, key, dict(entry), ttl)
+    return entry["value"]
+
+
+# ------------------ JSON endpoints ------------------
+def fetch_json(url, params=None, headers=None, timeout=5, session=None, ttl=None, stage="json"):
+    """
+    (status_code, parsed JSON body) for a GET, revalidating a cached copy when one exists.
+    A 304 is reported as 200 with the cached body; non-200 answers give (status, None).
+    stage labels the call in the upstream metrics.
+    """
+    cache = get_product_cache()
+    ttl = cache.ttl if ttl is None else ttl
+    full_url = f"{url}?{urlencode(sorted(params.items()))}" if params else url
+    key = f"http:{full_url}"
+    entry = cache.get(key)
+    if entry is not None and (entry["fresh_until"] > time.time() or is_offline()):
+        _count("fresh_hits")
+        return 200, entry["value"]
+
+    _count("requests")
+    if entry is not None:
+        _count("revalidations")
+        headers = _conditional_headers(entry, headers)
+    response = upstream_get(url, stage, session=session, params=params, headers=headers, timeout=timeout)
+    if response.status_code == 304 and entry is not None:
+        return 200, _not_modified(cache, key, entry, ttl)
+    _count("bytes_downloaded", len(response.content))
+    if response.status_code != 200:
+        if entry is not None:
+            cache.delete(key)
+        return response.status_code, None
+    data = response.json()
+    validators = _validators(response)
+    if validators["etag"] or validators["last_modified"]:
+        _store(cache, key, dict(validators, value=data, bytes=len(response.content)), ttl)
+    return 200, data
+
+
+# ------------------ Header-hiding clients ------------------
+def lookup(key, fetch, ttl=None, session=None, timeout=5, stage="lookup", parse=None):
+    """
+    Cached value for key. fetch() -> (value, validator_url or None): the value comes
+    from a client that hides response headers, validator_url names a resource that
+    changes whenever the value does and answers conditional requests. parse(json body)
+    turns a 200 from validator_url into the value (None when it cannot), so a changed
+    resource costs one round trip instead of a discarded download plus fetch(). With a
+    parser a miss sends no HEAD either: the first revalidation GET brings the validators.
+    Exceptions from fetch() propagate and nothing is cached.
+    """
+    cache = get_product_cache()
+    ttl = cache.ttl if ttl is None else ttl
+    http = session or requests
+    entry = cache.get(key)
+    if entry is not None and (entry["fresh_until"] > time.time() or is_offline()):
+        _count("fresh_hits")
+        return entry["value"]
+
+    probed = None
+    if entry is not None and entry.get("url"):
+        _count("requests")
+        _count("revalidations")
+        try:
+            response = upstream_get(entry["url"], f"{stage}_revalidate", session=session,
+                                    headers=_conditional_headers(entry), timeout=timeout)
+            if response.status_code == 304:
+                return _not_modified(cache, key, entry, ttl)
+            _count("bytes_downloaded", len(response.content))
+            if response.status_code == 200:
+                probed = dict(_validators(response), url=entry["url"])
+                value = parse(response.json()) if parse is not None else None
+                if value is not None:
+                    _store(cache, key, dict(probed, value=value, bytes=len(response.content)), ttl)
+                    return value
+        except (requests.RequestException, ValueError):
+            pass
+
+    value, validator_url = fetch()
+    if is_offline():
+        # Placeholder answer: never cached
+        return value
+    entry = {"value": value, "url": None, "etag": None, "last_modified": None,
+             "bytes": len(str(value).encode("utf-8"))}
+    if probed is not None and probed["url"] == validator_url:
+        # The revalidation GET already brought this resource's new validators
+        entry.update(probed)
+    elif validator_url and parse is not None:
+        entry["url"] = validator_url
+    elif validator_url:
+        try:
+            _count("requests")
+            with upstream_call(urlsplit(validator_url).hostname, f"{stage}_validator") as call:
+                head = http.head(validator_url, timeout=timeout, allow_redirects=True)
+                call.status = head.status_code
+            if head.status_code == 200:
+                entry.update(_validators(head), url=validator_url)
+        except requests.RequestException:
+            pass
+    _store(cache, key, entry, ttl)
+    return value
+
+
+# 🔍 Example: stale entries revalidated against a local server that honours If-None-Match
+if __name__ == "__main__":
+    import hashlib
+    import json
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    from product_cache import ProductCache
+    import product_cache
+
+    body = json.dumps({"product": {"product_name": "Sample", "ingredients_text": "sugar, palm oil " * 200}}).encode()
+    etag = '"' + hashlib.sha256(body).hexdigest()[:16] + '"'
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.headers.get("If-None-Match") == etag:
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    product_cache._shared = ProductCache()
+    url = f"http://127.0.0.1:{server.server_port}/api/v2/product/1"
+    for _ in range(20):
+        status, data = fetch_json(url, ttl=0)   # always stale: every call revalidates
+    server.shutdown()
+    print(stats())